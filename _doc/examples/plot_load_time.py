@@ -0,0 +1,100 @@
+# -*- coding: utf-8 -*-
+"""
+=============================================
+Time to load an ONNX graph with OnnxInference
+=============================================
+
+A service loading many models spends a significant time
+in the constructor of :class:`OnnxInference
+<mlprodict.onnxrt.onnx_inference.OnnxInference>`. The graph
+is read, every node is converted and the sequence of nodes
+to execute is computed. This example measures that time
+for a random forest, a big node with many attributes,
+and for long chains of nodes similar to a pipeline.
+
+.. contents::
+    :local:
+
+Random forest
++++++++++++++
+"""
+from timeit import timeit
+import numpy
+import pandas
+import matplotlib.pyplot as plt
+from onnx.helper import (
+    make_node, make_graph, make_model, make_tensor_value_info)
+from onnx.numpy_helper import from_array
+from onnx import TensorProto
+from sklearn.datasets import load_iris
+from sklearn.ensemble import RandomForestRegressor
+from skl2onnx import convert_sklearn
+from skl2onnx.common.data_types import FloatTensorType
+from mlprodict.onnxrt import OnnxInference
+
+iris = load_iris()
+X, y = iris.data.astype(numpy.float32), iris.target
+
+rows = []
+for n_estimators in [10, 50, 100]:
+    rf = RandomForestRegressor(n_estimators=n_estimators, max_depth=8)
+    rf.fit(X, y)
+    model_onnx = convert_sklearn(
+        rf, initial_types=[('X', FloatTensorType([None, X.shape[1]]))])
+    number = 5
+    t = timeit(lambda: OnnxInference(model_onnx), number=number)
+    rows.append(dict(model='rf', size=n_estimators, time=t / number))
+    print(rows[-1])
+
+############################
+# Long chains of nodes
+# ++++++++++++++++++++
+#
+# Every node adds a constant to the previous result.
+# Nodes are stored in the execution order or in the reverse
+# order, the runtime must sort them.
+
+
+def chain(n_nodes, reverse=False):
+    cst = numpy.array([[1, 1, 1, 1]], dtype=numpy.float32)
+    nodes = []
+    name = 'X'
+    for i in range(n_nodes):
+        out = 'Y' if i == n_nodes - 1 else 'T%d' % i
+        nodes.append(make_node('Add', [name, 'C'], [out], name='A%d' % i))
+        name = out
+    if reverse:
+        nodes = nodes[::-1]
+    graph = make_graph(
+        nodes, 'chain',
+        [make_tensor_value_info('X', TensorProto.FLOAT, [None, 4])],
+        [make_tensor_value_info('Y', TensorProto.FLOAT, [None, 4])],
+        [from_array(cst, name='C')])
+    return make_model(graph)
+
+
+for reverse in [False, True]:
+    for n_nodes in [100, 500, 1000, 2000]:
+        model_onnx = chain(n_nodes, reverse)
+        number = 3
+        t = timeit(lambda: OnnxInference(model_onnx), number=number)
+        rows.append(dict(model='reversed chain' if reverse else 'chain',
+                         size=n_nodes, time=t / number))
+        print(rows[-1])
+
+df = pandas.DataFrame(rows)
+print(df)
+
+#########################
+# Graph
+# +++++
+#
+# The loading time of a chain grows linearly with the
+# number of nodes whatever the order they are stored in.
+
+fig, ax = plt.subplots(1, 3, figsize=(14, 4))
+for i, model in enumerate(['rf', 'chain', 'reversed chain']):
+    sub = df[df.model == model]
+    sub.plot(x='size', y='time', ax=ax[i], marker='o',
+             title='loading time - %s' % model)
+plt.show()
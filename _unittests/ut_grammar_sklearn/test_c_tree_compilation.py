@@ -0,0 +1,94 @@
+"""
+@brief      test log(time=2s)
+"""
+import unittest
+import os
+from logging import getLogger
+import numpy
+from sklearn.datasets import load_iris
+from sklearn.model_selection import train_test_split
+from sklearn.ensemble import RandomForestClassifier, GradientBoostingRegressor
+from pyquickhelper.pycode import ExtTestCase, get_temp_folder
+from mlprodict.onnxrt import OnnxInference, to_onnx
+from mlprodict.cc import compile_tree_ensembles, tree_ensemble_to_c
+
+
+class TestCTreeCompilation(ExtTestCase):
+
+    def setUp(self):
+        logger = getLogger('skl2onnx')
+        logger.disabled = True
+
+    def test_finalize_scores(self):
+        from mlprodict.onnxrt.ops_cpu.op_tree_ensemble_regressor_ import RuntimeTreeEnsembleRegressorFloat  # pylint: disable=E0611
+        i64 = lambda v: numpy.array(v, dtype=numpy.int64)
+        reg = RuntimeTreeEnsembleRegressorFloat()
+        reg.init('AVERAGE', numpy.array([0.5], dtype=numpy.float32), 1,
+                 i64([2, 0, 0, 2, 0, 0]), i64([0, 0, 0, 1, 0, 0]),
+                 numpy.ones(6, dtype=numpy.float32), i64([]),
+                 ['BRANCH_LEQ', 'LEAF', 'LEAF', 'BRANCH_LEQ', 'LEAF', 'LEAF'],
+                 i64([0, 1, 2, 0, 1, 2]), i64([0, 0, 0, 1, 1, 1]),
+                 i64([1, 0, 0, 1, 0, 0]),
+                 numpy.array([0, 0, 0, 0, 0, 0], dtype=numpy.float32),
+                 'NONE', i64([0, 0, 0, 0]), i64([1, 2, 1, 2]),
+                 i64([0, 0, 1, 1]),
+                 numpy.array([1, 2, 3, 4], dtype=numpy.float32))
+        self.assertEqual(reg.n_targets_, 1)
+        X = numpy.array([[-1, -1], [1, -1], [-1, 1], [1, 1]],
+                        dtype=numpy.float32)
+        exp = reg.compute(X)
+        scores = numpy.array([[4], [5], [5], [6]], dtype=numpy.float32)
+        has_scores = numpy.ones(scores.shape, dtype=numpy.uint8)
+        got = reg.finalize_scores(scores, has_scores)
+        self.assertEqualArray(exp, got)
+        self.assertRaise(
+            lambda: reg.finalize_scores(scores.reshape((2, 2)),
+                                        has_scores.reshape((2, 2))),
+            RuntimeError)
+
+    def test_compile_random_forest_classifier(self):
+        temp = get_temp_folder(__file__, "temp_compile_random_forest_classifier")
+        iris = load_iris()
+        X, y = iris.data, iris.target
+        X_train, X_test, y_train, _ = train_test_split(X, y, random_state=11)
+        clr = RandomForestClassifier(n_estimators=5, max_depth=4)
+        clr.fit(X_train, y_train)
+        X_test = X_test.astype(numpy.float32)
+
+        model_def = to_onnx(clr, X_train.astype(numpy.float32))
+        oinf = OnnxInference(model_def)
+        exp = oinf.run({'X': X_test})
+        code = tree_ensemble_to_c(oinf.sequence_[0].ops_)
+        self.assertIn("static void tree_4(", code)
+
+        names = compile_tree_ensembles(oinf, tmpdir=temp)
+        self.assertEqual(len(names), 1)
+        self.assertEqual(oinf.sequence_[0].ops_.rt_.runtime_options(), "CFFI")
+        self.assertNotEmpty(os.listdir(temp))
+        got = oinf.run({'X': X_test})
+        self.assertEqualArray(exp['output_label'], got['output_label'])
+        self.assertEqualArray(exp['output_probability'].values,
+                              got['output_probability'].values, decimal=5)
+        self.assertEqual(compile_tree_ensembles(oinf, tmpdir=temp), [])
+
+    def test_compile_gradient_boosting_regressor64(self):
+        temp = get_temp_folder(__file__, "temp_compile_gradient_boosting_regressor64")
+        iris = load_iris()
+        X, y = iris.data, iris.target
+        X_train, X_test, y_train, _ = train_test_split(X, y, random_state=11)
+        clr = GradientBoostingRegressor(n_estimators=20)
+        clr.fit(X_train, y_train)
+
+        model_def = to_onnx(clr, X_train, dtype=numpy.float64,
+                            rewrite_ops=True)
+        oinf = OnnxInference(model_def)
+        exp = oinf.run({'X': X_test})['variable']
+        self.assertEqual(len(compile_tree_ensembles(oinf, tmpdir=temp)), 1)
+        got = oinf.run({'X': X_test})['variable']
+        self.assertEqualArray(exp, got)
+        self.assertEqualArray(clr.predict(X_test), got.ravel())
+        self.assertRaise(lambda: oinf.run({'X': X_test[:, :2]}), RuntimeError)
+
+
+if __name__ == "__main__":
+    unittest.main()
@@ -0,0 +1,174 @@
+"""
+@brief      test log(time=2s)
+"""
+import unittest
+import asyncio
+import threading
+import time
+import numpy
+from onnx.helper import (
+    make_node, make_graph, make_model, make_tensor_value_info)
+from onnx.numpy_helper import from_array
+from onnx import TensorProto
+from pyquickhelper.pycode import ExtTestCase
+from mlprodict.onnxrt import OnnxInference, AsyncOnnxInference
+
+
+class TestOnnxrtAsync(ExtTestCase):
+
+    def _model(self):
+        cst = numpy.array([[1, 2, 3]], dtype=numpy.float32)
+        nodes = [make_node('Mul', ['X', 'C'], ['M'], name='mul'),
+                 make_node('Sigmoid', ['M'], ['Y'], name='sig')]
+        graph = make_graph(
+            nodes, 'g',
+            [make_tensor_value_info('X', TensorProto.FLOAT, [None, 3])],
+            [make_tensor_value_info('Y', TensorProto.FLOAT, [None, 3])],
+            [from_array(cst, name='C')])
+        return make_model(graph)
+
+    def test_async_batching(self):
+        oinf = OnnxInference(self._model(), reuse_buffers=True)
+        X = numpy.random.randn(50, 3).astype(numpy.float32)
+        exp = oinf.run({'X': X})['Y']
+        aoinf = AsyncOnnxInference(oinf, max_batch_size=16, max_wait=0.01)
+
+        async def main():
+            return await asyncio.gather(
+                *[aoinf.run({'X': X[i:i + 1]}) for i in range(X.shape[0])])
+
+        try:
+            got = asyncio.run(main())
+        finally:
+            aoinf.close()
+        self.assertEqual(len(got), 50)
+        for i, g in enumerate(got):
+            self.assertEqual(list(g), ['Y'])
+            self.assertEqualArray(exp[i:i + 1], g['Y'], decimal=5)
+        self.assertEqual(aoinf.n_requests_, 50)
+        self.assertLess(aoinf.n_batches_, 10)
+
+    def test_async_errors(self):
+        oinf = OnnxInference(self._model())
+        X = numpy.random.randn(4, 3).astype(numpy.float32)
+        aoinf = AsyncOnnxInference(oinf, max_batch_size=8, max_wait=0.001)
+
+        async def main():
+            return await asyncio.gather(
+                aoinf.run({'X': X[:1]}), aoinf.run({'X': X[1:3]}),
+                aoinf.run({'X': X[:, :2]}), return_exceptions=True)
+
+        try:
+            got = asyncio.run(main())
+        finally:
+            aoinf.close()
+        self.assertEqualArray(oinf.run({'X': X[:1]})['Y'], got[0]['Y'])
+        self.assertEqualArray(oinf.run({'X': X[1:3]})['Y'], got[1]['Y'])
+        self.assertIsInstance(got[2], Exception)
+        self.assertRaise(lambda: AsyncOnnxInference(oinf, max_batch_size=0),
+                         ValueError)
+        self.assertRaise(lambda: AsyncOnnxInference(None), TypeError)
+
+    def test_async_reduction(self):
+        node = make_node('ReduceMean', ['X'], ['Y'], name='mean',
+                         axes=[0], keepdims=1, noop_with_empty_axes=0)
+        graph = make_graph(
+            [node], 'g',
+            [make_tensor_value_info('X', TensorProto.FLOAT, [None, 3])],
+            [make_tensor_value_info('Y', TensorProto.FLOAT, [1, 3])])
+        oinf = OnnxInference(make_model(graph))
+        X = numpy.random.randn(3, 3).astype(numpy.float32)
+        aoinf = AsyncOnnxInference(oinf, max_batch_size=8, max_wait=0.01)
+
+        async def main():
+            return await asyncio.gather(
+                aoinf.run({'X': X[:1]}), aoinf.run({'X': X[1:]}))
+
+        try:
+            got = asyncio.run(main())
+        finally:
+            aoinf.close()
+        self.assertEqual(aoinf.n_batches_, 1)
+        self.assertEqualArray(X[:1].mean(axis=0, keepdims=True), got[0]['Y'],
+                              decimal=5)
+        self.assertEqualArray(X[1:].mean(axis=0, keepdims=True), got[1]['Y'],
+                              decimal=5)
+
+    def test_async_close(self):
+        oinf = OnnxInference(self._model())
+        X = numpy.random.randn(4, 3).astype(numpy.float32)
+        aoinf = AsyncOnnxInference(oinf, max_batch_size=8, max_wait=10)
+
+        async def main():
+            tasks = [asyncio.ensure_future(aoinf.run({'X': X[i:i + 1]}))
+                     for i in range(X.shape[0])]
+            await asyncio.sleep(0)
+            # the pending requests are computed before the executor stops
+            aoinf.close()
+            got = await asyncio.wait_for(asyncio.gather(*tasks), 5)
+            with self.assertRaises(RuntimeError):
+                await aoinf.run({'X': X})
+            return got
+
+        got = asyncio.run(main())
+        exp = oinf.run({'X': X})['Y']
+        for i, g in enumerate(got):
+            self.assertEqualArray(exp[i:i + 1], g['Y'], decimal=5)
+
+    def test_async_close_in_flight(self):
+
+        class SlowOnnxInference(OnnxInference):
+            "Records how many calls to run overlap."
+
+            def __init__(self, *args, **kwargs):
+                OnnxInference.__init__(self, *args, **kwargs)
+                self.lock = threading.Lock()
+                self.active = 0
+                self.max_active = 0
+
+            def run(self, inputs, **kwargs):  # pylint: disable=W0221
+                with self.lock:
+                    self.active += 1
+                    self.max_active = max(self.max_active, self.active)
+                try:
+                    time.sleep(0.2)
+                    return OnnxInference.run(self, inputs, **kwargs)
+                finally:
+                    with self.lock:
+                        self.active -= 1
+
+        oinf = SlowOnnxInference(self._model(), reuse_buffers=True)
+        X = numpy.random.randn(3, 3).astype(numpy.float32)
+        aoinf = AsyncOnnxInference(oinf, max_batch_size=2, max_wait=10)
+
+        async def main():
+            # the first two requests make a batch sent to the executor,
+            # the last one is still pending when close is called
+            tasks = [asyncio.ensure_future(aoinf.run({'X': X[i:i + 1]}))
+                     for i in range(X.shape[0])]
+            await asyncio.sleep(0.05)
+            aoinf.close()
+            return await asyncio.wait_for(asyncio.gather(*tasks), 5)
+
+        got = asyncio.run(main())
+        self.assertEqual(oinf.max_active, 1)
+        self.assertEqual(aoinf.n_batches_, 2)
+        exp = OnnxInference(self._model()).run({'X': X})['Y']
+        for i, g in enumerate(got):
+            self.assertEqualArray(exp[i:i + 1], g['Y'], decimal=5)
+
+    def test_split_rows(self):
+        a = numpy.arange(6).reshape((3, 2)).astype(numpy.float32)
+        self.assertEqualArray(
+            a[1:3], AsyncOnnxInference._split_rows(  # pylint: disable=W0212
+                'Y', a, 1, 3))
+        self.assertEqual(
+            [2], AsyncOnnxInference._split_rows(  # pylint: disable=W0212
+                'Y', [1, 2, 3], 1, 2))
+        self.assertRaise(
+            lambda: AsyncOnnxInference._split_rows(  # pylint: disable=W0212
+                'Y', numpy.array(1.), 0, 1), RuntimeError)
+
+
+if __name__ == "__main__":
+    unittest.main()
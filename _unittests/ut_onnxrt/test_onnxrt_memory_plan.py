@@ -0,0 +1,92 @@
+"""
+@brief      test log(time=2s)
+"""
+import unittest
+import numpy
+from onnx.helper import (
+    make_node, make_graph, make_model, make_tensor_value_info)
+from onnx.numpy_helper import from_array
+from onnx import TensorProto
+from pyquickhelper.pycode import ExtTestCase
+from mlprodict.onnxrt import OnnxInference
+
+
+class TestOnnxrtMemoryPlan(ExtTestCase):
+
+    def _model_chain(self):
+        c1 = numpy.array([[1, -2, 3]], dtype=numpy.float32)
+        c2 = numpy.array([[0.5, 0.5, 0.5]], dtype=numpy.float32)
+        nodes = [make_node('Add', ['X', 'C1'], ['T1'], name='A1'),
+                 make_node('Relu', ['T1'], ['T2'], name='R'),
+                 make_node('Add', ['T2', 'C2'], ['T3'], name='A2'),
+                 make_node('Identity', ['T3'], ['T4'], name='I'),
+                 make_node('Exp', ['T4'], ['T5'], name='E'),
+                 make_node('Mul', ['T5', 'C2'], ['Y'], name='M')]
+        graph = make_graph(
+            nodes, 'g',
+            [make_tensor_value_info('X', TensorProto.FLOAT, [None, 3])],
+            [make_tensor_value_info('Y', TensorProto.FLOAT, [None, 3])],
+            [from_array(c1, name='C1'), from_array(c2, name='C2')])
+        return make_model(graph), c1, c2
+
+    def test_memory_plan(self):
+        model_def, _, __ = self._model_chain()
+        oinf = OnnxInference(model_def)
+        plan = oinf.build_memory_plan({'X': (100, 3)})
+        variables = plan['variables']
+        self.assertEqual(set(variables), {'T1', 'T2', 'T3', 'T4', 'T5'})
+        # T4 is a view on T3
+        self.assertEqual(variables['T3']['arena'], variables['T4']['arena'])
+        self.assertEqual(len(plan['arenas']), 2)
+        self.assertEqual(plan['peak_bytes'], 2 * 1200)
+        self.assertEqual(plan['naive_bytes'], 4 * 1200)
+        self.assertEqual(plan['live_bytes'], 2 * 1200)
+        arenas = {}
+        for name, v in variables.items():
+            arenas.setdefault(v['arena'], []).append(
+                (v['start'], v['end'], name))
+        for values in arenas.values():
+            values.sort()
+            for a, b in zip(values[:-1], values[1:]):
+                if b[2] == 'T4':
+                    continue
+                self.assertLess(a[1], b[0])
+
+    def test_memory_plan_apply(self):
+        model_def, c1, c2 = self._model_chain()
+        X = numpy.random.randn(10, 3).astype(numpy.float32)
+        exp = numpy.exp(numpy.maximum(X + c1, 0) + c2) * c2
+        oinf = OnnxInference(model_def)
+        self.assertRaise(lambda: oinf.build_memory_plan({'X': X}, apply=True),
+                         RuntimeError)
+        oinf = OnnxInference(model_def, reuse_buffers=True)
+        plan = oinf.build_memory_plan({'X': X}, apply=True)
+        self.assertEqual(set(plan['applied']), {'T1', 'T2', 'T3', 'T5'})
+        got1 = oinf.run({'X': X})
+        self.assertEqualArray(exp, got1['Y'], decimal=5)
+        got2 = oinf.run({'X': X * 2})
+        exp2 = numpy.exp(numpy.maximum(X * 2 + c1, 0) + c2) * c2
+        self.assertEqualArray(exp2, got2['Y'], decimal=5)
+        self.assertEqualArray(exp, got1['Y'], decimal=5)
+        got3 = oinf.run({'X': X[:3]})
+        self.assertEqualArray(exp[:3], got3['Y'], decimal=5)
+
+        # results sharing an arena must not overwrite each other
+        buffers = [op.buffers_ for op in oinf.arena_ops_]
+        inter = oinf.run({'X': X}, intermediate=True)
+        t1 = X + c1
+        t3 = numpy.maximum(t1, 0) + c2
+        self.assertEqualArray(t1, inter['T1'], decimal=5)
+        self.assertEqualArray(numpy.maximum(t1, 0), inter['T2'], decimal=5)
+        self.assertEqualArray(t3, inter['T3'], decimal=5)
+        self.assertEqualArray(numpy.exp(t3), inter['T5'], decimal=5)
+        self.assertEqualArray(exp, inter['Y'], decimal=5)
+        self.assertEqual(len(buffers), len(oinf.arena_ops_))
+        for op, bufs in zip(oinf.arena_ops_, buffers):
+            self.assertTrue(op.buffers_ is bufs)
+        got4 = oinf.run({'X': X})
+        self.assertEqualArray(exp, got4['Y'], decimal=5)
+
+
+if __name__ == "__main__":
+    unittest.main()
@@ -0,0 +1,197 @@
+"""
+@brief      test log(time=2s)
+"""
+import unittest
+import pickle
+import numpy
+from onnx.helper import (
+    make_node, make_graph, make_model, make_tensor_value_info)
+from onnx.numpy_helper import from_array
+from onnx import TensorProto
+from scipy.sparse import coo_matrix
+from pyquickhelper.pycode import ExtTestCase
+from mlprodict.onnxrt import OnnxInference
+from mlprodict.onnxrt.ops_cpu.op_zipmap import ArrayZipMapDictionary
+
+
+class TestOnnxrtParallel(ExtTestCase):
+
+    def _model_branches(self, n_branches=4):
+        nodes = []
+        inits = []
+        branches = []
+        for i in range(n_branches):
+            cst = numpy.full((1, 3), i + 1, dtype=numpy.float32)
+            inits.append(from_array(cst, name='C%d' % i))
+            nodes.append(make_node('Mul', ['X', 'C%d' % i], ['M%d' % i],
+                                   name='mul%d' % i))
+            nodes.append(make_node('Sigmoid', ['M%d' % i], ['S%d' % i],
+                                   name='sig%d' % i))
+            nodes.append(make_node('Exp', ['S%d' % i], ['E%d' % i],
+                                   name='exp%d' % i))
+            branches.append('E%d' % i)
+        nodes.append(make_node('Concat', branches, ['Y'], name='concat',
+                               axis=1))
+        graph = make_graph(
+            nodes, 'g',
+            [make_tensor_value_info('X', TensorProto.FLOAT, [None, 3])],
+            [make_tensor_value_info('Y', TensorProto.FLOAT,
+                                    [None, 3 * n_branches])],
+            inits)
+        return make_model(graph)
+
+    def test_parallel_branches(self):
+        model_def = self._model_branches()
+        X = numpy.random.randn(20, 3).astype(numpy.float32)
+        exp = OnnxInference(model_def).run({'X': X})['Y']
+        oinf = OnnxInference(model_def, parallel_branches=4)
+        self.assertEqual(len(oinf.parallel_deps_), len(oinf.sequence_))
+        for clean in [None, True, False]:
+            got = oinf.run({'X': X}, clean_right_away=clean)
+            self.assertEqual(list(got), ['Y'])
+            self.assertEqualArray(exp, got['Y'])
+        got, mtime = oinf.run({'X': X}, node_time=True)
+        self.assertEqualArray(exp, got['Y'])
+        self.assertEqual(len(mtime), len(oinf.sequence_))
+        self.assertEqual([m['i'] for m in mtime],
+                         list(range(len(oinf.sequence_))))
+        inter = oinf.run({'X': X}, intermediate=True)
+        self.assertIn('M3', inter)
+        self.assertEqualArray(exp, inter['Y'])
+        rows = []
+        got = oinf.run({'X': X}, verbose=1, fLOG=rows.append)
+        self.assertEqualArray(exp, got['Y'])
+        self.assertNotEmpty(rows)
+
+    def test_parallel_branches_options(self):
+        model_def = self._model_branches(2)
+        X = numpy.random.randn(5, 3).astype(numpy.float32)
+        exp = OnnxInference(model_def).run({'X': X})['Y']
+        oinf = OnnxInference(model_def, parallel_branches=2,
+                             reuse_buffers=True)
+        self.assertEqualArray(exp, oinf.run({'X': X})['Y'])
+        self.assertEqualArray(exp, oinf.run({'X': X})['Y'])
+        self.assertRaise(lambda: oinf.build_memory_plan({'X': X}, apply=True),
+                         RuntimeError)
+        pkl = pickle.loads(pickle.dumps(oinf))
+        self.assertEqual(pkl.parallel_branches, 2)
+        self.assertEqualArray(exp, pkl.run({'X': X})['Y'])
+        self.assertRaise(
+            lambda: OnnxInference(model_def, parallel_branches=2,
+                                  runtime='python_compiled'),
+            RuntimeError)
+
+    def test_parallel_branches_close(self):
+        model_def = self._model_branches(2)
+        X = numpy.random.randn(5, 3).astype(numpy.float32)
+        oinf = OnnxInference(model_def, parallel_branches=2)
+        executor = oinf._executor  # pylint: disable=W0212
+        self.assertNotEmpty(executor)
+        self.assertEqualArray(oinf.run({'X': X})['Y'],
+                              OnnxInference(model_def).run({'X': X})['Y'])
+        oinf.close()
+        self.assertTrue(executor._shutdown)  # pylint: disable=W0212
+        self.assertRaise(lambda: oinf.run({'X': X}), RuntimeError)
+        oinf.close()
+        oinf = OnnxInference(model_def)
+        self.assertEmpty(oinf._executor)  # pylint: disable=W0212
+        oinf.close()
+
+    def test_run_chunks(self):
+        model_def = self._model_branches(3)
+        X = numpy.random.randn(20, 3).astype(numpy.float32)
+        exp = OnnxInference(model_def).run({'X': X})['Y']
+        for pb in [0, 2]:
+            oinf = OnnxInference(model_def, parallel_branches=pb)
+            for n_jobs, chunk_size in [(3, None), (3, 7), (1, 6), (2, 50)]:
+                with self.subTest(n_jobs=n_jobs, chunk_size=chunk_size,
+                                  parallel_branches=pb):
+                    got = oinf.run({'X': X}, n_jobs=n_jobs,
+                                   chunk_size=chunk_size)
+                    self.assertEqual(list(got), ['Y'])
+                    self.assertEqualArray(exp, got['Y'])
+        self.assertRaise(lambda: oinf.run({'X': X}, n_jobs=2,
+                                          intermediate=True),
+                         RuntimeError)
+        oinf = OnnxInference(model_def, reuse_buffers=True)
+        self.assertRaise(lambda: oinf.run({'X': X}, n_jobs=2), RuntimeError)
+        got = oinf.run({'X': X}, chunk_size=6)
+        self.assertEqualArray(exp, got['Y'])
+
+    def test_run_chunks_reduction(self):
+        # the output does not have one row per input row,
+        # chunks cannot be concatenated
+        node = make_node('ReduceMean', ['X'], ['Y'], name='mean',
+                         axes=[0], keepdims=1, noop_with_empty_axes=0)
+        graph = make_graph(
+            [node], 'g',
+            [make_tensor_value_info('X', TensorProto.FLOAT, [None, 3])],
+            [make_tensor_value_info('Y', TensorProto.FLOAT, [1, 3])])
+        model_def = make_model(graph)
+        X = numpy.arange(30).reshape((10, 3)).astype(numpy.float32)
+        oinf = OnnxInference(model_def)
+        for n_jobs, chunk_size in [(2, None), (1, 4)]:
+            with self.subTest(n_jobs=n_jobs, chunk_size=chunk_size):
+                got = oinf.run({'X': X}, n_jobs=n_jobs, chunk_size=chunk_size)
+                self.assertEqualArray(
+                    numpy.array([[13.5, 14.5, 15.5]], dtype=numpy.float32),
+                    got['Y'])
+
+    def test_run_iter(self):
+        model_def = self._model_branches(2)
+        X = numpy.random.randn(20, 3).astype(numpy.float32)
+        oinf = OnnxInference(model_def)
+        exp = oinf.run({'X': X})['Y']
+        for prefetch in [0, 1, 3]:
+            with self.subTest(prefetch=prefetch):
+                chunks = ({'X': X[i:i + 6]} for i in range(0, X.shape[0], 6))
+                got = list(oinf.run_iter(chunks, prefetch=prefetch))
+                self.assertEqual(len(got), 4)
+                self.assertEqualArray(
+                    exp, numpy.vstack([g['Y'] for g in got]))
+
+        def failing():
+            yield {'X': X}
+            raise ValueError("stop")
+
+        it = oinf.run_iter(failing(), prefetch=2)
+        self.assertEqualArray(exp, next(it)['Y'])
+        self.assertRaise(lambda: next(it), ValueError)
+
+        # stops early, the reading thread must end
+        chunks = ({'X': X[i:i + 1]} for i in range(X.shape[0]))
+        it = oinf.run_iter(chunks, prefetch=1)
+        self.assertEqualArray(exp[:1], next(it)['Y'])
+        it.close()
+
+    def test_concatenate_chunks(self):
+        a = numpy.arange(6).reshape((3, 2)).astype(numpy.float32)
+        b = numpy.arange(4).reshape((2, 2)).astype(numpy.float32)
+        res = OnnxInference._concatenate_chunks(  # pylint: disable=W0212
+            'Y', [a, b])
+        self.assertEqualArray(numpy.vstack([a, b]), res)
+
+        res = OnnxInference._concatenate_chunks(  # pylint: disable=W0212
+            'Y', [coo_matrix(a), coo_matrix(b)])
+        self.assertEqual(res.format, 'coo')
+        self.assertEqualArray(numpy.vstack([a, b]), res.toarray())
+
+        keys = {'a': 0, 'b': 1}
+        res = OnnxInference._concatenate_chunks(  # pylint: disable=W0212
+            'Y', [ArrayZipMapDictionary(keys, a),
+                  ArrayZipMapDictionary(keys, b)])
+        self.assertIsInstance(res, ArrayZipMapDictionary)
+        self.assertEqual(len(res), 5)
+        self.assertEqual(res[4]['b'], 3)
+        self.assertEqual(res.columns, ['a', 'b'])
+
+        res = OnnxInference._concatenate_chunks(  # pylint: disable=W0212
+            'Y', [[{'a': 1}], [{'a': 2}, {'a': 3}]])
+        self.assertEqual(res, [{'a': 1}, {'a': 2}, {'a': 3}])
+        self.assertRaise(
+            lambda: OnnxInference._concatenate_chunks(  # pylint: disable=W0212
+                'Y', [numpy.array(1.), numpy.array(2.)]), RuntimeError)
+
+
+if __name__ == "__main__":
+    unittest.main()
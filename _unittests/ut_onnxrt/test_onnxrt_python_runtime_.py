@@ -638,6 +638,27 @@ class TestOnnxrtPythonRuntime(ExtTestCase):
                           dtype=numpy.int64)
         self.assertEqualArray(exp, got['Yi'])
 
+    def test_onnxt_runtime_topk_partition(self):
+        X = numpy.random.randn(20, 100).astype(numpy.float32)
+        for axis in [0, 1]:
+            for k in [1, 7, 20]:
+                with self.subTest(axis=axis, k=k):
+                    onx = OnnxTopK('X', numpy.array([k], dtype=numpy.int64),
+                                   axis=axis, output_names=['Y', 'Yi'])
+                    model_def = onx.to_onnx(
+                        {'X': X}, outputs=[('Y', FloatTensorType(X.shape)),
+                                           ('Yi', Int64TensorType(X.shape))])
+                    oinf = OnnxInference(model_def)
+                    got = oinf.run({'X': X})
+                    sorti = numpy.argsort(X, axis=axis)
+                    exp = numpy.sort(X, axis=axis)
+                    if axis == 0:
+                        sorti, exp = sorti[-k:], exp[-k:]
+                    else:
+                        sorti, exp = sorti[:, -k:], exp[:, -k:]
+                    self.assertEqualArray(exp, got['Y'])
+                    self.assertEqualArray(sorti, got['Yi'])
+
     def test_onnxt_runtime_transpose(self):
         X = numpy.array([[0, 1, 2, 3, 4],
                          [1, -1, -2, 4, 5],
@@ -3,8 +3,14 @@
 """
 import unittest
 from logging import getLogger
+import pickle
 import numpy
 import pandas
+from scipy.sparse import issparse
+from onnx import TensorProto
+from onnx.helper import (
+    make_node, make_graph, make_model, make_tensor_value_info, make_opsetid)
+from onnx.numpy_helper import from_array
 from sklearn.cluster import KMeans
 from sklearn.datasets import load_iris
 from sklearn.feature_extraction import DictVectorizer
@@ -12,10 +18,11 @@ from sklearn.impute import SimpleImputer
 from sklearn.linear_model import LogisticRegression, LinearRegression
 from sklearn.model_selection import train_test_split
 from sklearn.neighbors import KNeighborsRegressor, KNeighborsClassifier
-from sklearn.preprocessing import StandardScaler, Binarizer
+from sklearn.preprocessing import StandardScaler, Binarizer, LabelEncoder
 from pyquickhelper.pycode import ExtTestCase
 from skl2onnx import convert_sklearn
-from skl2onnx.common.data_types import FloatTensorType, StringTensorType, DictionaryType
+from skl2onnx.common.data_types import (
+    FloatTensorType, StringTensorType, DictionaryType, Int64TensorType)
 from skl2onnx import __version__ as skl2onnx_version
 from mlprodict.onnxrt import OnnxInference, to_onnx
 
@@ -244,6 +251,25 @@ class TestOnnxrtPythonRuntimeMl(ExtTestCase):
         self.assertEqual(list(sorted(got)), ['variable'])
         self.assertEqualArray(exp.todense(), got['variable'].todense())
 
+    def test_dict_vectorizer_columnar(self):
+        model = DictVectorizer()
+        data = [{"amy": 1.0, "chin": 200.0}, {"nice": 3.0, "amy": 1.0}, {}]
+        model.fit_transform(data)
+        data.append({"unknown": 4.0, "nice": 5.0})
+        exp = model.transform(data)
+        model_def = convert_sklearn(model, "dictionary vectorizer",
+                                    [("input", DictionaryType(StringTensorType([1]), FloatTensorType([1])))])
+        oinf = OnnxInference(model_def)
+        got = oinf.run({'input': numpy.array(data)})
+        self.assertTrue(issparse(got['variable']))
+        self.assertEqualArray(exp.todense(), got['variable'].todense())
+
+        columnar = [(numpy.array(list(row.keys()), dtype=numpy.str_),
+                     numpy.array(list(row.values()), dtype=numpy.float64))
+                    for row in data]
+        got = oinf.run({'input': columnar})
+        self.assertEqualArray(exp.todense(), got['variable'].todense())
+
     def test_onnxrt_python_SimpleImputer(self):
         iris = load_iris()
         X, y = iris.data, iris.target
@@ -260,6 +286,169 @@ class TestOnnxrtPythonRuntimeMl(ExtTestCase):
         exp = clr.transform(X_test)
         self.assertEqualArray(exp, got['variable'], decimal=6)
 
+    def test_onnxrt_python_LabelEncoder(self):
+        data = numpy.array(['b', 'aa', 'c', 'b', 'ee', 'd'])
+        model = LabelEncoder()
+        model.fit(data[:4])
+        exp = model.transform(data[:4])
+        model_def = convert_sklearn(model, "label encoder",
+                                    [("input", StringTensorType([None]))])
+        oinf = OnnxInference(model_def)
+        got = oinf.run({'input': data})
+        self.assertEqual(list(sorted(got)), ['variable'])
+        self.assertEqualArray(exp, got['variable'][:4])
+        self.assertEqualArray(numpy.array([-1, -1]), got['variable'][4:])
+        got = oinf.run({'input': data.astype(object)})
+        self.assertEqualArray(exp, got['variable'][:4])
+
+        data = numpy.array([5, 1, 3, 3, 7, 1], dtype=numpy.int64)
+        model = LabelEncoder()
+        model.fit(data[:4])
+        exp = model.transform(data[:4])
+        model_def = convert_sklearn(model, "label encoder",
+                                    [("input", Int64TensorType([None]))])
+        oinf = OnnxInference(model_def)
+        got = oinf.run({'input': data})
+        self.assertEqualArray(exp, got['variable'][:4])
+        self.assertEqualArray(numpy.array([-1, 0]), got['variable'][4:])
+
+    def test_onnxrt_python_OneHotEncoder(self):
+        data = numpy.array([[5, 1], [3, 1], [7, 2], [5, 2]], dtype=numpy.int64)
+        exp = numpy.zeros((4, 2, 5), dtype=numpy.float32)
+        for i, j, k in [(0, 0, 0), (0, 1, 3), (1, 0, 1), (1, 1, 3),
+                        (2, 0, 2), (2, 1, 4), (3, 0, 0), (3, 1, 4)]:
+            exp[i, j, k] = 1
+        node = make_node('OneHotEncoder', ['X'], ['Y'], name='ohe',
+                         domain='ai.onnx.ml', cats_int64s=[5, 3, 7, 1, 2],
+                         zeros=1)
+        graph = make_graph(
+            [node], 'ohe',
+            [make_tensor_value_info('X', TensorProto.INT64, [None, 2])],
+            [make_tensor_value_info('Y', TensorProto.FLOAT, [None, 2, 5])])
+        model_def = make_model(graph, opset_imports=[
+            make_opsetid('', 11), make_opsetid('ai.onnx.ml', 1)])
+        oinf = OnnxInference(model_def, runtime='python')
+        got = oinf.run({'X': data})
+        self.assertEqualArray(exp, got['Y'])
+
+        data[0, 0] = 4
+        exp[0, 0, 0] = 0
+        got = oinf.run({'X': data})
+        self.assertEqualArray(exp, got['Y'])
+
+        node = make_node('OneHotEncoder', ['X'], ['Y'], name='ohe',
+                         domain='ai.onnx.ml', cats_int64s=[5, 3, 7, 1, 2],
+                         zeros=0)
+        graph = make_graph(
+            [node], 'ohe',
+            [make_tensor_value_info('X', TensorProto.INT64, [None, 2])],
+            [make_tensor_value_info('Y', TensorProto.FLOAT, [None, 2, 5])])
+        model_def = make_model(graph, opset_imports=[
+            make_opsetid('', 11), make_opsetid('ai.onnx.ml', 1)])
+        oinf = OnnxInference(model_def, runtime='python')
+        self.assertRaise(lambda: oinf.run({'X': data}), RuntimeError)
+
+    def test_onnxrt_python_OneHotEncoder_sparse(self):
+        node1 = make_node('OneHotEncoder', ['X'], ['H'], name='ohe',
+                          domain='ai.onnx.ml', cats_strings=['c', 'a', 'b'],
+                          zeros=1)
+        node2 = make_node('LinearRegressor', ['H'], ['Y'], name='lin',
+                          domain='ai.onnx.ml', coefficients=[1., 2., 3.],
+                          intercepts=[0.5])
+        graph = make_graph(
+            [node1, node2], 'ohe',
+            [make_tensor_value_info('X', TensorProto.STRING, [None, 1])],
+            [make_tensor_value_info('Y', TensorProto.FLOAT, [None, 1])])
+        model_def = make_model(graph, opset_imports=[
+            make_opsetid('', 11), make_opsetid('ai.onnx.ml', 1)])
+        X = numpy.array([['a'], ['b'], ['z'], ['c']])
+        exp_h = numpy.array([[0, 1, 0], [0, 0, 1], [0, 0, 0], [1, 0, 0]],
+                            dtype=numpy.float32)
+        exp = numpy.array([[2.5], [3.5], [0.5], [1.5]], dtype=numpy.float32)
+
+        oinf = OnnxInference(model_def, runtime='python')
+        got = oinf.run({'X': X}, intermediate=True)
+        self.assertEqualArray(exp_h, got['H'])
+        self.assertEqualArray(exp, got['Y'])
+
+        self.assertFalse(oinf.sequence_[0].ops_.sparse_output_)
+
+        oinf = OnnxInference(model_def, runtime='python',
+                             sparse_one_hot=True)
+        got = oinf.run({'X': X}, intermediate=True)
+        self.assertTrue(issparse(got['H']))
+        self.assertEqual(got['H'].nnz, 3)
+        self.assertEqualArray(exp_h, got['H'].todense())
+        self.assertEqualArray(exp, got['Y'])
+        pkl = pickle.loads(pickle.dumps(oinf))
+        self.assertTrue(pkl.sequence_[0].ops_.sparse_output_)
+        self.assertEqualArray(exp, pkl.run({'X': X})['Y'])
+
+        # Concat does not accept sparse inputs
+        node3 = make_node('Concat', ['H', 'Y'], ['Z'], name='concat',
+                          axis=1)
+        graph = make_graph(
+            [node1, node2, node3], 'ohe',
+            [make_tensor_value_info('X', TensorProto.STRING, [None, 1])],
+            [make_tensor_value_info('Z', TensorProto.FLOAT, [None, 4])])
+        model_def = make_model(graph, opset_imports=[
+            make_opsetid('', 11), make_opsetid('ai.onnx.ml', 1)])
+        oinf = OnnxInference(model_def, runtime='python',
+                             sparse_one_hot=True)
+        self.assertFalse(oinf.sequence_[0].ops_.sparse_output_)
+        got = oinf.run({'X': X})
+        self.assertEqualArray(numpy.hstack([exp_h, exp]), got['Z'])
+
+    def test_onnxrt_python_Imputer_inplace(self):
+        X = numpy.array([[1, numpy.nan, 3], [numpy.nan, 5, numpy.nan]],
+                        dtype=numpy.float32)
+        exp = numpy.array([[2, 10, 4], [-9, 6, 30]], dtype=numpy.float32)
+
+        def _make_model(identity):
+            nodes = [make_node('Add', ['X', 'one'], ['A'], name='add')]
+            if identity:
+                nodes.append(make_node('Identity', ['A'], ['T'], name='id'))
+            nodes.append(make_node(
+                'Imputer', ['T' if identity else 'A'], ['Y'], name='imp',
+                domain='ai.onnx.ml', imputed_value_floats=[-9., 10., 30.],
+                replaced_value_float=numpy.nan))
+            outputs = [make_tensor_value_info('Y', TensorProto.FLOAT, None)]
+            if identity:
+                outputs.append(
+                    make_tensor_value_info('A', TensorProto.FLOAT, None))
+            graph = make_graph(
+                nodes, 'imp',
+                [make_tensor_value_info('X', TensorProto.FLOAT, None)],
+                outputs, [from_array(numpy.array([1], dtype=numpy.float32),
+                                     name='one')])
+            return make_model(graph, opset_imports=[
+                make_opsetid('', 11), make_opsetid('ai.onnx.ml', 1)])
+
+        model_def = _make_model(False)
+        for inplace in [False, True]:
+            for runtime in ['python', 'python_compiled']:
+                with self.subTest(inplace=inplace, runtime=runtime):
+                    oinf = OnnxInference(model_def, runtime=runtime,
+                                         inplace=inplace)
+                    self.assertEqual(oinf.sequence_[1].ops_.inplace_, inplace)
+                    got = oinf.run({'X': X})
+                    self.assertEqualArray(exp, got['Y'])
+                    got = oinf.run({'X': X}, intermediate=True)
+                    self.assertFalse(
+                        numpy.may_share_memory(got['A'], got['Y']))
+                    self.assertEqualArray(X + 1, got['A'])
+                    self.assertEqualArray(exp, got['Y'])
+                    self.assertEqual(oinf.sequence_[1].ops_.inplace_, inplace)
+                    self.assertTrue(numpy.isnan(X).any())
+
+        # the input of the imputer is an alias of an output
+        model_def = _make_model(True)
+        oinf = OnnxInference(model_def, runtime='python', inplace=True)
+        self.assertFalse(oinf.sequence_[2].ops_.inplace_)
+        got = oinf.run({'X': X})
+        self.assertEqualArray(exp, got['Y'])
+        self.assertEqualArray(X + 1, got['A'])
+
 
 if __name__ == "__main__":
     unittest.main()
@@ -4,6 +4,9 @@
 import unittest
 from logging import getLogger
 import numpy
+from onnx.helper import (
+    make_node, make_graph, make_model, make_tensor_value_info, make_opsetid)
+from onnx import TensorProto
 from sklearn.datasets import load_iris
 from sklearn.model_selection import train_test_split
 from sklearn.svm import SVR, SVC, LinearSVC
@@ -20,8 +23,8 @@ class TestOnnxrtPythonRuntimeMlSVM(ExtTestCase):
         logger.disabled = True
 
     def test_openmp_compilation(self):
-        from mlprodict.onnxrt.ops_cpu.op_svm_regressor_ import RuntimeSVMRegressor  # pylint: disable=E0611
-        ru = RuntimeSVMRegressor()
+        from mlprodict.onnxrt.ops_cpu.op_svm_regressor_ import RuntimeSVMRegressorFloat  # pylint: disable=E0611
+        ru = RuntimeSVMRegressorFloat()
         r = ru.runtime_options()
         self.assertEqual('OPENMP', r)
         nb = ru.omp_get_max_threads()
@@ -113,6 +116,145 @@ class TestOnnxrtPythonRuntimeMlSVM(ExtTestCase):
         self.assertEqualArray(lexp, y['output_label'], decimal=5)
         self.assertEqualArray(lprob, got, decimal=5)
 
+    @ignore_warnings(category=(UserWarning, ConvergenceWarning, RuntimeWarning))
+    def test_onnxrt_python_SVM_blocks(self):
+        # kernels are computed by blocks of rows, results must not
+        # depend on the number of rows
+        iris = load_iris()
+        X, y = iris.data, iris.target
+        X = numpy.vstack([X] * 3).astype(numpy.float32)
+        y = numpy.hstack([y] * 3)
+        for clr, name in [(SVR(kernel='poly'), 'variable'),
+                          (SVC(kernel='rbf'), 'output_label')]:
+            with self.subTest(model=clr.__class__.__name__):
+                clr.fit(X, y)
+                model_def = to_onnx(clr, X)
+                oinf = OnnxInference(model_def)
+                lexp = clr.predict(X)
+                got = oinf.run({'X': X})[name]
+                self.assertEqualArray(lexp, got, decimal=4)
+                for i in [0, 1, 63, 64, 65, 200]:
+                    got = oinf.run({'X': X[i:i + 70]})[name]
+                    self.assertEqualArray(lexp[i:i + 70], got, decimal=4)
+
+    def test_svm_double(self):
+        from mlprodict.onnxrt.ops_cpu.op_svm_regressor_ import (  # pylint: disable=E0611
+            RuntimeSVMRegressorFloat, RuntimeSVMRegressorDouble)
+        from mlprodict.onnxrt.ops_cpu.op_svm_classifier_ import (  # pylint: disable=E0611
+            RuntimeSVMClassifierFloat, RuntimeSVMClassifierDouble)
+        # the difference between both features cannot be represented with a float
+        X = numpy.array([[1e8 + 1, 1e8]])
+        exp = {numpy.float32: 0, numpy.float64: 1}
+        for cl, dtype in [(RuntimeSVMRegressorFloat, numpy.float32),
+                          (RuntimeSVMRegressorDouble, numpy.float64)]:
+            ru = cl()
+            ru.init(numpy.array([1, -1], dtype=dtype), numpy.empty(0, dtype=dtype),
+                    'LINEAR', 0, 0, 'NONE', numpy.array([0], dtype=dtype),
+                    numpy.empty(0, dtype=dtype))
+            got = ru.compute(X.astype(dtype))
+            self.assertEqual(got.dtype, dtype)
+            self.assertEqualArray(numpy.array([exp[dtype]], dtype=dtype), got)
+
+        for cl, dtype in [(RuntimeSVMClassifierFloat, numpy.float32),
+                          (RuntimeSVMClassifierDouble, numpy.float64)]:
+            ru = cl()
+            ru.init(numpy.array([0, 1], dtype=numpy.int64), [],
+                    numpy.array([1, -1, -1, 1], dtype=dtype),
+                    numpy.empty(0, dtype=dtype), 'LINEAR', 'NONE',
+                    numpy.empty(0, dtype=dtype), numpy.empty(0, dtype=dtype),
+                    numpy.array([-0.5], dtype=dtype),
+                    numpy.empty(0, dtype=dtype), numpy.empty(0, dtype=numpy.int64))
+            label, scores = ru.compute(X.astype(dtype))
+            self.assertEqual(scores.dtype, dtype)
+            self.assertEqualArray(numpy.array([exp[dtype]], dtype=numpy.int64),
+                                  label)
+
+    def _model_svm_regressor(self, op_type, domain, proto_type):
+        node = make_node(op_type, ['X'], ['Y'], domain=domain,
+                         coefficients=[1., -1.], kernel_params=[0.5, 0., 3.],
+                         kernel_type='RBF', n_supports=2, rho=[0.1],
+                         support_vectors=[0.1, 0.2, 0.3, 0.4])
+        graph = make_graph(
+            [node], 'svm', [make_tensor_value_info('X', proto_type, [None, 2])],
+            [make_tensor_value_info('Y', proto_type, [None, 1])])
+        return make_model(graph, opset_imports=[
+            make_opsetid('', 11), make_opsetid(domain, 1)])
+
+    def test_svm_regressor_double_switch(self):
+        X = numpy.array([[0.1, 0.2], [1e-8, 1.]])
+        d0 = ((X - numpy.array([0.1, 0.2])) ** 2).sum(axis=1)
+        d1 = ((X - numpy.array([0.3, 0.4])) ** 2).sum(axis=1)
+        exp = numpy.exp(-0.5 * d0) - numpy.exp(-0.5 * d1) + 0.1
+
+        model_def = self._model_svm_regressor(
+            'SVMRegressor', 'ai.onnx.ml', TensorProto.FLOAT)
+        oinf = OnnxInference(model_def, runtime='python')
+        got = oinf.run({'X': X.astype(numpy.float32)})['Y']
+        self.assertEqual(got.dtype, numpy.float32)
+        self.assertEqualArray(exp.astype(numpy.float32), got, decimal=5)
+
+        done = oinf.switch_initializers_dtype()
+        self.assertIn('RuntimeSVMRegressorDouble', [d[-1] for d in done])
+        got = oinf.run({'X': X})['Y']
+        self.assertEqual(got.dtype, numpy.float64)
+        self.assertEqualArray(exp, got, decimal=7)
+
+        model_def = self._model_svm_regressor(
+            'SVMRegressorDouble', 'mlprodict', TensorProto.DOUBLE)
+        oinf = OnnxInference(model_def, runtime='python')
+        text = "\n".join(map(lambda x: str(x.ops_), oinf.sequence_))
+        self.assertIn("SVMRegressorDouble", text)
+        got = oinf.run({'X': X})['Y']
+        self.assertEqual(got.dtype, numpy.float64)
+        self.assertEqualArray(exp, got, decimal=7)
+
+    def test_svm_parallel_settings(self):
+        from mlprodict.onnxrt.ops_cpu.op_svm_regressor_ import RuntimeSVMRegressorFloat  # pylint: disable=E0611
+        ru = RuntimeSVMRegressorFloat()
+        ru.set_num_threads(2)
+        ru.set_schedule('dynamic', 4)
+        ru.set_parallel_threshold(100)
+        self.assertEqual(
+            'OPENMP NUM_THREADS=2 SCHEDULE=dynamic,4 PARALLEL_THRESHOLD=100',
+            ru.runtime_options())
+        self.assertRaise(lambda: ru.set_schedule('guided', 0), RuntimeError)
+        self.assertRaise(lambda: ru.set_num_threads(-1), RuntimeError)
+
+    def test_svm_runtime_options(self):
+        X = numpy.random.rand(300, 2)
+        model_def = self._model_svm_regressor(
+            'SVMRegressor', 'ai.onnx.ml', TensorProto.FLOAT)
+        exp = OnnxInference(model_def, runtime='python').run(
+            {'X': X.astype(numpy.float32)})['Y']
+        options = [dict(num_threads=1),
+                   dict(num_threads=2, schedule='dynamic', chunk_size=7),
+                   dict(parallel_threshold=1000)]
+        for opts in options:
+            with self.subTest(options=opts):
+                oinf = OnnxInference(model_def, runtime='python',
+                                     runtime_options=opts)
+                rt = oinf.sequence_[0].ops_.rt_
+                if 'num_threads' in opts:
+                    self.assertIn('NUM_THREADS=%d' % opts['num_threads'],
+                                  rt.runtime_options())
+                got = oinf.run({'X': X.astype(numpy.float32)})['Y']
+                self.assertEqualArray(exp, got)
+
+                # the options are kept when the runtime is replaced
+                oinf.switch_initializers_dtype()
+                rt = oinf.sequence_[0].ops_.rt_
+                self.assertIn('Double', type(rt).__name__)
+                if 'parallel_threshold' in opts:
+                    self.assertIn('PARALLEL_THRESHOLD=1000',
+                                  rt.runtime_options())
+                got = oinf.run({'X': X})['Y']
+                self.assertEqualArray(exp, got, decimal=5)
+
+        self.assertRaise(
+            lambda: OnnxInference(model_def, runtime='python',
+                                  runtime_options=dict(nthreads=2)),
+            ValueError)
+
 
 if __name__ == "__main__":
     unittest.main()
@@ -176,6 +176,50 @@ class TestOnnxrtPythonRuntimeMlTree(ExtTestCase):
                                    y64['variable'].astype(numpy.float64)))
         self.assertLesser(diff, 1e-5)
 
+    def test_onnxrt_python_RandomForestClassifier64(self):
+        iris = load_iris()
+        X, y = iris.data, iris.target
+        X_train, X_test, y_train, _ = train_test_split(X, y, random_state=11)
+        for clr in [DecisionTreeClassifier(), RandomForestClassifier(n_estimators=5),
+                    GradientBoostingClassifier(n_estimators=5)]:
+            clr.fit(X_train, y_train)
+            lexp = clr.predict(X_test)
+            pexp = clr.predict_proba(X_test)
+
+            model_def64 = to_onnx(clr, X_train.astype(numpy.float64),
+                                  dtype=numpy.float64, rewrite_ops=True)
+            oinf64 = OnnxInference(model_def64)
+            text = "\n".join(map(lambda x: str(x.ops_), oinf64.sequence_))
+            self.assertIn("TreeEnsembleClassifierDouble", text)
+            smodel_def64 = str(model_def64)
+            self.assertNotIn('floats', smodel_def64)
+            y64 = oinf64.run({'X': X_test.astype(numpy.float64)})
+            self.assertEqualArray(lexp, y64['output_label'])
+            got = pandas.DataFrame(list(y64['output_probability'])).values
+            self.assertEqualArray(pexp, got, decimal=5)
+
+            model_def32 = to_onnx(clr, X_train.astype(numpy.float32),
+                                  dtype=numpy.float32, rewrite_ops=True)
+            oinf32 = OnnxInference(model_def32)
+            text = "\n".join(map(lambda x: str(x.ops_), oinf32.sequence_))
+            self.assertIn("TreeEnsembleClassifier", text)
+            self.assertNotIn("TreeEnsembleClassifierDouble", text)
+
+    def test_onnxrt_python_DecisionTreeClassifier_multi_output(self):
+        iris = load_iris()
+        X, y = iris.data, iris.target
+        y = numpy.vstack([y, (y == 1).astype(numpy.int64)]).T
+        clr = DecisionTreeClassifier(max_depth=3)
+        clr.fit(X, y)
+        exp = to_onnx(clr, X.astype(numpy.float32), dtype=numpy.float32)
+        model_def32 = to_onnx(clr, X.astype(numpy.float32),
+                              dtype=numpy.float32, rewrite_ops=True)
+        self.assertEqual([n.op_type for n in exp.graph.node],
+                         [n.op_type for n in model_def32.graph.node])
+        self.assertRaise(
+            lambda: to_onnx(clr, X, dtype=numpy.float64, rewrite_ops=True),
+            NotImplementedError)
+
     def test_onnxrt_python_GradientBoostingRegressor64(self):
         iris = load_iris()
         X, y = iris.data, iris.target
@@ -267,21 +311,211 @@ class TestOnnxrtPythonRuntimeMlTree(ExtTestCase):
         got = pandas.DataFrame(list(y['output_probability'])).values
         self.assertEqualArray(exp, got, decimal=5)
 
+    def test_packed_nodes(self):
+        from mlprodict.onnxrt.ops_cpu.op_tree_ensemble_regressor_ import (  # pylint: disable=E0611
+            RuntimeTreeEnsembleRegressorFloat, RuntimeTreeEnsembleRegressorDouble)
+        # tree 0 is stored depth-first, tree 1 is a single leaf
+        i64 = lambda v: numpy.array(v, dtype=numpy.int64)
+        for cl, dtype in [(RuntimeTreeEnsembleRegressorFloat, numpy.float32),
+                          (RuntimeTreeEnsembleRegressorDouble, numpy.float64)]:
+            ru = cl()
+            ru.init('SUM', numpy.array([0.5], dtype=dtype), 1,
+                    i64([2, 0, 4, 0, 0, 0]), i64([0, 0, 1, 0, 0, 0]),
+                    numpy.ones(6, dtype=dtype), i64([0, 0, 1, 0, 0, 0]),
+                    ['BRANCH_LEQ', 'LEAF', 'BRANCH_LEQ', 'LEAF', 'LEAF', 'LEAF'],
+                    i64([0, 1, 2, 3, 4, 0]), i64([0, 0, 0, 0, 0, 1]),
+                    i64([1, 0, 3, 0, 0, 0]),
+                    numpy.array([0.5, 0, 0, 0, 0, 0], dtype=dtype), 'NONE',
+                    i64([0, 0, 0, 0]), i64([1, 3, 4, 0]), i64([0, 0, 0, 1]),
+                    numpy.array([1, 2, 3, 10], dtype=dtype))
+            self.assertEqual(len(ru.packed_roots_), 2)
+            X = numpy.array([[0, 5], [1, -1], [1, 1], [1, numpy.nan]],
+                            dtype=dtype)
+            got = ru.compute(X)
+            self.assertEqualArray(
+                numpy.array([11.5, 12.5, 13.5, 12.5], dtype=dtype), got)
+
+    def test_leaf_weights_classifier(self):
+        from mlprodict.onnxrt.ops_cpu.op_tree_ensemble_classifier_ import RuntimeTreeEnsembleClassifierFloat  # pylint: disable=E0611
+        i64 = lambda v: numpy.array(v, dtype=numpy.int64)
+        ru = RuntimeTreeEnsembleClassifierFloat()
+        ru.init(numpy.empty(0, dtype=numpy.float32), i64([0, 1, 2]),
+                i64([1, 2, 2]), i64([0, 0, 0]),
+                numpy.array([1, 0.3, 0.7], dtype=numpy.float32),
+                i64([0, 1, 2]), [], i64([2, 0, 0]), i64([0, 0, 0]),
+                numpy.ones(3, dtype=numpy.float32), i64([]),
+                ['BRANCH_LEQ', 'LEAF', 'LEAF'], i64([0, 1, 2]),
+                i64([0, 0, 0]), i64([1, 0, 0]),
+                numpy.array([0.5, 0, 0], dtype=numpy.float32), 'NONE')
+        X = numpy.array([[0], [1], [0.2]], dtype=numpy.float32)
+        label, proba = ru.compute(X)
+        self.assertEqualArray(i64([0, 2, 0]), label)
+        self.assertEqualArray(
+            numpy.array([[1, 0, 0], [0, 0.3, 0.7], [1, 0, 0]],
+                        dtype=numpy.float32),
+            proba.reshape((3, -1)))
+
+    def test_classifier_double(self):
+        from mlprodict.onnxrt.ops_cpu.op_tree_ensemble_classifier_ import (  # pylint: disable=E0611
+            RuntimeTreeEnsembleClassifierFloat, RuntimeTreeEnsembleClassifierDouble)
+        i64 = lambda v: numpy.array(v, dtype=numpy.int64)
+        # the threshold cannot be represented with a float
+        threshold = 0.1 + 1e-12
+        X = numpy.array([[0.1], [threshold], [threshold + 1e-12]])
+        exp_labels = {numpy.float32: [0, 0, 0], numpy.float64: [0, 0, 2]}
+        for cl, dtype in [(RuntimeTreeEnsembleClassifierFloat, numpy.float32),
+                          (RuntimeTreeEnsembleClassifierDouble, numpy.float64)]:
+            ru = cl()
+            ru.init(numpy.empty(0, dtype=dtype), i64([0, 2]),
+                    i64([1, 2]), i64([0, 0]), numpy.array([1, 1], dtype=dtype),
+                    i64([0, 1, 2]), [], i64([2, 0, 0]), i64([0, 0, 0]),
+                    numpy.ones(3, dtype=dtype), i64([]),
+                    ['BRANCH_LEQ', 'LEAF', 'LEAF'], i64([0, 1, 2]),
+                    i64([0, 0, 0]), i64([1, 0, 0]),
+                    numpy.array([threshold, 0, 0], dtype=dtype), 'NONE')
+            label, proba = ru.compute(X.astype(dtype))
+            self.assertEqual(proba.dtype, dtype)
+            self.assertEqualArray(i64(exp_labels[dtype]), label)
+
     def test_openmp_compilation(self):
         from mlprodict.onnxrt.ops_cpu.op_tree_ensemble_regressor_ import RuntimeTreeEnsembleRegressorFloat  # pylint: disable=E0611
         ru = RuntimeTreeEnsembleRegressorFloat()
         r = ru.runtime_options()
-        self.assertEqual('OPENMP', r)
+        self.assertEqual('OPENMP BLOCK_SIZE=128 TREE_PARALLEL_THRESHOLD=8', r)
         nb = ru.omp_get_max_threads()
         self.assertGreater(nb, 0)
 
-        from mlprodict.onnxrt.ops_cpu.op_tree_ensemble_classifier_ import RuntimeTreeEnsembleClassifier  # pylint: disable=E0611
-        ru = RuntimeTreeEnsembleClassifier()
+        from mlprodict.onnxrt.ops_cpu.op_tree_ensemble_classifier_ import RuntimeTreeEnsembleClassifierFloat  # pylint: disable=E0611
+        ru = RuntimeTreeEnsembleClassifierFloat()
         r = ru.runtime_options()
-        self.assertEqual('OPENMP', r)
+        self.assertEqual('OPENMP BLOCK_SIZE=128 TREE_PARALLEL_THRESHOLD=8', r)
         nb2 = ru.omp_get_max_threads()
         self.assertEqual(nb2, nb)
 
+    def test_block_size(self):
+        from mlprodict.onnxrt.ops_cpu.op_tree_ensemble_regressor_ import RuntimeTreeEnsembleRegressorFloat  # pylint: disable=E0611
+        from mlprodict.onnxrt.ops_cpu.op_tree_ensemble_classifier_ import RuntimeTreeEnsembleClassifierFloat  # pylint: disable=E0611
+        i64 = lambda v: numpy.array(v, dtype=numpy.int64)
+        reg = RuntimeTreeEnsembleRegressorFloat()
+        reg.init('SUM', numpy.array([0.5], dtype=numpy.float32), 1,
+                 i64([2, 0, 4, 0, 0, 0]), i64([0, 0, 1, 0, 0, 0]),
+                 numpy.ones(6, dtype=numpy.float32), i64([0, 0, 1, 0, 0, 0]),
+                 ['BRANCH_LEQ', 'LEAF', 'BRANCH_LEQ', 'LEAF', 'LEAF', 'LEAF'],
+                 i64([0, 1, 2, 3, 4, 0]), i64([0, 0, 0, 0, 0, 1]),
+                 i64([1, 0, 3, 0, 0, 0]),
+                 numpy.array([0.5, 0, 0, 0, 0, 0], dtype=numpy.float32),
+                 'NONE', i64([0, 0, 0, 0]), i64([1, 3, 4, 0]),
+                 i64([0, 0, 0, 1]),
+                 numpy.array([1, 2, 3, 10], dtype=numpy.float32))
+        clr = RuntimeTreeEnsembleClassifierFloat()
+        clr.init(numpy.empty(0, dtype=numpy.float32), i64([0, 1, 2]),
+                 i64([1, 2, 2]), i64([0, 0, 0]),
+                 numpy.array([1, 0.3, 0.7], dtype=numpy.float32),
+                 i64([0, 1, 2]), [], i64([2, 0, 0]), i64([0, 0, 0]),
+                 numpy.ones(3, dtype=numpy.float32), i64([]),
+                 ['BRANCH_LEQ', 'LEAF', 'LEAF'], i64([0, 1, 2]),
+                 i64([0, 0, 0]), i64([1, 0, 0]),
+                 numpy.array([0.5, 0, 0], dtype=numpy.float32), 'NONE')
+        X = numpy.random.randn(37, 2).astype(numpy.float32)
+        nth = reg.omp_get_max_threads()
+        for ru in [reg, clr]:
+            ru.block_size_ = 1
+            self.assertEqual(ru.schedule(37), 'ROWS')
+            # the classifier has only one tree
+            self.assertEqual(ru.schedule(1), 'TREES' if ru is reg else 'ROWS')
+            exp = ru.compute(X)
+            for block_size in [3, 128]:
+                ru.block_size_ = block_size
+                self.assertIn('BLOCK_SIZE=%d' % block_size,
+                              ru.runtime_options())
+                self.assertEqual(
+                    ru.schedule(37),
+                    'BLOCKS:%d' % min(block_size, (37 + nth - 1) // nth))
+                self.assertEqual(ru.schedule(10), 'BLOCKS:%d' % min(
+                    block_size, (10 + nth - 1) // nth))
+                got = ru.compute(X)
+                if isinstance(exp, tuple):
+                    for e, g in zip(exp, got):
+                        self.assertEqualArray(e, g)
+                else:
+                    self.assertEqualArray(exp, got)
+
+
+    def test_tree_parallel(self):
+        from mlprodict.onnxrt.ops_cpu.op_tree_ensemble_regressor_ import RuntimeTreeEnsembleRegressorDouble  # pylint: disable=E0611
+        i64 = lambda v: numpy.array(v, dtype=numpy.int64)
+        X = numpy.random.randn(5, 2)
+        for agg in ['SUM', 'AVERAGE', 'MIN', 'MAX']:
+            ru = RuntimeTreeEnsembleRegressorDouble()
+            ru.init(agg, numpy.array([0.5]), 1,
+                    i64([2, 0, 4, 0, 0, 0]), i64([0, 0, 1, 0, 0, 0]),
+                    numpy.ones(6), i64([0, 0, 1, 0, 0, 0]),
+                    ['BRANCH_LEQ', 'LEAF', 'BRANCH_LEQ', 'LEAF', 'LEAF', 'LEAF'],
+                    i64([0, 1, 2, 3, 4, 0]), i64([0, 0, 0, 0, 0, 1]),
+                    i64([1, 0, 3, 0, 0, 0]),
+                    numpy.array([0.5, 0, 0, 0, 0, 0]), 'NONE',
+                    i64([0, 0, 0, 0]), i64([1, 3, 4, 0]), i64([0, 0, 0, 1]),
+                    numpy.array([1., 2., 3., 10.]))
+            with self.subTest(aggregate_function=agg):
+                ru.tree_parallel_threshold_ = 0
+                self.assertNotEqual(ru.schedule(5), 'TREES')
+                exp = ru.compute(X)
+                ru.tree_parallel_threshold_ = 6
+                self.assertEqual(ru.schedule(5), 'TREES')
+                self.assertNotEqual(ru.schedule(6), 'TREES')
+                self.assertEqualArray(exp, ru.compute(X))
+                self.assertEqualArray(exp[:1], ru.compute(X[:1]))
+
+    def test_binning(self):
+        from mlprodict.onnxrt.ops_cpu.op_tree_ensemble_regressor_ import (  # pylint: disable=E0611
+            RuntimeTreeEnsembleRegressorFloat, RuntimeTreeEnsembleRegressorDouble)
+        from mlprodict.onnxrt.ops_cpu.op_tree_ensemble_classifier_ import RuntimeTreeEnsembleClassifierDouble  # pylint: disable=E0611
+        i64 = lambda v: numpy.array(v, dtype=numpy.int64)
+        # values equal to the thresholds, missing and infinite values
+        X = numpy.array([[v, w] for v in [-1, 0.5, 0.7, 1, 2, numpy.nan]
+                         for w in [0.5, 1, numpy.inf, numpy.nan]])
+        modes = ['BRANCH_LEQ', 'BRANCH_LT', 'BRANCH_GTE', 'BRANCH_GT',
+                 'BRANCH_EQ', 'BRANCH_NEQ']
+        for mode in modes:
+            for cl, dtype in [(RuntimeTreeEnsembleRegressorFloat, numpy.float32),
+                              (RuntimeTreeEnsembleRegressorDouble, numpy.float64)]:
+                ru = cl()
+                ru.init('SUM', numpy.array([0.5], dtype=dtype), 1,
+                        i64([2, 0, 4, 0, 0, 2, 0, 0]), i64([0, 0, 1, 0, 0, 0, 0, 0]),
+                        numpy.ones(8, dtype=dtype), i64([0, 0, 1, 0, 0, 0, 0, 0]),
+                        [mode, 'LEAF', mode, 'LEAF', 'LEAF', mode, 'LEAF', 'LEAF'],
+                        i64([0, 1, 2, 3, 4, 0, 1, 2]), i64([0, 0, 0, 0, 0, 1, 1, 1]),
+                        i64([1, 0, 3, 0, 0, 1, 0, 0]),
+                        numpy.array([0.5, 0, 1, 0, 0, 0.7, 0, 0], dtype=dtype),
+                        'NONE', i64([0, 0, 0, 0, 0]), i64([1, 3, 4, 1, 2]),
+                        i64([0, 0, 0, 1, 1]),
+                        numpy.array([1, 2, 3, 10, 20], dtype=dtype))
+                self.assertEqual(list(ru.bin_features_), [0, 1])
+                with self.subTest(mode=mode, dtype=dtype):
+                    ru.binning_ = False
+                    self.assertNotIn('BINNING', ru.runtime_options())
+                    exp = ru.compute(X.astype(dtype))
+                    ru.binning_ = True
+                    self.assertIn('BINNING', ru.runtime_options())
+                    for th in [0, 100]:
+                        ru.tree_parallel_threshold_ = th
+                        self.assertEqualArray(exp, ru.compute(X.astype(dtype)))
+
+        clr = RuntimeTreeEnsembleClassifierDouble()
+        clr.init(numpy.empty(0), i64([0, 1, 2]), i64([1, 3, 4]), i64([0, 0, 0]),
+                 numpy.array([1, 0.3, 0.7]), i64([0, 1, 2]), [],
+                 i64([2, 0, 4, 0, 0]), i64([0, 0, 1, 0, 0]), numpy.ones(5),
+                 i64([1, 0, 0, 0, 0]),
+                 ['BRANCH_LEQ', 'LEAF', 'BRANCH_NEQ', 'LEAF', 'LEAF'],
+                 i64([0, 1, 2, 3, 4]), i64([0, 0, 0, 0, 0]), i64([1, 0, 3, 0, 0]),
+                 numpy.array([0.5, 0, 1, 0, 0]), 'NONE')
+        clr.binning_ = False
+        exp = clr.compute(X)
+        clr.binning_ = True
+        got = clr.compute(X)
+        self.assertEqualArray(exp[0], got[0])
+        self.assertEqualArray(exp[1], got[1])
+
 
 if __name__ == "__main__":
     unittest.main()
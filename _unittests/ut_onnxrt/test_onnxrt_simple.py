@@ -10,7 +10,10 @@ from logging import getLogger
 import numpy
 import pandas
 from onnx.onnx_cpp2py_export.checker import ValidationError  # pylint: disable=E0401,E0611
-from onnx.helper import make_tensor
+from onnx.helper import (
+    make_tensor, make_node, make_graph, make_model,
+    make_tensor_value_info)
+from onnx.numpy_helper import from_array
 from onnx import TensorProto
 from sklearn.datasets import load_iris
 from sklearn.model_selection import train_test_split
@@ -183,6 +186,178 @@ class TestOnnxrtSimple(ExtTestCase):
         self.assertEqual(list(y), ['Y'])
         self.assertEqualArray(y['Y'], exp)
 
+    def test_onnxt_run_clean_right_away(self):
+        idi = numpy.identity(2).astype(numpy.float32)
+        idi2 = (numpy.identity(2) * 2).astype(numpy.float32)
+        onx = OnnxAdd(OnnxAdd('X', idi), idi2, output_names=['Y'])
+        model_def = onx.to_onnx({'X': idi})
+        oinf = OnnxInference(model_def)
+        cleaned = set()
+        for node in oinf.sequence_:
+            cleaned |= set(node.variable_to_clean)
+        self.assertIn('X', cleaned)
+        self.assertNotIn('Y', cleaned)
+        X = numpy.array([[1, 1], [3, 3]], dtype=numpy.float32)
+        exp = numpy.array([[4, 1], [3, 6]], dtype=numpy.float32)
+        for clean in [None, True, False]:
+            y = oinf.run({'X': X}, clean_right_away=clean)
+            self.assertEqual(list(y), ['Y'])
+            self.assertEqualArray(y['Y'], exp)
+            y, mtime = oinf.run({'X': X}, clean_right_away=clean,
+                                node_time=True)
+            self.assertEqualArray(y['Y'], exp)
+            self.assertEqual(len(mtime), len(oinf.sequence_))
+        y = oinf.run({'X': X}, intermediate=True)
+        self.assertIn('X', y)
+        self.assertEqualArray(y['Y'], exp)
+        self.assertRaise(lambda: oinf.run({'X': X}, clean_right_away=True,
+                                          intermediate=True), RuntimeError)
+
+    def test_onnxt_run_compiled(self):
+        idi = numpy.identity(2).astype(numpy.float32)
+        idi2 = (numpy.identity(2) * 2).astype(numpy.float32)
+        onx = OnnxAdd(OnnxAdd('X', idi), idi2, output_names=['Y'])
+        model_def = onx.to_onnx({'X': idi})
+        oinf = OnnxInference(model_def, runtime='python_compiled')
+        self.assertEqual(len(oinf.plan_steps_), len(oinf.sequence_))
+        self.assertEqual(len(oinf.plan_slots_), len(oinf.plan_template_))
+        X = numpy.array([[1, 1], [3, 3]], dtype=numpy.float32)
+        exp = numpy.array([[4, 1], [3, 6]], dtype=numpy.float32)
+        y = oinf.run({'X': X})
+        self.assertEqual(list(y), ['Y'])
+        self.assertEqualArray(y['Y'], exp)
+        y, mtime = oinf.run({'X': X}, node_time=True)
+        self.assertEqualArray(y['Y'], exp)
+        self.assertEqual(len(mtime), len(oinf.sequence_))
+        inter = oinf.run({'X': X}, intermediate=True)
+        exp_inter = OnnxInference(model_def).run({'X': X}, intermediate=True)
+        self.assertEqual(set(inter), set(exp_inter))
+        for k, v in exp_inter.items():
+            self.assertEqualArray(inter[k], v)
+        rows = []
+        y = oinf.run({'X': X}, verbose=1, fLOG=rows.append)
+        self.assertEqualArray(y['Y'], exp)
+        self.assertNotEmpty(rows)
+
+    def test_onnxt_run_reuse_buffers(self):
+        c1 = numpy.array([[1, 2]], dtype=numpy.float32)
+        c2 = numpy.array([[10, 20]], dtype=numpy.float32)
+        nodes = [make_node('Add', ['X', 'C1'], ['T1'], name='A1'),
+                 make_node('Add', ['T1', 'C2'], ['T2'], name='A2'),
+                 make_node('Identity', ['T2'], ['Y'], name='I')]
+        graph = make_graph(
+            nodes, 'g',
+            [make_tensor_value_info('X', TensorProto.FLOAT, [None, 2])],
+            [make_tensor_value_info('Y', TensorProto.FLOAT, [None, 2])],
+            [from_array(c1, name='C1'), from_array(c2, name='C2')])
+        model_def = make_model(graph)
+        X = numpy.array([[1, 1], [3, 3]], dtype=numpy.float32)
+        for rt in ['python', 'python_compiled']:
+            with self.subTest(runtime=rt):
+                oinf = OnnxInference(model_def, runtime=rt,
+                                     reuse_buffers=True)
+                self.assertEqual(len(oinf.buffered_ops_), 2)
+                y1 = oinf.run({'X': X})
+                self.assertEqualArray(y1['Y'], X + c1 + c2)
+                y2 = oinf.run({'X': X * 2})
+                self.assertEqualArray(y1['Y'], X + c1 + c2)
+                self.assertEqualArray(y2['Y'], X * 2 + c1 + c2)
+                for op in oinf.buffered_ops_:
+                    self.assertEqual(len(op.buffers_), 1)
+                y3 = oinf.run({'X': X[:1]})
+                self.assertEqualArray(y3['Y'], X[:1] + c1 + c2)
+                pkl = pickle.loads(pickle.dumps(oinf))
+                self.assertTrue(pkl.reuse_buffers)
+                self.assertEqualArray(pkl.run({'X': X})['Y'], X + c1 + c2)
+
+    def test_onnxt_unsorted_graph(self):
+        cst = numpy.array([[1, 2]], dtype=numpy.float32)
+        nodes = [make_node('Exp', ['T2'], ['Y'], name='E'),
+                 make_node('Mul', ['T1', 'C'], ['T2'], name='M'),
+                 make_node('Add', ['X', 'C'], ['T1'], name='A'),
+                 make_node('Relu', ['X'], ['Z'], name='N')]
+        graph = make_graph(
+            nodes, 'g',
+            [make_tensor_value_info('X', TensorProto.FLOAT, [None, 2])],
+            [make_tensor_value_info('Y', TensorProto.FLOAT, [None, 2]),
+             make_tensor_value_info('Z', TensorProto.FLOAT, [None, 2])],
+            [from_array(cst, name='C')])
+        oinf = OnnxInference(make_model(graph))
+        self.assertEqual([n.onnx_node.name for n in oinf.sequence_],
+                         ['A', 'M', 'E', 'N'])
+        self.assertEqual([n.order for n in oinf.sequence_], [0, 1, 2, 3])
+        self.assertEqual(list(oinf.graph_['intermediate']),
+                         ['T1', 'T2', 'Y', 'Z'])
+        X = numpy.array([[1, -1]], dtype=numpy.float32)
+        got = oinf.run({'X': X})
+        self.assertEqualArray(numpy.exp((X + cst) * cst), got['Y'])
+        self.assertEqualArray(numpy.maximum(X, 0), got['Z'])
+
+        nodes.append(make_node('Relu', ['T1'], ['T2'], name='N2'))
+        graph = make_graph(
+            nodes, 'g',
+            [make_tensor_value_info('X', TensorProto.FLOAT, [None, 2])],
+            [make_tensor_value_info('Y', TensorProto.FLOAT, [None, 2])],
+            [from_array(cst, name='C')])
+        self.assertRaise(lambda: OnnxInference(make_model(graph)),
+                         RuntimeError)
+
+    def test_onnxt_release_initializers(self):
+        c1 = numpy.array([[1, -2, 3]], dtype=numpy.float32)
+        c2 = numpy.array([[2, 3, 4]], dtype=numpy.int64)
+        nodes = [make_node('Add', ['X', 'C1'], ['Y'], name='A'),
+                 make_node('Identity', ['C2'], ['Z'], name='I')]
+        graph = make_graph(
+            nodes, 'g',
+            [make_tensor_value_info('X', TensorProto.FLOAT, [None, 3])],
+            [make_tensor_value_info('Y', TensorProto.FLOAT, [None, 3]),
+             make_tensor_value_info('Z', TensorProto.INT64, [None, 3])],
+            [from_array(c1, name='C1'), from_array(c2, name='C2')])
+        model_def = make_model(graph)
+        X = numpy.array([[1, 1, 1]], dtype=numpy.float32)
+
+        oinf = OnnxInference(model_def.SerializeToString())
+        value = oinf.inits_['C1']['value']
+        self.assertFalse(value.flags.owndata)
+        self.assertFalse(value.flags.writeable)
+        self.assertEqualArray(c1, value)
+        self.assertEqualArray(c2, oinf.inits_['C2']['value'])
+        self.assertEqual(len(oinf.released_initializers_), 0)
+        self.assertRaise(lambda: value.__setitem__((0, 0), 5), ValueError)
+        got = oinf.run({'X': X})
+        self.assertFalse(got['Z'].flags.writeable)
+        self.assertEqualArray(X + c1, got['Y'])
+
+        oinf = OnnxInference(model_def.SerializeToString(),
+                             release_initializers=True)
+        self.assertEqual(set(oinf.released_initializers_), {'C1', 'C2'})
+        for init in oinf.obj.graph.initializer:
+            self.assertEqual(len(init.raw_data), 0)
+        got = oinf.run({'X': X})
+        self.assertEqualArray(X + c1, got['Y'])
+        self.assertEqualArray(c2, got['Z'])
+        self.assertIn('"C1"', oinf.to_json())
+        self.assertIn('C1', oinf.to_dot())
+        seq = oinf.to_sequence()
+        self.assertEqualArray(c1, seq['inits']['C1']['value'])
+        self.assertEqualArray(c2, seq['inits']['C2']['value'])
+        inter = oinf.build_intermediate()
+        self.assertEqual(set(inter), {'Y', 'Z'})
+        self.assertEqualArray(X + c1, inter['Y'].run({'X': X})['Y'])
+        self.assertEqualArray(c2, inter['Z'].run({'X': X})['Z'])
+        for init in oinf.obj.graph.initializer:
+            self.assertEqual(len(init.raw_data), 0)
+        restored = oinf._model_proto()  # pylint: disable=W0212
+        self.assertEqual(restored.SerializeToString(),
+                         model_def.SerializeToString())
+        pkl = pickle.loads(pickle.dumps(oinf))
+        self.assertTrue(pkl.release_initializers)
+        self.assertEqualArray(X + c1, pkl.run({'X': X})['Y'])
+        self.assertRaise(
+            lambda: OnnxInference(model_def, runtime='onnxruntime1',
+                                  release_initializers=True),
+            RuntimeError)
+
     def test_onnxt_lrreg_iris_run(self):
         iris = load_iris()
         X, y = iris.data, iris.target
@@ -44,6 +44,19 @@ class TestInferenceSessionSklearn(ExtTestCase):
         self.assertStartsWith("OnnxTransformer(onnx_bytes=b'\\", rp)
         self.assertEndsWith("')", rp)
 
+    def test_transform_iter(self):
+        x = np.array([[1.0, 2.0], [3.0, 4.0], [5.0, 6.0]], dtype=np.float32)
+        content = self.get_onnx_mul()
+
+        tr = OnnxTransformer(content, runtime='python')
+        tr.fit()
+        exp = np.array([[1., 4.], [9., 16.], [25., 36.]], dtype=np.float32)
+        for prefetch in [0, 2]:
+            res = list(tr.transform_iter(
+                (x[i:i + 2] for i in range(0, 3, 2)), prefetch=prefetch))
+            self.assertEqual(len(res), 2)
+            self.assertEqualArray(exp, np.vstack(res))
+
     def test_transform_list(self):
         x = [[1.0, 2.0], [3.0, 4.0], [5.0, 6.0]]
         content = self.get_onnx_mul()
@@ -4,3 +4,5 @@
 """
 
 from .c_compilation import compile_c_function
+from .c_tree_compilation import (
+    compile_tree_ensemble, compile_tree_ensembles, tree_ensemble_to_c)
@@ -0,0 +1,380 @@
+"""
+@file
+@brief Compiles a tree ensemble into C code with :epkg:`cffi`.
+"""
+import os
+import hashlib
+import tempfile
+import importlib.util
+from importlib.machinery import EXTENSION_SUFFIXES
+import numpy
+from .c_compilation import CompilationError
+
+
+_compiled_modules = {}
+
+_branch_operators = {
+    'BRANCH_LEQ': '<=',
+    'BRANCH_LT': '<',
+    'BRANCH_GTE': '>=',
+    'BRANCH_GT': '>',
+    'BRANCH_EQ': '==',
+    'BRANCH_NEQ': '!=',
+}
+
+_tree_ensemble_ops = {
+    'TreeEnsembleClassifier', 'TreeEnsembleClassifierDouble',
+    'TreeEnsembleRegressor', 'TreeEnsembleRegressorDouble',
+}
+
+
+def _c_constant(value, dtype):
+    """
+    Returns a numerical constant as a C literal.
+    """
+    if numpy.isnan(value):
+        return "NAN"
+    if numpy.isinf(value):
+        return "INFINITY" if value > 0 else "-INFINITY"
+    if dtype == numpy.float32:
+        text = '%1.9g' % value
+        if not any(c in text for c in '.e'):
+            text += '.'
+        return text + 'f'
+    text = '%1.17g' % value
+    if not any(c in text for c in '.e'):
+        text += '.'
+    return text
+
+
+class _TreeEnsembleDescription:
+    """
+    Gathers the nodes and the leaves of a tree ensemble
+    from the attributes of a runtime operator.
+    """
+
+    def __init__(self, op):
+        atts = {k: op._get_typed_attributes(k)  # pylint: disable=W0212
+                for k in op.__class__.atts}
+        self.dtype = op.__class__.atts['nodes_values'].dtype
+        self.is_classifier = 'class_ids' in atts
+        if self.is_classifier:
+            self.aggregate_function = 'SUM'
+            prefix = 'class_'
+            self.n_slots = op.rt_.n_slots_
+        else:
+            self.aggregate_function = atts['aggregate_function']
+            prefix = 'target_'
+            self.n_slots = op.rt_.n_targets_
+
+        self.modes = atts['nodes_modes']
+        self.featureids = atts['nodes_featureids']
+        self.values = atts['nodes_values'].astype(self.dtype)
+        self.truenodeids = atts['nodes_truenodeids']
+        self.falsenodeids = atts['nodes_falsenodeids']
+        missing = atts['nodes_missing_value_tracks_true']
+        self.missing = (missing if len(missing) == len(self.modes)
+                        else numpy.zeros(len(self.modes), dtype=numpy.int64))
+        treeids = atts['nodes_treeids']
+        nodeids = atts['nodes_nodeids']
+        self.index = {(t, n): i for i, (t, n) in enumerate(
+            zip(treeids, nodeids))}
+
+        self.leaves = {}
+        weights = atts[prefix + 'weights'].astype(self.dtype)
+        for t, n, c, w in zip(atts[prefix + 'treeids'],
+                              atts[prefix + 'nodeids'],
+                              atts[prefix + 'ids'], weights):
+            if (t, n) not in self.index:
+                raise RuntimeError(
+                    "Weight for a missing node (tree={}, node={}).".format(
+                        t, n))
+            if c < 0 or c >= self.n_slots:
+                raise RuntimeError("Unexpected id {} for a weight.".format(c))
+            self.leaves.setdefault(self.index[t, n], []).append((c, w))
+
+        children = set()
+        for i, (t, mode) in enumerate(zip(treeids, self.modes)):
+            if mode != 'LEAF':
+                children.add((t, self.truenodeids[i]))
+                children.add((t, self.falsenodeids[i]))
+        self.roots = [i for i, key in enumerate(zip(treeids, nodeids))
+                      if key not in children]
+        self.treeids = treeids
+        self.max_feature = (max(self.featureids)
+                            if len(self.featureids) > 0 else -1)
+
+    def child(self, i, node_id):
+        "Returns the index of a child."
+        key = (self.treeids[i], node_id)
+        if key not in self.index:
+            raise RuntimeError(
+                "A node of the tree ensemble points to a missing node "
+                "(tree={}, node={}).".format(*key))
+        return self.index[key]
+
+
+def _leaf_to_c(desc, i, indent):
+    """
+    Writes the statements a leaf executes.
+    """
+    rows = []
+    for c, w in desc.leaves.get(i, []):
+        cst = _c_constant(w, desc.dtype)
+        if desc.aggregate_function == 'MIN':
+            rows.append("{0}if (!h[{1}] || {2} < s[{1}]) s[{1}] = {2};".format(
+                indent, c, cst))
+        elif desc.aggregate_function == 'MAX':
+            rows.append("{0}if (!h[{1}] || {2} > s[{1}]) s[{1}] = {2};".format(
+                indent, c, cst))
+        else:
+            rows.append("{0}s[{1}] += {2};".format(indent, c, cst))
+        rows.append("{0}h[{1}] = 1;".format(indent, c))
+    return rows
+
+
+def _node_to_c(desc, i, depth, max_depth):
+    """
+    Writes a node and its children as nested if-else.
+    """
+    indent = "    " * depth
+    mode = desc.modes[i]
+    if mode == 'LEAF':
+        return _leaf_to_c(desc, i, indent)
+    if depth > max_depth:
+        raise CompilationError(
+            "The tree is too deep to be compiled (>{}).".format(max_depth))
+    if mode not in _branch_operators:
+        raise CompilationError("Unknown node mode '{}'.".format(mode))
+    x = "x[{}]".format(desc.featureids[i])
+    cond = "{} {} {}".format(x, _branch_operators[mode],
+                             _c_constant(desc.values[i], desc.dtype))
+    if desc.missing[i]:
+        cond = "{0} || {1} != {1}".format(cond, x)
+    rows = ["{}if ({}) {{".format(indent, cond)]
+    rows.extend(_node_to_c(desc, desc.child(i, desc.truenodeids[i]),
+                           depth + 1, max_depth))
+    rows.append("{}}} else {{".format(indent))
+    rows.extend(_node_to_c(desc, desc.child(i, desc.falsenodeids[i]),
+                           depth + 1, max_depth))
+    rows.append("{}}}".format(indent))
+    return rows
+
+
+def tree_ensemble_to_c(op, name='tree_ensemble', max_depth=200):
+    """
+    Converts a runtime operator *TreeEnsembleRegressor* or
+    *TreeEnsembleClassifier* into C code, every tree becomes a function
+    made of nested if-else with the thresholds inlined as constants.
+
+    @param      op          operator, @see cl TreeEnsembleRegressor,
+                            @see cl TreeEnsembleClassifier or their
+                            double version
+    @param      name        name of the main function
+    @param      max_depth   maximum depth of a tree
+    @return                 C code
+
+    The main function is defined last and has the following signature:
+
+    ::
+
+        void <name>(T* scores, unsigned char* has_scores,
+                    const T* X, int64_t n_rows, int64_t n_features)
+
+    It sums (or takes the minimum or the maximum) the weights
+    of every leaf reached by a row, *has_scores[i, k]* is one if
+    row *i* received a weight for target or class *k*. Both buffers
+    must be filled with zeros. Base values and post transforms
+    are applied by method *finalize_scores* of the C++ runtime.
+    """
+    return _tree_ensemble_to_c(_TreeEnsembleDescription(op), name, max_depth)
+
+
+def _tree_ensemble_to_c(desc, name, max_depth):
+    "Implements @see fn tree_ensemble_to_c."
+    ctype = 'float' if desc.dtype == numpy.float32 else 'double'
+    rows = []
+    for k, root in enumerate(desc.roots):
+        rows.append("static void tree_{0}(const {1}* x, {1}* s, "
+                    "unsigned char* h)".format(k, ctype))
+        rows.append("{")
+        rows.extend(_node_to_c(desc, root, 1, max_depth))
+        rows.extend(["}", ""])
+
+    rows.extend([
+        _signature(name, ctype),
+        "{",
+        "    int64_t i;",
+        "    for (i = 0; i < n_rows; ++i) {",
+        "        const {}* x = X + i * n_features;".format(ctype),
+        "        {}* s = scores + i * {};".format(ctype, desc.n_slots),
+        "        unsigned char* h = has_scores + i * {};".format(desc.n_slots),
+    ])
+    for k in range(len(desc.roots)):
+        rows.append("        tree_{}(x, s, h);".format(k))
+    rows.extend(["    }", "}", ""])
+    return "\n".join(rows)
+
+
+def _signature(name, ctype):
+    "Returns the signature of the main function."
+    return ("void {0}({1}* scores, unsigned char* has_scores, "
+            "const {1}* X, int64_t n_rows, int64_t n_features)").format(
+                name, ctype)
+
+
+def _load_module(name, path):
+    "Imports a compiled module from a file."
+    spec = importlib.util.spec_from_file_location(name, path)
+    mod = importlib.util.module_from_spec(spec)
+    spec.loader.exec_module(mod)
+    return mod
+
+
+class CompiledTreeEnsemble:
+    """
+    Exposes the same methods as the C++ runtimes of tree
+    ensembles but relies on a function compiled
+    by @see fn compile_tree_ensemble.
+    """
+
+    def __init__(self, rt, module, name, dtype, n_slots, max_feature):
+        """
+        @param      rt          C++ runtime, computes the final scores
+        @param      module      module compiled by :epkg:`cffi`
+        @param      name        function name
+        @param      dtype       float type
+        @param      n_slots     number of scores per row
+        @param      max_feature highest feature index used by the trees
+        """
+        self.rt_ = rt
+        self.module_ = module
+        self.fct_ = getattr(module.lib, name)
+        self.dtype = dtype
+        self.n_slots = n_slots
+        self.max_feature = max_feature
+        self.ctype_ = 'float*' if dtype == numpy.float32 else 'double*'
+
+    def compute(self, X):
+        """
+        Computes the predictions, returns the same outputs
+        as the C++ runtime.
+        """
+        if X.dtype != self.dtype:
+            raise TypeError(
+                "Unexpected type {} != {}.".format(X.dtype, self.dtype))
+        if len(X.shape) != 2 or X.shape[1] <= self.max_feature:
+            raise RuntimeError(
+                "Unexpected shape {}, the trees use feature {}.".format(
+                    X.shape, self.max_feature))
+        X = numpy.ascontiguousarray(X)
+        scores = numpy.zeros((X.shape[0], self.n_slots), dtype=self.dtype)
+        has_scores = numpy.zeros((X.shape[0], self.n_slots),
+                                 dtype=numpy.uint8)
+        ffi = self.module_.ffi
+        self.fct_(ffi.cast(self.ctype_, scores.ctypes.data),
+                  ffi.cast("unsigned char*", has_scores.ctypes.data),
+                  ffi.cast(self.ctype_, X.ctypes.data),
+                  X.shape[0], X.shape[1])
+        return self.rt_.finalize_scores(scores, has_scores)
+
+    def runtime_options(self):
+        """
+        Returns indications about how the runtime was compiled.
+        """
+        return "CFFI"
+
+    def omp_get_max_threads(self):
+        """
+        The compiled function uses a single thread.
+        """
+        return 1
+
+
+def compile_tree_ensemble(op, tmpdir=None, max_depth=200, fLOG=None):
+    """
+    Compiles a tree ensemble into C with :epkg:`cffi`
+    (see @see fn tree_ensemble_to_c).
+    Compiled modules are cached in memory and in folder *tmpdir*,
+    the name of a module is a hash of its code.
+
+    @param      op          operator, @see cl TreeEnsembleRegressor,
+                            @see cl TreeEnsembleClassifier or their
+                            double version
+    @param      tmpdir      folder receiving the compiled modules,
+                            a subfolder of the temporary folder by default
+    @param      max_depth   maximum depth of a tree
+    @param      fLOG        logging function
+    @return                 @see cl CompiledTreeEnsemble
+
+    The returned object can replace attribute *rt_* of the operator,
+    see @see fn compile_tree_ensembles.
+    """
+    fct_name = 'tree_ensemble'
+    desc = _TreeEnsembleDescription(op)
+    code = _tree_ensemble_to_c(desc, fct_name, max_depth)
+    ctype = 'float' if desc.dtype == numpy.float32 else 'double'
+    name = "_tree_ensemble_" + hashlib.sha256(
+        code.encode('utf-8')).hexdigest()[:24]
+
+    if tmpdir is None:
+        tmpdir = os.path.join(tempfile.gettempdir(), 'mlprodict_cc')
+    if name not in _compiled_modules:
+        found = [os.path.join(tmpdir, name + ext) for ext in EXTENSION_SUFFIXES
+                 if os.path.exists(os.path.join(tmpdir, name + ext))]
+        if found:
+            if fLOG:
+                fLOG("[compile_tree_ensemble] load '{}'".format(found[0]))
+            _compiled_modules[name] = _load_module(name, found[0])
+        else:
+            from cffi import FFI
+            if not os.path.exists(tmpdir):
+                os.makedirs(tmpdir)
+            ffibuilder = FFI()
+            ffibuilder.cdef(_signature(fct_name, ctype) + ";")
+            ffibuilder.set_source(
+                name, "#include <stdint.h>\n#include <math.h>\n\n" + code)
+            if fLOG:
+                fLOG("[compile_tree_ensemble] compile '{}' ({} bytes)".format(
+                    name, len(code)))
+            try:
+                path = ffibuilder.compile(verbose=False, tmpdir=tmpdir)
+            except Exception as e:
+                raise CompilationError(
+                    "Compilation failed for '{}'\ndue to\n{}".format(
+                        name, e)) from e
+            _compiled_modules[name] = _load_module(name, path)
+
+    return CompiledTreeEnsemble(op.rt_, _compiled_modules[name], fct_name,
+                                desc.dtype, desc.n_slots, desc.max_feature)
+
+
+def compile_tree_ensembles(oinf, tmpdir=None, max_depth=200, fLOG=None):
+    """
+    Compiles every tree ensemble of an instance of @see cl OnnxInference
+    with @see fn compile_tree_ensemble and replaces the C++ runtime
+    of the operator by the compiled function. Only runtimes
+    ``'python'`` (or None) and ``'python_compiled'`` are supported.
+    The compiled functions are lost when the instance is pickled.
+
+    @param      oinf        @see cl OnnxInference
+    @param      tmpdir      folder receiving the compiled modules
+    @param      max_depth   maximum depth of a tree
+    @param      fLOG        logging function
+    @return                 list of compiled nodes
+    """
+    if oinf.runtime not in (None, 'python', 'python_compiled'):
+        raise RuntimeError(
+            "Unable to compile tree ensembles for runtime '{}'.".format(
+                oinf.runtime))
+    compiled = []
+    for node in oinf.sequence_:
+        if node.onnx_node.op_type not in _tree_ensemble_ops:
+            continue
+        op = node.ops_
+        if isinstance(op.rt_, CompiledTreeEnsemble):
+            continue
+        op.rt_ = compile_tree_ensemble(op, tmpdir=tmpdir,
+                                       max_depth=max_depth, fLOG=fLOG)
+        compiled.append(node.onnx_node.name)
+    return compiled
@@ -4,5 +4,6 @@
 @brief Shortcut to *sklapi*.
 """
 from .onnx_inference import OnnxInference
+from .onnx_inference_async import AsyncOnnxInference
 from .validate_difference import measure_relative_difference
 from .validate_helper import get_opset_number_from_onnx, sklearn_operators, to_onnx
@@ -3,13 +3,24 @@
 @brief Rewrites some of the converters implemented in
 :epkg:`sklearn-onnx`.
 """
+import numbers
 import numpy
 from skl2onnx.common._apply_operation import apply_cast
 from skl2onnx.common.data_types import Int64TensorType
 from skl2onnx.common.tree_ensemble import (
     add_tree_to_attribute_pairs,
+    get_default_tree_classifier_attribute_pairs,
     get_default_tree_regressor_attribute_pairs
 )
+from skl2onnx.operator_converters.decision_tree import (
+    convert_sklearn_decision_tree_classifier as _convert_decision_tree_classifier
+)
+from skl2onnx.operator_converters.gradient_boosting import (
+    convert_sklearn_gradient_boosting_classifier as _convert_gradient_boosting_classifier
+)
+from skl2onnx.operator_converters.random_forest import (
+    convert_sklearn_random_forest_classifier as _convert_random_forest_classifier
+)
 
 
 def convert_sklearn_decision_tree_regressor(scope, operator, container):
@@ -146,3 +157,170 @@ def convert_sklearn_random_forest_regressor_converter(scope, operator, container
 
     container.add_node(op_type, input_name, operator.output_full_names,
                        op_domain=op_domain, **attrs)
+
+
+def _check_double_classifier(container, op):
+    """
+    Raises an exception if the model cannot be converted
+    with operator *TreeEnsembleClassifierDouble*, multi-output
+    models and options *decision_path*, *decision_leaf*
+    are only implemented by :epkg:`sklearn-onnx` for floats.
+    """
+    if container.dtype != numpy.float64:
+        raise RuntimeError("Unsupported dtype {}.".format(container.dtype))
+    if getattr(op, 'n_outputs_', 1) > 1:
+        raise NotImplementedError(
+            "Multi-output classifiers are not supported with doubles.")
+    if hasattr(container, 'get_options'):
+        options = container.get_options(op, {}) or {}
+        for name in ['decision_path', 'decision_leaf']:
+            if options.get(name, False):
+                raise NotImplementedError(
+                    "Option '{}' is not supported with doubles.".format(name))
+
+
+def _set_class_labels(attrs, classes):
+    """
+    Adds the class labels to the attributes of a classifier.
+    """
+    if all(isinstance(i, numpy.ndarray) for i in classes):
+        classes = numpy.concatenate(classes)
+    if all(isinstance(i, (numbers.Real, bool, numpy.bool_)) for i in classes):
+        attrs['classlabels_int64s'] = [int(i) for i in classes]
+    elif all(isinstance(i, str) for i in classes):
+        attrs['classlabels_strings'] = [str(i) for i in classes]
+    else:
+        raise ValueError('Labels must be all integers or all strings.')
+
+
+def _add_classifier_node(scope, operator, container, op_type, op_domain,
+                         attrs):
+    """
+    Casts integer features into the container type and adds
+    the classifier node.
+    """
+    input_name = operator.input_full_names
+    if type(operator.inputs[0].type) == Int64TensorType:
+        cast_input_name = scope.get_unique_variable_name('cast_input')
+
+        apply_cast(scope, operator.input_full_names, cast_input_name,
+                   container, to=container.proto_dtype)
+        input_name = cast_input_name
+
+    container.add_node(
+        op_type, input_name,
+        [operator.outputs[0].full_name, operator.outputs[1].full_name],
+        op_domain=op_domain, **attrs)
+
+
+def convert_sklearn_decision_tree_classifier(scope, operator, container):
+    """
+    Rewrites the converters implemented in
+    :epkg:`sklearn-onnx` to support an operator supported
+    doubles, floats are still converted by :epkg:`sklearn-onnx`.
+    """
+    if container.dtype == numpy.float32:
+        _convert_decision_tree_classifier(scope, operator, container)
+        return
+    op = operator.raw_operator
+    _check_double_classifier(container, op)
+    op_type, op_domain = 'TreeEnsembleClassifierDouble', 'mlprodict'
+
+    attrs = get_default_tree_classifier_attribute_pairs()
+    attrs['name'] = scope.get_unique_operator_name(op_type)
+    _set_class_labels(attrs, op.classes_)
+    add_tree_to_attribute_pairs(attrs, True, op.tree_, 0, 1., 0, True)
+    _add_classifier_node(scope, operator, container, op_type, op_domain,
+                         attrs)
+
+
+def convert_sklearn_gradient_boosting_classifier(scope, operator, container):
+    """
+    Rewrites the converters implemented in
+    :epkg:`sklearn-onnx` to support an operator supported
+    doubles, floats are still converted by :epkg:`sklearn-onnx`.
+    """
+    if container.dtype == numpy.float32:
+        _convert_gradient_boosting_classifier(scope, operator, container)
+        return
+    op = operator.raw_operator
+    _check_double_classifier(container, op)
+    op_type, op_domain = 'TreeEnsembleClassifierDouble', 'mlprodict'
+
+    attrs = get_default_tree_classifier_attribute_pairs()
+    attrs['name'] = scope.get_unique_operator_name(op_type)
+
+    transform = 'LOGISTIC' if op.n_classes_ == 2 else 'SOFTMAX'
+    if op.init == 'zero':
+        base_values = numpy.zeros(op.loss_.K)
+    elif op.init is None:
+        n_features = (op.n_features_in_ if hasattr(op, 'n_features_in_')
+                      else op.n_features_)
+        x0 = numpy.zeros((1, n_features))
+        if hasattr(op, '_raw_predict_init'):
+            # scikit-learn >= 0.21
+            base_values = op._raw_predict_init(  # pylint: disable=W0212
+                x0).ravel()
+        elif hasattr(op, '_init_decision_function'):
+            # scikit-learn >= 0.20 and < 0.21
+            base_values = op._init_decision_function(  # pylint: disable=W0212
+                x0).ravel()
+        else:
+            raise RuntimeError("scikit-learn < 0.20 is not supported.")
+    else:
+        raise NotImplementedError(
+            'Setting init to an estimator is not supported, you may raise an '
+            'issue at https://github.com/onnx/sklearn-onnx/issues.')
+
+    attrs['base_values'] = [float(v) for v in base_values]
+    attrs['post_transform'] = transform
+    _set_class_labels(attrs, op.classes_)
+
+    tree_weight = op.learning_rate
+    n_est = (op.n_estimators_ if hasattr(op, 'n_estimators_') else
+             op.n_estimators)
+    if op.n_classes_ == 2:
+        for tree_id in range(n_est):
+            tree = op.estimators_[tree_id][0].tree_
+            add_tree_to_attribute_pairs(attrs, True, tree, tree_id,
+                                        tree_weight, 0, False)
+    else:
+        for i in range(n_est):
+            for c in range(op.n_classes_):
+                tree_id = i * op.n_classes_ + c
+                tree = op.estimators_[i][c].tree_
+                add_tree_to_attribute_pairs(attrs, True, tree, tree_id,
+                                            tree_weight, c, False)
+
+    _add_classifier_node(scope, operator, container, op_type, op_domain,
+                         attrs)
+
+
+def convert_sklearn_random_forest_classifier(scope, operator, container):
+    """
+    Rewrites the converters implemented in
+    :epkg:`sklearn-onnx` to support an operator supported
+    doubles, floats are still converted by :epkg:`sklearn-onnx`.
+    """
+    if container.dtype == numpy.float32:
+        _convert_random_forest_classifier(scope, operator, container)
+        return
+    op = operator.raw_operator
+    _check_double_classifier(container, op)
+    op_type, op_domain = 'TreeEnsembleClassifierDouble', 'mlprodict'
+
+    attrs = get_default_tree_classifier_attribute_pairs()
+    attrs['name'] = scope.get_unique_operator_name(op_type)
+    _set_class_labels(attrs, op.classes_)
+
+    # random forest calculate the final score by averaging over all trees'
+    # outcomes, so all trees' weights are identical.
+    estimator_count = len(op.estimators_)
+    tree_weight = 1. / estimator_count
+    for tree_id in range(estimator_count):
+        tree = op.estimators_[tree_id].tree_
+        add_tree_to_attribute_pairs(attrs, True, tree, tree_id,
+                                    tree_weight, 0, True)
+
+    _add_classifier_node(scope, operator, container, op_type, op_domain,
+                         attrs)
@@ -3,6 +3,7 @@
 @brief Functions which converts :epkg:`ONNX` object into
 readable :epgk:`python` objects.
 """
+import sys
 import warnings
 import numpy
 from onnx import onnx_pb as onnx_proto
@@ -23,6 +24,38 @@ def _numpy_array(data, dtype=None, copy=True):
     return res
 
 
+_raw_data_dtypes = {
+    onnx_proto.TensorProto.FLOAT: numpy.float32,  # pylint: disable=E1101
+    onnx_proto.TensorProto.DOUBLE: numpy.float64,  # pylint: disable=E1101
+    onnx_proto.TensorProto.FLOAT16: numpy.float16,  # pylint: disable=E1101
+    onnx_proto.TensorProto.INT64: numpy.int64,  # pylint: disable=E1101
+    onnx_proto.TensorProto.INT32: numpy.int32,  # pylint: disable=E1101
+    onnx_proto.TensorProto.INT8: numpy.int8,  # pylint: disable=E1101
+    onnx_proto.TensorProto.UINT8: numpy.uint8,  # pylint: disable=E1101
+    onnx_proto.TensorProto.BOOL: numpy.bool_,  # pylint: disable=E1101
+}
+
+
+def _numpy_array_from_raw_data(var, dims):
+    """
+    Wraps the field *raw_data* of a *TensorProto* into
+    an array without copying it, the array is read-only.
+
+    @param      var         *TensorProto*
+    @param      dims        shape
+    @return                 array or None if the type is not supported
+    """
+    dtype = _raw_data_dtypes.get(var.data_type, None)
+    if dtype is None:
+        return None
+    data = numpy.frombuffer(var.raw_data, dtype=dtype).reshape(dims)
+    if sys.byteorder == 'big':
+        # raw_data is always stored in little endian
+        data = data.byteswap()
+        data.flags.writeable = False
+    return data
+
+
 def _elem_type_as_str(elem_type):
     if elem_type == onnx_proto.TensorProto.FLOAT:  # pylint: disable=E1101
         return 'float'
@@ -37,10 +70,10 @@ def _elem_type_as_str(elem_type):
     if elem_type == onnx_proto.TensorProto.INT32:  # pylint: disable=E1101
         return 'int32'
 
-    # The following code should be refactored.
-    selem = str(elem_type)
+    kind = (elem_type.WhichOneof('value')
+            if isinstance(elem_type, onnx_proto.TypeProto) else None)
 
-    if selem.startswith("tensor_type"):
+    if kind == "tensor_type":
         this = elem_type.tensor_type
         et = _elem_type_as_str(this.elem_type)
         shape = this.shape
@@ -50,7 +83,7 @@ def _elem_type_as_str(elem_type):
             dims = '?'
         return {'kind': 'tensor', 'elem': et, 'shape': shape}
 
-    if selem.startswith("map_type"):
+    if kind == "map_type":
         this = elem_type.map_type
         kt = _elem_type_as_str(this.key_type)
         vt = _elem_type_as_str(this.value_type)
@@ -61,16 +94,29 @@ def _elem_type_as_str(elem_type):
         elem_type, pprint.pformat(dir(elem_type)), type(elem_type)))
 
 
+def _has_type(var):
+    """
+    Tells if *var* is a variable (or an attribute) with a type.
+    """
+    if isinstance(var, onnx_proto.AttributeProto):
+        return True
+    if isinstance(var, onnx_proto.ValueInfoProto):
+        return var.HasField('type')
+    return False
+
+
 def _var_as_dict(var):
     """
     Converts a protobuf object into something readable.
-    The current implementation relies on :epkg:`json`.
-    That's not the most efficient way.
+    The function directly accesses the protobuf fields
+    and never converts an object into a string.
     """
-    if hasattr(var, 'type') and str(var.type) != '':
+    if _has_type(var):
         # variable
         if var.type is not None:
-            if hasattr(var.type, 'tensor_type') and var.type.tensor_type.elem_type > 0:
+            kind = (var.type.WhichOneof('value')
+                    if isinstance(var.type, onnx_proto.TypeProto) else None)
+            if kind == 'tensor_type' and var.type.tensor_type.elem_type > 0:
                 t = var.type.tensor_type
                 elem_type = _elem_type_as_str(t.elem_type)
                 shape = t.shape
@@ -86,14 +132,13 @@ def _var_as_dict(var):
                 dtype = dict(kind='tensor', elem=var.type.real)
             elif hasattr(var.type, 'real'):
                 dtype = dict(kind='real', elem=var.type.real)
-            elif (hasattr(var.type, "sequence_type") and var.type.sequence_type is not None and
-                    str(var.type.sequence_type.elem_type) != ''):
+            elif (kind == 'sequence_type' and
+                    var.type.sequence_type.HasField('elem_type')):
                 t = var.type.sequence_type
                 elem_type = _elem_type_as_str(t.elem_type)
                 dtype = dict(kind='sequence', elem=elem_type)
-            elif (hasattr(var.type, "map_type") and var.type.map_type is not None and
-                    str(var.type.map_type.key_type) != '' and
-                    str(var.type.map_type.value_type) != ''):
+            elif (kind == 'map_type' and var.type.map_type.HasField('key_type') and
+                    var.type.map_type.HasField('value_type')):
                 t = var.type.map_type
                 key_type = _elem_type_as_str(t.key_type)
                 value_type = _elem_type_as_str(t.value_type)
@@ -142,6 +187,10 @@ def _var_as_dict(var):
     elif hasattr(var, 'dims') and len(var.dims) > 0:
         # initializer
         dims = [d for d in var.dims]
+        if var.HasField('raw_data'):
+            data = _numpy_array_from_raw_data(var, dims)
+            if data is not None:
+                return dict(name=var.name, value=data)
         if var.data_type == 1 and var.float_data is not None:
             try:
                 data = _numpy_array(var.float_data, dtype=numpy.float32,
@@ -168,6 +217,10 @@ def _var_as_dict(var):
         return dict(name=var.name, value=data)
 
     elif hasattr(var, 'data_type') and var.data_type > 0:
+        if var.HasField('raw_data'):
+            data = _numpy_array_from_raw_data(var, [])
+            if data is not None:
+                return dict(name=var.name, value=data)
         if var.data_type == 1 and var.float_data is not None:
             data = _numpy_array(var.float_data, dtype=numpy.float32,
                                 copy=False)
@@ -4,6 +4,10 @@
 from on an :epkg:`ONNX` model.
 """
 from collections import OrderedDict
+import heapq
+from concurrent.futures import ThreadPoolExecutor, wait, FIRST_COMPLETED
+from queue import Queue, Full
+from threading import Thread, Event
 from io import BytesIO
 import json
 from time import perf_counter
@@ -14,6 +18,7 @@ from onnx import onnx_pb as onnx_proto
 from onnx import numpy_helper
 from onnx.helper import make_model
 from .onnx_inference_node import OnnxInferenceNode
+from .onnx_inference_memory import plan_memory, allocate_arenas
 from .onnx_inference_manipulations import select_model_inputs_outputs, enumerate_model_node_outputs
 from .onnx2py_helper import _var_as_dict, _type_to_string
 from .sklearn_helper import enumerate_fitted_arrays, pairwise_array_distances
@@ -25,12 +30,92 @@ class OnnxInference:
     Computes the output of the :epkg:`ONNX` graph.
     """
 
-    def __init__(self, onnx_or_bytes_or_stream, runtime=None, skip_run=False):
+    def __init__(self, onnx_or_bytes_or_stream, runtime=None, skip_run=False,
+                 reuse_buffers=False, parallel_branches=0,
+                 release_initializers=False, runtime_options=None,
+                 inplace=False, sparse_one_hot=False):
         """
         @param      onnx_or_bytes_or_stream     :epkg:`onnx` object,
                                                 bytes, or filename or stream
         @param      runtime                     runtime options
         @param      skip_run                    do not build the runtime
+        @param      reuse_buffers               operators store their results
+                                                into buffers allocated once and
+                                                reused by the next calls
+        @param      parallel_branches           number of threads used to
+                                                execute independent nodes
+                                                in parallel, 0 or 1 to disable
+        @param      release_initializers        removes the data of the
+                                                initializers from the
+                                                :epkg:`ONNX` model once they
+                                                are converted into arrays
+        @param      runtime_options             parallelization settings of
+                                                the operators implemented
+                                                in C++, see below
+        @param      inplace                     operators may write their
+                                                results into an intermediate
+                                                result not needed anymore
+        @param      sparse_one_hot              operators *OneHotEncoder*
+                                                produce sparse matrices when
+                                                their consumers accept them
+
+        Runtime ``'python_compiled'`` uses the same operators as
+        runtime ``'python'`` but every variable name is resolved
+        into an integer once for all when the instance is created,
+        see @see me _build_compiled_plan.
+
+        If *reuse_buffers* is True, every operator which does not produce
+        an output of the graph keeps its results in preallocated arrays
+        (see method *enable_buffer_reuse* of @see cl OpRun)
+        for a given shape and type, repeated calls with the same batch
+        size do not allocate new arrays for these results.
+        This option is not thread safe.
+
+        If *parallel_branches* is greater than 1, a node is executed
+        by a pool of threads as soon as all its inputs are available,
+        independent branches of the graph, such as the ones produced
+        by a *ColumnTransformer*, a *FeatureUnion*
+        or a stacked ensemble, are computed at the same time.
+        Most of the operators rely on :epkg:`numpy` or C++ code
+        which releases the :epkg:`GIL`. This option does not work
+        with runtime ``'python_compiled'``. The threads are released
+        by method @see me close.
+
+        Initializers stored in field *raw_data* are wrapped into
+        read-only arrays without any copy, any attempt to modify them
+        raises an exception, an operator must not write into its inputs
+        unless they are writable (see *enable_inplace* of @see cl OpRun).
+        If *release_initializers* is True, the field is then cleared,
+        the arrays become the only copy of the data and the memory used
+        by the model is almost halved. The :epkg:`ONNX` model is modified
+        inplace if it was given as a *ModelProto*. Methods
+        @see me to_sequence, @see me to_json, @see me to_dot,
+        @see me build_intermediate and the pickling restore the data
+        from the arrays.
+
+        *runtime_options* is a dictionary changing the way
+        the operators implemented in C++ (tree ensembles, SVM)
+        distribute the rows among threads (see method
+        *set_runtime_options* of @see cl OpRun): *num_threads*
+        (0 for :epkg:`openmp` default), *schedule* (``'static'``
+        or ``'dynamic'``), *chunk_size*, *parallel_threshold*
+        (a batch with less rows is computed by one thread).
+        Every instance keeps its own settings. The thread affinity
+        is driven by environment variables ``OMP_PROC_BIND``
+        and ``OMP_PLACES``.
+
+        If *inplace* is True, every operator able to do it
+        (see method *enable_inplace* of @see cl OpRun) writes its
+        result into its first input when this input is an intermediate
+        result only used by this operator, see @see me _enable_inplace.
+        This is disabled while method *run* is called with
+        ``intermediate=True``, every intermediate result is then
+        returned as the operator producing it computed it.
+
+        If *sparse_one_hot* is True, every operator *OneHotEncoder*
+        whose output is only consumed by operators accepting sparse
+        inputs returns a :epkg:`scipy` *csr_matrix* instead of a dense
+        array, see @see me _enable_sparse_one_hot.
         """
         if isinstance(onnx_or_bytes_or_stream, bytes):
             self.obj = load_model(BytesIO(onnx_or_bytes_or_stream))
@@ -48,15 +133,27 @@ class OnnxInference:
                 type(onnx_or_bytes_or_stream)))
         self.runtime = runtime
         self.skip_run = skip_run
+        self.reuse_buffers = reuse_buffers
+        self.parallel_branches = parallel_branches
+        self.release_initializers = release_initializers
+        self.runtime_options = runtime_options
+        self.inplace = inplace
+        self.sparse_one_hot = sparse_one_hot
         self._init()
 
     def __getstate__(self):
         """
         To pickle the object.
         """
-        return {'onnx': self.obj.SerializeToString(),
+        return {'onnx': self._model_proto().SerializeToString(),
                 'runtime': self.runtime,
-                'skip_run': self.skip_run}
+                'skip_run': self.skip_run,
+                'reuse_buffers': self.reuse_buffers,
+                'parallel_branches': self.parallel_branches,
+                'release_initializers': self.release_initializers,
+                'runtime_options': self.runtime_options,
+                'inplace': self.inplace,
+                'sparse_one_hot': self.sparse_one_hot}
 
     def __setstate__(self, state):
         """
@@ -66,6 +163,12 @@ class OnnxInference:
         self.obj = load_model(BytesIO(onx))
         self.runtime = state['runtime']
         self.skip_run = state['skip_run']
+        self.reuse_buffers = state.get('reuse_buffers', False)
+        self.parallel_branches = state.get('parallel_branches', 0)
+        self.release_initializers = state.get('release_initializers', False)
+        self.runtime_options = state.get('runtime_options', None)
+        self.inplace = state.get('inplace', False)
+        self.sparse_one_hot = state.get('sparse_one_hot', False)
         self._init()
 
     def _init(self):
@@ -75,14 +178,44 @@ class OnnxInference:
         self.graph_ = self.to_sequence()
         self.outputs_ = self.graph_['outputs']
         self.target_opset_ = self.graph_['targets'].get('', None)
+        self.buffered_ops_ = []
+        self.inplace_ops_ = []
+        self.arena_ops_ = []
+        self._executor = None
+        self.released_initializers_ = {}
+        if self.release_initializers:
+            if self.runtime == 'onnxruntime1':
+                raise RuntimeError(
+                    "release_initializers=True does not work with this runtime.")
+            self._release_initializers()
         if not self.skip_run:
             if self.runtime == 'onnxruntime1':
+                if self.reuse_buffers:
+                    raise RuntimeError(
+                        "reuse_buffers=True does not work with this runtime.")
+                if self.parallel_branches and self.parallel_branches > 1:
+                    raise RuntimeError(
+                        "parallel_branches does not work with this runtime.")
+                if self.runtime_options:
+                    raise RuntimeError(
+                        "runtime_options does not work with this runtime.")
+                if self.inplace:
+                    raise RuntimeError(
+                        "inplace=True does not work with this runtime.")
+                if self.sparse_one_hot:
+                    raise RuntimeError(
+                        "sparse_one_hot=True does not work with this runtime.")
                 # Loads the onnx with onnxruntime as a single file.
                 del self.graph_
                 from .ops_whole.session import OnnxWholeSession
                 self._whole = OnnxWholeSession(self.obj, self.runtime)
                 self._run = self._run_whole_runtime
             else:
+                if (self.parallel_branches and self.parallel_branches > 1 and
+                        self.runtime == 'python_compiled'):
+                    raise RuntimeError(
+                        "parallel_branches > 1 does not work with runtime "
+                        "'python_compiled'.")
                 self.sequence_ = self.graph_['sequence']
                 self.inits_ = self.graph_['inits']
                 dtype = self._guess_input_dtype()
@@ -98,7 +231,235 @@ class OnnxInference:
                     if hasattr(node, 'ops_') and hasattr(node.ops_, 'typed_outputs_'):
                         for k, v in node.ops_.typed_outputs_:
                             variables[k] = v
-                self._run = self._run_sequence_runtime
+                if self.runtime_options:
+                    for node in self.sequence_:
+                        if hasattr(node, 'ops_') and hasattr(node.ops_, 'set_runtime_options'):
+                            node.ops_.set_runtime_options(self.runtime_options)
+                if self.reuse_buffers:
+                    self._enable_buffer_reuse()
+                if self.inplace:
+                    if self.parallel_branches and self.parallel_branches > 1:
+                        raise RuntimeError(
+                            "inplace=True relies on the sequential order and "
+                            "does not work with parallel_branches > 1.")
+                    self._enable_inplace()
+                if self.sparse_one_hot:
+                    self._enable_sparse_one_hot()
+                if self.parallel_branches and self.parallel_branches > 1:
+                    self._build_dependencies()
+                    self._executor = ThreadPoolExecutor(
+                        max_workers=self.parallel_branches)
+                    self._run = self._run_parallel_runtime
+                elif self.runtime == 'python_compiled':
+                    self._build_compiled_plan()
+                    self._run = self._run_compiled_runtime
+                else:
+                    self._run = self._run_sequence_runtime
+
+    def close(self):
+        """
+        Shuts down the pool of threads created
+        when *parallel_branches* is greater than 1,
+        the instance cannot compute anything after that.
+        """
+        executor = getattr(self, '_executor', None)
+        if executor is not None:
+            self._executor = None
+            executor.shutdown(wait=True)
+
+    def __del__(self):
+        """
+        Shuts down the pool of threads if any.
+        """
+        executor = getattr(self, '_executor', None)
+        if executor is not None:
+            executor.shutdown(wait=False)
+
+    def _release_initializers(self):
+        """
+        Clears field *raw_data* of every initializer converted
+        into an array which does not own its data, the array keeps
+        the data alive (see @see me _model_proto).
+        """
+        inits = self.graph_['inits']
+        for init in self.obj.graph.initializer:
+            if not init.HasField('raw_data') or init.name not in inits:
+                continue
+            value = inits[init.name]['value']
+            if not isinstance(value, numpy.ndarray) or value.flags.owndata:
+                continue
+            self.released_initializers_[init.name] = value
+            init.ClearField('raw_data')
+
+    def _model_proto(self):
+        """
+        Returns the :epkg:`ONNX` model, if the initializers were
+        released (see @see me _release_initializers), it returns a copy
+        of the model where the initializers are restored.
+        """
+        if not getattr(self, 'released_initializers_', None):
+            return self.obj
+        obj = onnx_proto.ModelProto()
+        obj.CopyFrom(self.obj)
+        for init in obj.graph.initializer:
+            if init.name in self.released_initializers_:
+                value = self.released_initializers_[init.name]
+                init.raw_data = value.astype(value.dtype.newbyteorder('<'),
+                                             copy=False).tobytes()
+        return obj
+
+    def _build_dependencies(self):
+        """
+        Computes for every node the nodes it depends on,
+        the nodes depending on it and the number of nodes
+        consuming every variable.
+        """
+        producer = {}
+        for node in self.sequence_:
+            for o in node.outputs:
+                producer[o] = node.order
+        deps = []
+        dependents = [[] for node in self.sequence_]
+        consumers = {}
+        for node in self.sequence_:
+            dep = set(producer[i] for i in node.inputs if i in producer)
+            deps.append(dep)
+            for d in dep:
+                dependents[d].append(node.order)
+            for i in set(node.inputs):
+                consumers[i] = consumers.get(i, 0) + 1
+        self.parallel_deps_ = deps
+        self.parallel_dependents_ = dependents
+        self.parallel_consumers_ = consumers
+
+    def _enable_buffer_reuse(self):
+        """
+        Enables buffers reuse for every operator not producing
+        any output of the graph.
+        """
+        outputs = set(self.outputs_)
+        for node in self.sequence_:
+            if any(o in outputs for o in node.outputs):
+                continue
+            if hasattr(node.ops_, 'enable_buffer_reuse'):
+                node.ops_.enable_buffer_reuse()
+                self.buffered_ops_.append(node.ops_)
+
+    def _enable_inplace(self):
+        """
+        Allows an operator to overwrite its first input if this
+        input is not an input, an initializer or an output of the
+        graph, if this operator is the only one using it and if
+        the operator producing it does not return one of its own
+        inputs (*Identity*) or a buffer it reuses. The operator
+        still checks the array owns its data and is writable.
+        """
+        protected = (set(self.inits_) | set(self.graph_['inputs']) |
+                     set(self.outputs_))
+        producers = {}
+        consumers = {}
+        for node in self.sequence_:
+            for name in node.outputs:
+                producers[name] = node
+            for name in node.inputs:
+                consumers[name] = consumers.get(name, 0) + 1
+        for node in self.sequence_:
+            if not getattr(node.ops_, 'inplace_capable', False):
+                continue
+            if len(node.inputs) == 0:
+                continue
+            name = node.inputs[0]
+            if name in protected or consumers[name] != 1:
+                continue
+            producer = producers.get(name, None)
+            if producer is None or producer.op_type == 'Identity':
+                continue
+            if any(producer.ops_ is op for op in self.buffered_ops_):
+                continue
+            node.ops_.enable_inplace()
+            self.inplace_ops_.append(node.ops_)
+
+    def _enable_sparse_one_hot(self):
+        """
+        Lets every operator *OneHotEncoder* return a sparse matrix
+        (see method *enable_sparse_output* of its runtime) if its
+        output is not an output of the graph and if all operators
+        consuming it accept sparse inputs (*LinearRegressor*,
+        *LinearClassifier*). Graphs produced by :epkg:`sklearn-onnx`
+        usually send it to *Concat* or *Reshape*, the output
+        remains dense in that case.
+        """
+        accepted = {'LinearRegressor', 'LinearClassifier'}
+        outputs = set(self.outputs_)
+        consumers = {}
+        for node in self.sequence_:
+            for name in node.inputs:
+                consumers.setdefault(name, []).append(node)
+        for node in self.sequence_:
+            if node.op_type != 'OneHotEncoder':
+                continue
+            name = node.outputs[0]
+            if name in outputs or name not in consumers:
+                continue
+            if all(c.op_type in accepted for c in consumers[name]):
+                node.ops_.enable_sparse_output()
+
+    def _copy_buffered_results(self, res):
+        """
+        Copies every result sharing its memory with a buffer
+        reused by one operator (a view on an intermediate result),
+        the next call would overwrite it otherwise.
+        """
+        for k, v in res.items():
+            if isinstance(v, numpy.ndarray) and any(
+                    op.owns_buffer(v) for op in self.buffered_ops_):
+                res[k] = v.copy()
+        return res
+
+    def _build_compiled_plan(self):
+        """
+        Resolves every variable name into an integer (a slot)
+        and builds a flat list of steps
+        ``(run function, input slots, output slots, slots to clean)``.
+        Initializers are stored once for all in a list of values
+        used as a template for every call to method *run*.
+        """
+        slots = OrderedDict()
+
+        def _slot(name):
+            if name not in slots:
+                slots[name] = len(slots)
+            return slots[name]
+
+        for k in self.inits_:
+            _slot(k)
+        for k in self.graph_['inputs']:
+            _slot(k)
+        for node in self.sequence_:
+            for k in node.inputs:
+                _slot(k)
+            for k in node.outputs:
+                _slot(k)
+        for k in self.outputs_:
+            _slot(k)
+
+        template = [None] * len(slots)
+        for k, v in self.inits_.items():
+            template[slots[k]] = v['value']
+
+        steps = []
+        for node in self.sequence_:
+            steps.append((node.ops_.run,
+                          tuple(slots[k] for k in node.inputs),
+                          tuple(slots[k] for k in node.outputs),
+                          tuple(slots[k] for k in node.variable_to_clean)))
+
+        self.plan_slots_ = slots
+        self.plan_template_ = template
+        self.plan_inputs_ = [(k, slots[k]) for k in self.graph_['inputs']
+                             if k not in self.inits_]
+        self.plan_outputs_ = [(k, slots[k]) for k in self.outputs_]
+        self.plan_steps_ = steps
 
     def _guess_input_dtype(self):
         for _, v in self.graph_['inputs'].items():
@@ -115,7 +476,7 @@ class OnnxInference:
         """
         usual
         """
-        return str(self.obj)
+        return str(self._model_proto())
 
     def __repr__(self):
         """
@@ -127,7 +488,7 @@ class OnnxInference:
         """
         Checks the model follow :epkg:`ONNX` conventions.
         """
-        checker.check_model(self.obj)
+        checker.check_model(self._model_proto())
 
     def shape_inference(self):
         """
@@ -135,7 +496,7 @@ class OnnxInference:
 
         @return     A new :epkg:`ONNX` graph which defined outputs.
         """
-        return shape_inference.infer_shapes(self.obj)
+        return shape_inference.infer_shapes(self._model_proto())
 
     @property
     def input_names(self):
@@ -235,7 +596,7 @@ class OnnxInference:
 
         # initializer
         exp.append("")
-        for obj in self.obj.graph.initializer:
+        for obj in self._model_proto().graph.initializer:
             dobj = _var_as_dict(obj)
             val = dobj['value']
             flat = val.flatten()
@@ -433,7 +794,7 @@ class OnnxInference:
 
         # init
         inits = {}
-        for obj in self.obj.graph.initializer:
+        for obj in self._model_proto().graph.initializer:
             value = numpy_helper.to_array(obj).tolist()
             inits[obj.name] = value
         final_obj['initializers'] = inits
@@ -492,22 +853,23 @@ class OnnxInference:
         outputs = {}
         nodes = {}
         targets = {}
-        for o in self.obj.opset_import:
+        model = self._model_proto()
+        for o in model.opset_import:
             targets[o.domain] = o.version
 
         # inputs
-        for obj in self.obj.graph.input:
+        for obj in model.graph.input:
             variables[obj.name] = _var_as_dict(obj)
 
         # outputs
-        for obj in self.obj.graph.output:
-            if hasattr(obj, 'type') and str(obj.type) != '':
+        for obj in model.graph.output:
+            if obj.HasField('type'):
                 outputs[obj.name] = _var_as_dict(obj)
             else:
                 outputs[obj.name] = {'name': obj.name}
 
         # initializer
-        for obj in self.obj.graph.initializer:
+        for obj in model.graph.initializer:
             init_obj = _var_as_dict(obj)
             if init_obj is None:
                 raise RuntimeError(
@@ -518,7 +880,7 @@ class OnnxInference:
                     obj.name, inits[obj.name], obj))
 
         # nodes
-        for node in self.obj.graph.node:
+        for node in model.graph.node:
             dobj = _var_as_dict(node)
             if dobj is None:
                 raise RuntimeError("Unable to convert a node\n{}".format(node))
@@ -530,80 +892,80 @@ class OnnxInference:
                             k, node.name, v, node))
             nodes[node.name] = OnnxInferenceNode(node, dobj)
 
-        # names
-        names = {}
-        for k, v in inits.items():
-            names[k] = ('C', v)
-        for k, v in variables.items():
-            names[k] = ('I', v)
-        for k, v in outputs.items():
-            names[k] = ('O', v)
-        for k, v in nodes.items():
-            names[k] = ('N', v)
-
-        # ordering
-        order = {}
-        modif = 1
+        # ordering, Kahn's algorithm, among the nodes ready to be
+        # executed, the first one in the graph is picked first,
+        # a node which cannot be computed is not added to the sequence
+        available = set(inits) | set(variables)
+        node_list = list(nodes.values())
+        consumers = {}
+        missing = []
+        ready = []
+        for i, node in enumerate(node_list):
+            needed = set(inp for inp in node.inputs if inp not in available)
+            missing.append(len(needed))
+            for inp in needed:
+                consumers.setdefault(inp, []).append(i)
+            if len(needed) == 0:
+                ready.append(i)
+        heapq.heapify(ready)
+
         intermediate = {}
-        while modif > 0:
-            modif = 0
-            for k, v in names.items():
-                if k in order:
-                    continue
-                if v[0] in {'I', 'C'}:
-                    order[k] = len(order)
-                    modif += 1
-                elif v[0] == 'O':
-                    continue
-                else:
-                    if all(inp in order for inp in v[1].inputs):
-                        order[k] = len(order)
-                        modif += 1
-                        for o in v[1].outputs:
-                            if o in order:
-                                raise RuntimeError(
-                                    "Two nodes share the same output '{}'.".format(o))
-                            order[o] = len(order)
-                            intermediate[o] = None
-                            modif += 1
-
-        # compute
-        rev = [(v, k) for k, v in order.items()]
-        rev.sort()
         sequence = []
-        for _, name in rev:
-            if name not in nodes:
-                continue
-            node = nodes[name]
+        while ready:
+            node = node_list[heapq.heappop(ready)]
             node.set_order(len(sequence))
             sequence.append(node)
-
-        # defines where an intermediare output is not needed
+            for o in node.outputs:
+                if o in available or o in intermediate:
+                    raise RuntimeError(
+                        "Two nodes share the same output '{}'.".format(o))
+                intermediate[o] = None
+                for j in consumers.get(o, []):
+                    missing[j] -= 1
+                    if missing[j] == 0:
+                        heapq.heappush(ready, j)
+
+        # defines where an intermediare output is not needed,
+        # graph outputs are never cleaned, outputs never used
+        # are removed right after the node producing them
         last_used = {}
         for node in sequence:
             for inp in node.inputs:
                 last_used[inp] = node.order
+        for node in sequence:
+            for o in node.outputs:
+                if o not in last_used:
+                    last_used[o] = node.order
         for k, ord in last_used.items():
+            if k in outputs:
+                continue
             sequence[ord].add_variable_to_clean(k)
 
         return dict(inits=inits, inputs=variables, outputs=outputs,
                     nodes=nodes, sequence=sequence, intermediate=intermediate,
                     targets=targets)
 
-    def run(self, inputs, clean_right_away=False,
+    def run(self, inputs, clean_right_away=None,
             intermediate=False, verbose=0, node_time=False,
-            fLOG=None):
+            fLOG=None, n_jobs=1, chunk_size=None):
         """
         Computes the predictions for this :epkg:`onnx` graph.
 
         @param      inputs              inputs as dictionary
         @param      clean_right_away    clean the intermediate outputs
-                                        as soon as they are not needed
+                                        as soon as they are not needed,
+                                        None means True unless *intermediate*
+                                        is True
         @param      intermediate        returns a dictionary of intermediate
                                         variables instead of the results only
         @param      verbose             display information while predicting
         @param      node_time           measure time of each node
         @param      fLOG                logging function if *verbose > 0*
+        @param      n_jobs              number of threads computing
+                                        chunks of rows at the same time
+        @param      chunk_size          number of rows in every chunk,
+                                        None means the rows are split into
+                                        *n_jobs* chunks
         @return                         outputs as dictionary
                                         and a second dictionary of the time spent
                                         in each node if *node_time* is True
@@ -644,15 +1006,222 @@ class OnnxInference:
         the first class builds all :epkg:`ONNX` cut out
         to keep the one output and converted into
         *OnnxInference*.
+
+        If *clean_right_away* is True, every intermediate result
+        is removed as soon as the last node using it was executed,
+        the peak memory is then the memory needed by the widest
+        part of the graph and not the sum of all intermediate results.
+
+        If *n_jobs > 1* or *chunk_size* is specified, every input
+        with as many rows as the first one is split into chunks
+        along the first axis, the chunks are computed by a pool
+        of threads and the outputs are concatenated in the same order
+        (see @see me _concatenate_chunks).
         """
-        return self._run(inputs, clean_right_away=False, intermediate=intermediate,
-                         verbose=verbose, node_time=node_time, fLOG=fLOG)
+        if n_jobs > 1 or chunk_size is not None:
+            return self._run_chunks(inputs, n_jobs=n_jobs,
+                                    chunk_size=chunk_size,
+                                    clean_right_away=clean_right_away,
+                                    intermediate=intermediate, verbose=verbose,
+                                    node_time=node_time, fLOG=fLOG)
+        if intermediate and (self.inplace_ops_ or self.arena_ops_):
+            # an operator writing into its input or into an arena
+            # shared with other results would modify an intermediate
+            # result returned to the user, the operators using
+            # the memory plan get private buffers for this call
+            arenas = [op.buffers_ for op in self.arena_ops_]
+            for op in self.inplace_ops_:
+                op.enable_inplace(False)
+            for op in self.arena_ops_:
+                op.buffers_ = {}
+            try:
+                return self._run(inputs, clean_right_away=clean_right_away,
+                                 intermediate=intermediate, verbose=verbose,
+                                 node_time=node_time, fLOG=fLOG)
+            finally:
+                for op in self.inplace_ops_:
+                    op.enable_inplace()
+                for op, buffers in zip(self.arena_ops_, arenas):
+                    op.buffers_ = buffers
+        return self._run(inputs, clean_right_away=clean_right_away,
+                         intermediate=intermediate, verbose=verbose,
+                         node_time=node_time, fLOG=fLOG)
+
+    def run_iter(self, iterable, prefetch=0, **kwargs):
+        """
+        Computes the predictions for every chunk of inputs
+        produced by an iterator and yields the outputs one by one.
+        The instance, its initializers and its buffers are reused
+        for every chunk, the memory remains bounded by the size
+        of a chunk.
+
+        @param      iterable    iterator on dictionaries of inputs,
+                                it can read a CSV file, a parquet file
+                                by row groups or a memory map by chunks
+        @param      prefetch    number of chunks read in advance by a separate
+                                thread, the reading of the next chunks
+                                happens while the current one is computed,
+                                0 to disable
+        @param      kwargs      additional parameters for method @see me run
+        @return                 iterator on outputs
+        """
+        if prefetch <= 0:
+            for inputs in iterable:
+                yield self.run(inputs, **kwargs)
+            return
+
+        queue = Queue(maxsize=prefetch)
+        stop = Event()
+        end = object()
+
+        def put(item):
+            while not stop.is_set():
+                try:
+                    queue.put(item, timeout=0.1)
+                    return True
+                except Full:
+                    continue
+            return False
+
+        def reader():
+            try:
+                for inputs in iterable:
+                    if not put((inputs, None)):
+                        return
+                put((end, None))
+            except Exception as e:  # pylint: disable=W0703
+                put((end, e))
+
+        thread = Thread(target=reader, daemon=True)
+        thread.start()
+        try:
+            while True:
+                inputs, exc = queue.get()
+                if inputs is end:
+                    if exc is not None:
+                        raise exc
+                    break
+                yield self.run(inputs, **kwargs)
+        finally:
+            stop.set()
+
+    def _run_chunks(self, inputs, n_jobs=1, chunk_size=None,
+                    clean_right_away=None, intermediate=False, verbose=0,
+                    node_time=False, fLOG=None):
+        """
+        Splits the inputs into chunks of rows, computes them
+        and concatenates the outputs, see method @see me run.
+        """
+        if intermediate or node_time or verbose:
+            raise RuntimeError(
+                "intermediate, node_time, verbose are not implemented "
+                "when the inputs are split into chunks.")
+        if n_jobs > 1 and self.reuse_buffers:
+            raise RuntimeError(
+                "reuse_buffers=True is not thread safe, n_jobs must be 1.")
+
+        n_rows = None
+        for v in inputs.values():
+            if hasattr(v, '__len__') and getattr(v, 'ndim', 1) > 0:
+                n_rows = len(v)
+                break
+        if n_rows is None:
+            raise RuntimeError("Unable to guess the number of rows.")
+        if chunk_size is None:
+            chunk_size = max((n_rows + n_jobs - 1) // n_jobs, 1)
+        if n_rows <= chunk_size:
+            return self._run(inputs, clean_right_away=clean_right_away)
+
+        split = [k for k, v in inputs.items()
+                 if hasattr(v, '__len__') and getattr(v, 'ndim', 1) > 0 and
+                 len(v) == n_rows]
+
+        def run_chunk(begin):
+            chunk = inputs.copy()
+            for k in split:
+                chunk[k] = inputs[k][begin:begin + chunk_size]
+            return self._run(chunk, clean_right_away=clean_right_away)
+
+        begins = list(range(0, n_rows, chunk_size))
+        if n_jobs > 1:
+            with ThreadPoolExecutor(max_workers=n_jobs) as executor:
+                results = list(executor.map(run_chunk, begins))
+        else:
+            results = [run_chunk(b) for b in begins]
+
+        # an output which does not have one row per input row
+        # (a reduction along the first axis for example)
+        # cannot be computed by chunks, the whole batch is computed
+        for begin, res in zip(begins, results):
+            expected = min(chunk_size, n_rows - begin)
+            if any(OnnxInference._output_rows(v) != expected
+                   for v in res.values()):
+                return self._run(inputs, clean_right_away=clean_right_away)
+        return {k: OnnxInference._concatenate_chunks(k, [r[k] for r in results])
+                for k in results[0]}
+
+    @staticmethod
+    def _output_rows(value):
+        """
+        Returns the number of rows of an output or None
+        if it does not have any (a scalar or an unknown type).
+        """
+        from .ops_cpu.op_zipmap import ArrayZipMapDictionary
+        if isinstance(value, ArrayZipMapDictionary):
+            return value._mat.shape[0]  # pylint: disable=W0212
+        shape = getattr(value, 'shape', None)
+        if shape is not None:
+            return shape[0] if len(shape) > 0 else None
+        if isinstance(value, list):
+            return len(value)
+        return None
+
+    @staticmethod
+    def _concatenate_chunks(name, parts):
+        """
+        Concatenates the outputs computed on every chunk of rows.
 
-    def _run_sequence_runtime(self, inputs, clean_right_away=False,
+        * :epkg:`numpy` arrays are concatenated along the first axis,
+        * sparse matrices are stacked vertically and keep their format,
+        * @see cl ArrayZipMapDictionary are rebuilt on the concatenated
+          matrix,
+        * lists are appended.
+
+        @param      name        output name (used in error messages)
+        @param      parts       outputs for every chunk
+        @return                 merged output
+        """
+        from scipy.sparse import issparse, vstack
+        from .ops_cpu.op_zipmap import ArrayZipMapDictionary
+        first = parts[0]
+        if isinstance(first, numpy.ndarray):
+            if len(first.shape) == 0:
+                raise RuntimeError(
+                    "Output '{}' is a scalar and cannot be computed "
+                    "by chunks of rows.".format(name))
+            return numpy.concatenate(parts, axis=0)
+        if issparse(first):
+            return vstack(parts, format=first.format)
+        if isinstance(first, ArrayZipMapDictionary):
+            return ArrayZipMapDictionary(
+                first._rev_keys, numpy.concatenate(  # pylint: disable=W0212
+                    [p._mat for p in parts], axis=0))  # pylint: disable=W0212
+        if isinstance(first, list):
+            res = []
+            for p in parts:
+                res.extend(p)
+            return res
+        raise TypeError("Unable to concatenate outputs '{}' of type {}.".format(
+            name, type(first)))
+
+    def _run_sequence_runtime(self, inputs, clean_right_away=None,
                               intermediate=False, verbose=0, node_time=False,
                               fLOG=None):
-        if clean_right_away:
-            raise NotImplementedError("clean_right_away=true not implemented.")
+        if clean_right_away is None:
+            clean_right_away = not intermediate
+        elif clean_right_away and intermediate:
+            raise RuntimeError(
+                "clean_right_away=True and intermediate=True are incompatible.")
         values = OrderedDict(inputs)
         for k, v in self.inits_.items():
             values[k] = v['value']
@@ -667,6 +1236,12 @@ class OnnxInference:
                     mtime.append(dict(i=i, name=node.onnx_node.name,
                                       op_type=node.onnx_node.op_type,
                                       time=t2 - t))
+                    if clean_right_away:
+                        node.clean_variables(values)
+            elif clean_right_away:
+                for node in self.sequence_:
+                    node.run(values)
+                    node.clean_variables(values)
             else:
                 for node in self.sequence_:
                     node.run(values)
@@ -707,6 +1282,8 @@ class OnnxInference:
                                       time=t2 - t))
                 else:
                     node.run(values)
+                if clean_right_away:
+                    node.clean_variables(values)
                 for k in sorted(values):
                     if k not in keys:
                         if isinstance(values[k], numpy.ndarray):
@@ -723,6 +1300,8 @@ class OnnxInference:
                 keys = set(values)
 
         if intermediate:
+            if self.buffered_ops_:
+                self._copy_buffered_results(values)
             return (values, mtime) if node_time else values
         else:
             try:
@@ -730,8 +1309,207 @@ class OnnxInference:
             except KeyError as e:
                 raise RuntimeError("Unable to find one output in [{}].".format(
                     ", ".join(sorted(values)))) from e
+            if self.buffered_ops_:
+                self._copy_buffered_results(res)
             return (res, mtime) if node_time else res
 
+    def _run_parallel_runtime(self, inputs, clean_right_away=None,
+                              intermediate=False, verbose=0, node_time=False,
+                              fLOG=None):
+        if verbose != 0:
+            return self._run_sequence_runtime(
+                inputs, clean_right_away=clean_right_away,
+                intermediate=intermediate, verbose=verbose,
+                node_time=node_time, fLOG=fLOG)
+        if clean_right_away is None:
+            clean_right_away = not intermediate
+        elif clean_right_away and intermediate:
+            raise RuntimeError(
+                "clean_right_away=True and intermediate=True are incompatible.")
+        if self._executor is None:
+            raise RuntimeError("The instance was closed.")
+
+        values = OrderedDict(inputs)
+        for k, v in self.inits_.items():
+            values[k] = v['value']
+
+        sequence = self.sequence_
+        remaining = [len(d) for d in self.parallel_deps_]
+        consumers = self.parallel_consumers_.copy()
+        outputs = self.outputs_
+        mtime = []
+
+        def run_node(node):
+            if node_time:
+                t = perf_counter()
+                node.run(values)
+                return perf_counter() - t
+            node.run(values)
+            return None
+
+        ready = [i for i, r in enumerate(remaining) if r == 0]
+        running = {}
+        while ready or running:
+            # the last ready node is run by the current thread
+            last = ready.pop() if not running and len(ready) == 1 else None
+            for i in ready:
+                running[self._executor.submit(run_node, sequence[i])] = i
+            ready = []
+            if last is not None:
+                finished = [(last, run_node(sequence[last]))]
+            else:
+                done, _ = wait(running, return_when=FIRST_COMPLETED)
+                finished = [(running.pop(f), f.result()) for f in done]
+
+            for i, duration in finished:
+                node = sequence[i]
+                if node_time:
+                    mtime.append(dict(i=i, name=node.onnx_node.name,
+                                      op_type=node.onnx_node.op_type,
+                                      time=duration))
+                for j in self.parallel_dependents_[i]:
+                    remaining[j] -= 1
+                    if remaining[j] == 0:
+                        ready.append(j)
+                if clean_right_away:
+                    for k in set(node.inputs):
+                        consumers[k] -= 1
+                        if consumers[k] == 0 and k not in outputs:
+                            values.pop(k, None)
+                    for k in node.outputs:
+                        if k not in consumers and k not in outputs:
+                            values.pop(k, None)
+
+        if node_time:
+            mtime.sort(key=lambda d: d['i'])
+        if intermediate:
+            res = values
+        else:
+            res = {k: values[k] for k in self.outputs_}
+        if self.buffered_ops_:
+            self._copy_buffered_results(res)
+        return (res, mtime) if node_time else res
+
+    def _run_compiled_runtime(self, inputs, clean_right_away=None,
+                              intermediate=False, verbose=0, node_time=False,
+                              fLOG=None):
+        if verbose != 0:
+            return self._run_sequence_runtime(
+                inputs, clean_right_away=clean_right_away,
+                intermediate=intermediate, verbose=verbose,
+                node_time=node_time, fLOG=fLOG)
+        if clean_right_away is None:
+            clean_right_away = not intermediate
+        elif clean_right_away and intermediate:
+            raise RuntimeError(
+                "clean_right_away=True and intermediate=True are incompatible.")
+
+        values = list(self.plan_template_)
+        for name, slot in self.plan_inputs_:
+            values[slot] = inputs[name]
+
+        mtime = []
+        for i, (fct, ins, outs, clean) in enumerate(self.plan_steps_):
+            if node_time:
+                t = perf_counter()
+            res = fct(*[values[k] for k in ins])
+            if node_time:
+                t2 = perf_counter()
+                onnx_node = self.sequence_[i].onnx_node
+                mtime.append(dict(i=i, name=onnx_node.name,
+                                  op_type=onnx_node.op_type,
+                                  time=t2 - t))
+            for k, v in zip(outs, res):
+                values[k] = v
+            if clean_right_away:
+                for k in clean:
+                    values[k] = None
+
+        if intermediate:
+            res = OrderedDict((k, values[slot])
+                              for k, slot in self.plan_slots_.items()
+                              if values[slot] is not None)
+        else:
+            res = {k: values[slot] for k, slot in self.plan_outputs_}
+        if self.buffered_ops_:
+            self._copy_buffered_results(res)
+        return (res, mtime) if node_time else res
+
+    def build_memory_plan(self, inputs, apply=False):
+        """
+        Builds a static memory plan: every intermediate result
+        is assigned to an arena shared with other results
+        whose lifetimes do not overlap (see @see fn plan_memory).
+        The shapes are obtained with a dry run.
+
+        @param      inputs      inputs for the dry run, a dictionary
+                                of arrays or shapes (tuple), zeros are
+                                used in that case
+        @param      apply       if True, operators reusing their buffers
+                                write their results into the arenas,
+                                the instance must be created with
+                                *reuse_buffers=True*
+        @return                 memory plan, see @see fn plan_memory
+
+        Once applied, the plan is used for every call to *run* with
+        inputs of the same shapes except when *intermediate* is True,
+        the results sharing an arena would overwrite each other,
+        the operators then use private buffers for this call.
+        """
+        if not hasattr(self, 'sequence_'):
+            raise RuntimeError(
+                "A memory plan cannot be built with runtime '{}'.".format(
+                    self.runtime))
+        if apply and not self.reuse_buffers:
+            raise RuntimeError(
+                "A memory plan can only be applied if reuse_buffers=True.")
+        if apply and self.parallel_branches and self.parallel_branches > 1:
+            raise RuntimeError(
+                "A memory plan relies on the sequential order and cannot be "
+                "applied if parallel_branches > 1.")
+        dtypes = {'float': numpy.float32, 'double': numpy.float64,
+                  'int64': numpy.int64, 'int32': numpy.int32,
+                  'bool': numpy.bool_}
+        feeds = {}
+        for k, v in inputs.items():
+            if isinstance(v, tuple):
+                elem = self.graph_['inputs'][k]['type'].get('elem', None)
+                if elem not in dtypes:
+                    raise TypeError(
+                        "Unable to create an input of type '{}' for '{}', "
+                        "an array must be given.".format(elem, k))
+                v = numpy.zeros(v, dtype=dtypes[elem])
+            feeds[k] = v
+
+        values = OrderedDict(feeds)
+        for k, v in self.inits_.items():
+            values[k] = v['value']
+        for node in self.sequence_:
+            node.run(values)
+
+        plan = plan_memory(self.sequence_, values, set(self.outputs_),
+                           list(feeds) + list(self.inits_))
+        if apply:
+            arrays = allocate_arenas(plan)
+            applied = []
+            for node in self.sequence_:
+                op = node.ops_
+                if not any(op is b for b in self.buffered_ops_):
+                    continue
+                for name in node.outputs:
+                    if name not in arrays:
+                        continue
+                    for key, buf in op.buffers_.items():
+                        if buf is values[name]:
+                            op.buffers_[key] = arrays[name]
+                            applied.append(name)
+                            if not any(op is a for a in self.arena_ops_):
+                                self.arena_ops_.append(op)
+                            break
+            plan['applied'] = applied
+        self.memory_plan_ = plan
+        return plan
+
     def build_intermediate(self):
         """
         Builds every possible :epkg:`ONNX` file
@@ -741,8 +1519,9 @@ class OnnxInference:
         @return         :epkg:`*py:collections:OrderedDict`
         """
         ord = OrderedDict()
-        for output in enumerate_model_node_outputs(self.obj):
-            subonx = select_model_inputs_outputs(self.obj, output)
+        model = self._model_proto()
+        for output in enumerate_model_node_outputs(model):
+            subonx = select_model_inputs_outputs(model, output)
             ord[output] = OnnxInference(subonx, runtime=self.runtime,
                                         skip_run=self.skip_run)
         return ord
@@ -833,14 +1612,15 @@ class OnnxInference:
         Switches all initializers to ``numpy.float64``. If *model*
         is None, a simple cast is done. Otherwise, the function assumes
         the model is a :epkg:`scikit-learn` pipeline.
-        This only works if the runtime is ``'python'``.
+        This only works if the runtime is ``'python'``
+        or ``'python_compiled'``.
 
         @param      model       :epkg:`scikit-learn` model or None
         @param      dtype_in    previous type
         @param      dtype_out   next type
         @return                 done operations
         """
-        if self.runtime != 'python':
+        if self.runtime not in ('python', 'python_compiled'):
             raise RuntimeError("Initializers can be casted only if the "
                                "runtime is 'python' not '{}'.".format(self.runtime))
 
@@ -885,8 +1665,12 @@ class OnnxInference:
             for i in range(distances.shape[0]):
                 j = numpy.argmin(distances[i])
                 d = distances[i, j]
-                if d < 0.1:
+                # read-only initializers were not casted
+                if d < 0.1 and aconv[i].flags.writeable:
                     numpy.copyto(aconv[i], amoda[j])
                     done.append(("pass2", d) + done_[i][0])
 
+        if self.runtime == 'python_compiled':
+            # initializers and operators were replaced
+            self._build_compiled_plan()
         return done
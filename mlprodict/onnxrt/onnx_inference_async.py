@@ -0,0 +1,245 @@
+"""
+@file
+@brief :epkg:`asyncio` front-end for @see cl OnnxInference,
+concurrent requests are gathered into batches.
+"""
+import asyncio
+from concurrent.futures import ThreadPoolExecutor
+import numpy
+from scipy.sparse import issparse
+from .onnx_inference import OnnxInference
+from .ops_cpu.op_zipmap import ArrayZipMapDictionary
+
+
+class AsyncOnnxInference:
+    """
+    Wraps an instance of @see cl OnnxInference and exposes
+    a coroutine *run*. Requests received within a short
+    latency window are concatenated into a single batch,
+    the batch is computed on a worker thread and every caller
+    receives the rows it sent. The per-row overhead of
+    the python runtime is then paid once per batch.
+
+    ::
+
+        oinf = OnnxInference(model_onnx)
+        aoinf = AsyncOnnxInference(oinf, max_batch_size=64, max_wait=0.002)
+
+        async def score(x):
+            return (await aoinf.run({'X': x}))['Y']
+
+    The instance must be used from a single event loop.
+    Requests with different input names or an input without
+    a first dimension equal to the number of rows are computed
+    separately. So are the requests of a batch if one output
+    does not have one row per input row (a reduction
+    along the first axis for example).
+    """
+
+    def __init__(self, oinf, max_batch_size=64, max_wait=0.002,
+                 executor=None):
+        """
+        @param      oinf            instance of @see cl OnnxInference
+        @param      max_batch_size  a batch is computed as soon as it
+                                    contains this number of rows
+        @param      max_wait        maximum time (in seconds) a request waits
+                                    for other requests before the batch
+                                    is computed
+        @param      executor        executor running the batches, by default,
+                                    a @see cl ThreadPoolExecutor with one thread
+                                    owned by the instance, one thread
+                                    is required if *oinf* reuses its buffers
+        """
+        if not isinstance(oinf, OnnxInference):
+            raise TypeError(
+                "oinf must be an OnnxInference not {}.".format(type(oinf)))
+        if max_batch_size < 1:
+            raise ValueError(
+                "max_batch_size must be >= 1 not {}.".format(max_batch_size))
+        self.oinf = oinf
+        self.max_batch_size = max_batch_size
+        self.max_wait = max_wait
+        self._owns_executor = executor is None
+        self.executor = (ThreadPoolExecutor(max_workers=1)
+                         if executor is None else executor)
+        self._pending = []
+        self._pending_rows = 0
+        self._timer = None
+        self._closed = False
+        self.n_requests_ = 0
+        self.n_batches_ = 0
+
+    async def run(self, inputs):
+        """
+        Computes the outputs for one request.
+
+        @param      inputs      inputs as a dictionary, every input
+                                contains one or several rows
+        @return                 outputs as a dictionary
+        """
+        if self._closed:
+            raise RuntimeError("The instance was closed.")
+        loop = asyncio.get_running_loop()
+        future = loop.create_future()
+        n_rows = AsyncOnnxInference._guess_rows(inputs)
+        self.n_requests_ += 1
+        if n_rows is None or n_rows >= self.max_batch_size:
+            self._submit(loop, [(inputs, n_rows, future)])
+            return await future
+
+        self._pending.append((inputs, n_rows, future))
+        self._pending_rows += n_rows
+        if self._pending_rows >= self.max_batch_size:
+            self._flush(loop)
+        elif self._timer is None:
+            self._timer = loop.call_later(self.max_wait, self._flush, loop)
+        return await future
+
+    def close(self):
+        """
+        Computes the pending requests on the executor and waits
+        for them, batches never run at the same time if the executor
+        has one thread, then shuts down the executor if it was created
+        by the instance. The instance cannot receive any new request
+        after that.
+        """
+        self._closed = True
+        if self._timer is not None:
+            self._timer.cancel()
+            self._timer = None
+        batch = self._pending
+        self._pending = []
+        self._pending_rows = 0
+        if batch:
+            self.n_batches_ += 1
+            results = self.executor.submit(self._run_batch, batch).result()
+            AsyncOnnxInference._dispatch(batch, results)
+        if self._owns_executor:
+            self.executor.shutdown(wait=True)
+
+    def _flush(self, loop):
+        "Submits every pending request as one batch."
+        if self._timer is not None:
+            self._timer.cancel()
+            self._timer = None
+        batch = self._pending
+        self._pending = []
+        self._pending_rows = 0
+        if batch:
+            self._submit(loop, batch)
+
+    def _submit(self, loop, batch):
+        "Computes a batch on the executor and dispatches the results."
+        self.n_batches_ += 1
+        task = loop.run_in_executor(self.executor, self._run_batch, batch)
+
+        def dispatch(task):
+            exc = task.exception()
+            if exc is not None:
+                for _, __, future in batch:
+                    if not future.done():
+                        future.set_exception(exc)
+                return
+            AsyncOnnxInference._dispatch(batch, task.result())
+
+        task.add_done_callback(dispatch)
+
+    @staticmethod
+    def _dispatch(batch, results):
+        "Sets the result or the exception of every request."
+        for (_, __, future), res in zip(batch, results):
+            if future.done():
+                continue
+            if isinstance(res, Exception):
+                future.set_exception(res)
+            else:
+                future.set_result(res)
+
+    def _run_batch(self, batch):
+        """
+        Runs on the worker thread, groups the requests by input names,
+        computes every group and returns the results in the same order
+        as the requests. If a group fails or if one output does not
+        have one row per input row, every request of the group
+        is computed alone.
+        """
+        results = [None] * len(batch)
+        groups = {}
+        for i, (inputs, n_rows, _) in enumerate(batch):
+            if n_rows is None or len(batch) == 1:
+                try:
+                    results[i] = self.oinf.run(inputs)
+                except Exception as e:  # pylint: disable=W0703
+                    results[i] = e
+                continue
+            groups.setdefault(tuple(sorted(inputs)), []).append(i)
+
+        for names, indices in groups.items():
+            n_rows = sum(batch[i][1] for i in indices)
+            try:
+                merged = {
+                    k: OnnxInference._concatenate_chunks(  # pylint: disable=W0212
+                        k, [batch[i][0][k] for i in indices])
+                    for k in names}
+                outputs = self.oinf.run(merged)
+                aligned = all(
+                    OnnxInference._output_rows(v) == n_rows  # pylint: disable=W0212
+                    for v in outputs.values())
+                if aligned:
+                    begin = 0
+                    for i in indices:
+                        end = begin + batch[i][1]
+                        results[i] = {
+                            k: AsyncOnnxInference._split_rows(k, v, begin, end)
+                            for k, v in outputs.items()}
+                        begin = end
+            except Exception:  # pylint: disable=W0703
+                aligned = False
+            if not aligned:
+                # one request may be wrong, the others must not fail,
+                # or one output mixes the rows of several requests
+                for i in indices:
+                    try:
+                        results[i] = self.oinf.run(batch[i][0])
+                    except Exception as e:  # pylint: disable=W0703
+                        results[i] = e
+        return results
+
+    @staticmethod
+    def _guess_rows(inputs):
+        """
+        Returns the number of rows of a request or None if
+        one input does not have it as first dimension.
+        """
+        n_rows = None
+        for v in inputs.values():
+            if not hasattr(v, '__len__') or getattr(v, 'ndim', 1) == 0:
+                return None
+            if n_rows is None:
+                n_rows = len(v)
+            elif len(v) != n_rows:
+                return None
+        return n_rows
+
+    @staticmethod
+    def _split_rows(name, value, begin, end):
+        """
+        Extracts rows *begin* to *end* from an output computed on a batch,
+        the reverse of *OnnxInference._concatenate_chunks*.
+        """
+        if isinstance(value, numpy.ndarray):
+            if len(value.shape) == 0:
+                raise RuntimeError(
+                    "Output '{}' is a scalar and cannot be split "
+                    "into requests.".format(name))
+            return value[begin:end].copy()
+        if issparse(value):
+            return value.tocsr()[begin:end].asformat(value.format)
+        if isinstance(value, ArrayZipMapDictionary):
+            return ArrayZipMapDictionary(
+                value._rev_keys, value._mat[begin:end])  # pylint: disable=W0212
+        if isinstance(value, list):
+            return value[begin:end]
+        raise TypeError(
+            "Unable to split output '{}' of type {}.".format(
+                name, type(value)))
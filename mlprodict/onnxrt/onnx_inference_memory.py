@@ -0,0 +1,136 @@
+"""
+@file
+@brief Static memory planning for an :epkg:`ONNX` graph
+executed by @see cl OnnxInference.
+"""
+import numpy
+
+
+def _variable_lifetimes(sequence, values, outputs, protected):
+    """
+    Computes the lifetime of every intermediate result.
+
+    @param      sequence    ordered list of @see cl OnnxInferenceNode
+    @param      values      every result obtained with a dry run
+    @param      outputs     names of the graph outputs
+    @param      protected   names of inputs and initializers
+    @return                 list of groups, every group is a dictionary
+                            ``{'names', 'start', 'end', 'nbytes'}``,
+                            results sharing the same memory (views)
+                            are put in the same group
+    """
+    last_used = {}
+    for node in sequence:
+        for inp in node.inputs:
+            last_used[inp] = node.order
+
+    groups = []
+    excluded = set()
+    for node in sequence:
+        for name in node.outputs:
+            value = values.get(name, None)
+            if not isinstance(value, numpy.ndarray):
+                continue
+            end = last_used.get(name, node.order)
+
+            # a view on an input or an initializer is never planned
+            if any(numpy.may_share_memory(value, values[k])
+                   for k in protected if isinstance(values.get(k, None),
+                                                    numpy.ndarray)):
+                continue
+
+            # a view on a previous result extends its lifetime
+            found = None
+            for g in groups:
+                if g['end'] < node.order:
+                    continue
+                if any(numpy.may_share_memory(value, values[k])
+                       for k in g['names']):
+                    found = g
+                    break
+            if found is None:
+                found = dict(names=[], start=node.order, end=end,
+                             nbytes=value.nbytes)
+                groups.append(found)
+            found['names'].append(name)
+            found['end'] = max(found['end'], end)
+            if name in outputs:
+                excluded.add(id(found))
+
+    return [g for g in groups if id(g) not in excluded]
+
+
+def plan_memory(sequence, values, outputs, protected):
+    """
+    Assigns every intermediate result to a shared memory area (an arena),
+    two results can share the same arena if their lifetimes do not overlap.
+    The function uses a greedy algorithm, results are processed by order
+    of creation and each of them takes the smallest free arena big enough
+    to hold it, or the biggest free arena which is then extended,
+    or a new arena.
+
+    @param      sequence    ordered list of @see cl OnnxInferenceNode
+    @param      values      every result obtained with a dry run
+    @param      outputs     names of the graph outputs, they are never planned
+    @param      protected   names of inputs and initializers
+    @return                 dictionary
+
+    The returned dictionary contains the following keys:
+
+    * *arenas*: list of arena sizes in bytes
+    * *variables*: dictionary ``{name: dict(arena, start, end, nbytes, shape, dtype)}``
+    * *peak_bytes*: planned memory, sum of all arenas
+    * *naive_bytes*: memory needed if every result is kept
+    * *live_bytes*: maximum memory used by results alive at the same time
+      (lower bound for *peak_bytes*)
+    """
+    groups = _variable_lifetimes(sequence, values, outputs, protected)
+    groups.sort(key=lambda g: (g['start'], -g['nbytes']))
+
+    arenas = []
+    free_after = []
+    variables = {}
+    for g in groups:
+        free = [i for i, e in enumerate(free_after) if e < g['start']]
+        fit = [i for i in free if arenas[i] >= g['nbytes']]
+        if fit:
+            index = min(fit, key=lambda i: arenas[i])
+        elif free:
+            index = max(free, key=lambda i: arenas[i])
+            arenas[index] = g['nbytes']
+        else:
+            index = len(arenas)
+            arenas.append(g['nbytes'])
+            free_after.append(-1)
+        free_after[index] = g['end']
+        for name in g['names']:
+            value = values[name]
+            variables[name] = dict(arena=index, start=g['start'],
+                                   end=g['end'], nbytes=value.nbytes,
+                                   shape=value.shape, dtype=value.dtype)
+
+    live = 0
+    for order in range(len(sequence)):
+        live = max(live, sum(g['nbytes'] for g in groups
+                             if g['start'] <= order <= g['end']))
+
+    return dict(arenas=arenas, variables=variables,
+                peak_bytes=sum(arenas), live_bytes=live,
+                naive_bytes=sum(g['nbytes'] for g in groups))
+
+
+def allocate_arenas(plan):
+    """
+    Allocates the arenas defined by function @see fn plan_memory
+    and returns one array for every planned result, every array
+    is a view on the arena the result was assigned to.
+
+    @param      plan        memory plan
+    @return                 dictionary ``{name: array}``
+    """
+    arenas = [numpy.empty(size, dtype=numpy.uint8) for size in plan['arenas']]
+    res = {}
+    for name, v in plan['variables'].items():
+        raw = arenas[v['arena']][:v['nbytes']]
+        res[name] = raw.view(v['dtype']).reshape(v['shape'])
+    return res
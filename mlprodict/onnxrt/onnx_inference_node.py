@@ -47,6 +47,16 @@ class OnnxInferenceNode:
         """
         self.variable_to_clean.append(name)
 
+    def clean_variables(self, values):
+        """
+        Removes from *values* every variable not needed
+        anymore once this node was executed.
+
+        @param      values      dictionary of existing values
+        """
+        for name in self.variable_to_clean:
+            values.pop(name, None)
+
     def __str__(self):
         "usual"
         return "Onnx-{}({}) -> {}".format(
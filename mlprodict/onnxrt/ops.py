@@ -24,7 +24,7 @@ def load_op(onnx_node, desc=None, options=None, variables=None, dtype=None):
         if 'provider' in options:
             options = options.copy()
             del options['provider']
-    if provider == 'python':
+    if provider in ('python', 'python_compiled'):
         from .ops_cpu import load_op as lo
         return lo(onnx_node, desc=desc, options=options)
     elif provider == 'onnxruntime2':
@@ -25,6 +25,18 @@ class OpRun:
     <https://github.com/onnx/onnx/tree/master/onnx/backend/test/case/node>`_.
     """
 
+    # maximum number of buffers kept by an operator
+    # when buffers are reused, see method enable_buffer_reuse
+    max_buffers = 8
+
+    # True if the operator can write its result into its first input,
+    # see method enable_inplace
+    inplace_capable = False
+
+    # options accepted by method set_runtime_options
+    _runtime_options_keys = {'num_threads', 'schedule', 'chunk_size',
+                             'parallel_threshold'}
+
     def __init__(self, onnx_node, desc=None, expected_attributes=None,
                  **options):
         """
@@ -34,6 +46,9 @@ class OpRun:
         @param      options                 runtime options
         """
         self._provider = 'python'
+        self.reuse_buffers_ = False
+        self.buffers_ = {}
+        self.inplace_ = False
         self.onnx_node = onnx_node
         self.desc = desc
         if onnx_node.op_type in _schemas:
@@ -97,6 +112,116 @@ class OpRun:
                 ", ".join(str(type(_)) for _ in args),
                 self.__class__.__name__)) from e
 
+    def enable_buffer_reuse(self, enable=True):
+        """
+        Enables or disables the reuse of output buffers.
+        Once enabled, operators implementing it write their
+        results into arrays preallocated for a given shape and type
+        and kept from one call to the next one. A result is then
+        overwritten by the next call to method *run*.
+
+        @param      enable      enable or disable
+        """
+        self.reuse_buffers_ = enable
+        self.buffers_ = {}
+
+    def enable_inplace(self, enable=True):
+        """
+        Allows or forbids the operator to write its result
+        into its first input. The caller must make sure
+        this input is not used by any other operator
+        (see method *_enable_inplace* of @see cl OnnxInference).
+        It only works if attribute *inplace_capable* is True.
+
+        @param      enable      enable or disable
+        """
+        self.inplace_ = enable and self.inplace_capable
+
+    def set_runtime_options(self, options):
+        """
+        Changes the parallelization settings of the C++ runtime
+        this operator relies on (attribute *rt_*), other operators
+        ignore them. The options are kept and applied again
+        if the runtime is replaced.
+
+        @param      options     dictionary, accepted keys are
+                                *num_threads* (0 for the default
+                                number of threads), *schedule*
+                                (``'static'`` or ``'dynamic'``),
+                                *chunk_size* (0 for the default),
+                                *parallel_threshold* (a batch with
+                                less rows is computed by one thread)
+        @return                 True if the options were applied
+        """
+        unknown = set(options) - OpRun._runtime_options_keys
+        if unknown:
+            raise ValueError(
+                "Unexpected runtime options {}, expected keys are {}.".format(
+                    list(sorted(unknown)),
+                    list(sorted(OpRun._runtime_options_keys))))
+        self.runtime_options_ = options
+        rt = getattr(self, 'rt_', None)
+        if rt is None or not hasattr(rt, 'set_num_threads'):
+            return False
+        if options.get('num_threads', None) is not None:
+            rt.set_num_threads(options['num_threads'])
+        if 'schedule' in options or 'chunk_size' in options:
+            rt.set_schedule(options.get('schedule', None) or 'static',
+                            options.get('chunk_size', None) or 0)
+        if options.get('parallel_threshold', None) is not None:
+            rt.set_parallel_threshold(options['parallel_threshold'])
+        return True
+
+    def owns_buffer(self, value):
+        """
+        Tells if *value* may share its memory with one of the
+        buffers used by this operator.
+
+        @param      value       array
+        @return                 boolean
+        """
+        for buf in self.buffers_.values():
+            if numpy.may_share_memory(value, buf):
+                return True
+        return False
+
+    def _get_buffer(self, shape, dtype, index=0):
+        """
+        Returns a preallocated array to store the output *index*
+        if buffers reuse is enabled and *dtype* is a float type,
+        None otherwise.
+
+        @param      shape       output shape
+        @param      dtype       output type
+        @param      index       output index
+        @return                 array or None
+        """
+        if not self.reuse_buffers_ or numpy.dtype(dtype).kind != 'f':
+            return None
+        key = index, shape, dtype
+        buf = self.buffers_.get(key, None)
+        if buf is None:
+            if len(self.buffers_) >= OpRun.max_buffers:
+                self.buffers_.clear()
+            buf = numpy.empty(shape, dtype=dtype)
+            self.buffers_[key] = buf
+        return buf
+
+    def _get_buffer_like(self, *args):
+        """
+        Returns a preallocated array for the first output,
+        its shape is the broadcasted shape of all arrays
+        in *args*, its type is the type of the first one.
+        Returns None if buffers reuse is disabled.
+        """
+        if not self.reuse_buffers_:
+            return None
+        if len(args) == 1:
+            shape = args[0].shape
+        else:
+            shape = numpy.broadcast(*args).shape
+        return self._get_buffer(shape, args[0].dtype)
+
     def switch_initializers_dtype(self, dtype_in=numpy.float32,
                                   dtype_out=numpy.float64):
         """
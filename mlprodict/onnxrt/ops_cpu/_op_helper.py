@@ -22,3 +22,19 @@ def _get_typed_class_attribute(self, k, atts):
     else:
         raise NotImplementedError("Unable to convert '{}' ({}).".format(
             k, getattr(self, k)))
+
+
+def _to_str_array(values):
+    """
+    Converts a list or an array of bytes or strings
+    into an array of strings, the array keeps its shape.
+    """
+    if not isinstance(values, numpy.ndarray):
+        values = numpy.array(values)
+    if values.dtype.kind == 'U':
+        return values
+    if values.dtype.kind == 'S':
+        return numpy.char.decode(values, 'utf-8')
+    res = numpy.array([v.decode('utf-8') if isinstance(v, bytes) else v
+                       for v in values.ravel()], dtype=numpy.str_)
+    return res.reshape(values.shape)
@@ -63,11 +63,11 @@ from .op_sqrt import Sqrt
 from .op_squeeze import Squeeze
 from .op_sub import Sub
 from .op_sum import Sum
-from .op_svm_classifier import SVMClassifier
-from .op_svm_regressor import SVMRegressor
+from .op_svm_classifier import SVMClassifier, SVMClassifierDouble
+from .op_svm_regressor import SVMRegressor, SVMRegressorDouble
 from .op_topk import TopK
 from .op_transpose import Transpose
-from .op_tree_ensemble_classifier import TreeEnsembleClassifier
+from .op_tree_ensemble_classifier import TreeEnsembleClassifier, TreeEnsembleClassifierDouble
 from .op_tree_ensemble_regressor import TreeEnsembleRegressor, TreeEnsembleRegressorDouble
 from .op_where import Where
 from .op_zipmap import ZipMap
@@ -4,6 +4,7 @@
 @file
 @brief Runtime operator.
 """
+import numpy
 from ._op import OpRunBinaryNum
 
 
@@ -13,4 +14,4 @@ class Add(OpRunBinaryNum):
         OpRunBinaryNum.__init__(self, onnx_node, desc=desc, **options)
 
     def _run(self, a, b):  # pylint: disable=W0221
-        return (a + b, )
+        return (numpy.add(a, b, out=self._get_buffer_like(a, b)), )
@@ -1,9 +1,21 @@
 #pragma once
 
+#include <algorithm>
 #include <cmath>
+#include <cstdint>
+#include <limits>
+#include <map>
+#include <stdexcept>
+#include <tuple>
+#include <unordered_map>
 #include <vector>
 #include <thread>
 #include <iterator>
+#include <string>
+
+#ifdef USE_OPENMP
+#include <omp.h>
+#endif
 
 
 enum class POST_EVAL_TRANSFORM {
@@ -28,6 +40,31 @@ enum class NODE_MODE {
 
 NODE_MODE to_NODE_MODE(const std::string &value);
 
+// Packed representation of a node of a tree ensemble, the nodes
+// are stored in a single array, every tree is stored breadth-first
+// from its root. truenode and falsenode are absolute positions in that
+// array, for a leaf, truenode and falsenode define the range of its weights
+// in an array of TreeLeafWeight (see link_tree_leaves).
+// A node takes 20 bytes for float, 24 bytes for double.
+template<typename NTYPE>
+struct TreeNodeElement {
+    NTYPE value;
+    int32_t feature_id;
+    int32_t truenode;
+    int32_t falsenode;
+    uint8_t mode;
+    uint8_t missing_tracks_true;
+};
+
+
+// Weight a leaf gives to a target or a class.
+template<typename NTYPE>
+struct TreeLeafWeight {
+    int64_t id;
+    NTYPE weight;
+};
+
+
 enum class AGGREGATE_FUNCTION {
   AVERAGE,
   SUM,
@@ -53,6 +90,519 @@ enum KERNEL {
 
 KERNEL to_KERNEL(const std::string &value);
 
+// Builds the packed nodes from the attributes of the operator,
+// roots contains the index of every root, nodes belonging to the same tree
+// are contiguous and a child is at position root + child id.
+// packed_roots receives the position of every root in packed.
+template<typename NTYPE>
+void pack_tree_nodes(std::vector<TreeNodeElement<NTYPE>>& packed,
+                     std::vector<int32_t>& packed_roots,
+                     const std::vector<int64_t>& roots,
+                     const std::vector<NODE_MODE>& modes,
+                     const std::vector<int64_t>& featureids,
+                     const std::vector<NTYPE>& values,
+                     const std::vector<int64_t>& truenodeids,
+                     const std::vector<int64_t>& falsenodeids,
+                     const std::vector<int64_t>& missing_tracks_true) {
+    if (modes.size() >= (size_t)std::numeric_limits<int32_t>::max())
+        throw std::runtime_error("Too many nodes in the tree ensemble.");
+    bool has_missing = missing_tracks_true.size() == truenodeids.size();
+    packed.clear();
+    packed.reserve(modes.size());
+    packed_roots.clear();
+    packed_roots.reserve(roots.size());
+    std::vector<int64_t> queue;
+    queue.reserve(modes.size());
+    for (auto root : roots) {
+        // breadth-first, queue[k] is the original index of packed[first + k]
+        int32_t first = static_cast<int32_t>(packed.size());
+        packed_roots.push_back(first);
+        queue.clear();
+        queue.push_back(root);
+        for (size_t k = 0; k < queue.size(); ++k) {
+            int64_t i = queue[k];
+            if (i < 0 || i >= (int64_t)modes.size())
+                throw std::runtime_error("A node of the tree ensemble points to a missing node.");
+            TreeNodeElement<NTYPE> node;
+            node.mode = static_cast<uint8_t>(modes[i]);
+            node.missing_tracks_true = has_missing && missing_tracks_true[i] != 0 ? 1 : 0;
+            if (modes[i] == NODE_MODE::LEAF) {
+                node.value = 0;
+                node.feature_id = 0;
+                node.truenode = static_cast<int32_t>(i);
+                node.falsenode = static_cast<int32_t>(i);
+            }
+            else {
+                node.value = values[i];
+                node.feature_id = static_cast<int32_t>(featureids[i]);
+                queue.push_back(root + truenodeids[i]);
+                node.truenode = first + static_cast<int32_t>(queue.size()) - 1;
+                queue.push_back(root + falsenodeids[i]);
+                node.falsenode = first + static_cast<int32_t>(queue.size()) - 1;
+            }
+            packed.push_back(node);
+            if (packed.size() > modes.size() * 2)
+                throw std::runtime_error("A tree of the ensemble contains a cycle.");
+        }
+    }
+}
+
+
+// Replaces for every leaf built by pack_tree_nodes its original index by
+// the range of its weights in leaves, leafdata contains tuples
+// (tree id, node id, target or class id, weight) sorted by tree id and node id,
+// treeids and nodeids are the original attributes.
+template<typename NTYPE>
+void link_tree_leaves(std::vector<TreeNodeElement<NTYPE>>& packed,
+                      std::vector<TreeLeafWeight<NTYPE>>& leaves,
+                      const std::vector<int64_t>& treeids,
+                      const std::vector<int64_t>& nodeids,
+                      const std::vector<std::tuple<int64_t, int64_t, int64_t, NTYPE>>& leafdata) {
+    const int64_t offset = 4000000000L;
+    std::unordered_map<int64_t, std::pair<size_t, size_t>> ranges;
+    for (size_t i = 0; i < leafdata.size(); ++i) {
+        int64_t id = std::get<0>(leafdata[i]) * offset + std::get<1>(leafdata[i]);
+        auto it = ranges.find(id);
+        if (it == ranges.end())
+            ranges.insert(std::make_pair(id, std::make_pair(i, i + 1)));
+        else
+            it->second.second = i + 1;
+    }
+    leaves.clear();
+    leaves.reserve(leafdata.size());
+    for (auto& node : packed) {
+        if (node.mode != static_cast<uint8_t>(NODE_MODE::LEAF))
+            continue;
+        int64_t id = treeids[node.truenode] * offset + nodeids[node.truenode];
+        node.truenode = static_cast<int32_t>(leaves.size());
+        auto it = ranges.find(id);
+        if (it != ranges.end()) {
+            for (size_t i = it->second.first; i < it->second.second; ++i) {
+                TreeLeafWeight<NTYPE> w;
+                w.id = std::get<2>(leafdata[i]);
+                w.weight = std::get<3>(leafdata[i]);
+                leaves.push_back(w);
+            }
+        }
+        node.falsenode = static_cast<int32_t>(leaves.size());
+    }
+}
+
+
+// Rows are walked through a tree by blocks of rows before going
+// to the next tree so that the tree remains in cache. Every thread
+// receives at least one block, a block of one row means every row walks
+// through all trees before the next row.
+inline int64_t choose_tree_block_size(int64_t n_rows, int64_t n_threads,
+                                      int64_t max_block_size) {
+    if (max_block_size <= 1 || n_rows <= 1)
+        return 1;
+    if (n_threads < 1)
+        n_threads = 1;
+    int64_t per_thread = (n_rows + n_threads - 1) / n_threads;
+    return per_thread < max_block_size ? per_thread : max_block_size;
+}
+
+
+// A batch with less rows than the threshold is computed by splitting
+// the trees across threads, every thread holds partial scores
+// which are reduced once all trees are processed.
+inline bool use_tree_parallel(int64_t n_rows, size_t n_trees,
+                              int64_t threshold) {
+    return n_rows > 0 && n_rows < threshold && n_trees > 1;
+}
+
+
+// Walks down a tree stored by pack_tree_nodes and returns the leaf
+// (or the last node if max_depth is reached).
+template<typename NTYPE>
+inline const TreeNodeElement<NTYPE>* process_packed_tree(
+        const TreeNodeElement<NTYPE>* nodes, int32_t root,
+        const NTYPE* x_data, int64_t max_tree_depth) {
+    const TreeNodeElement<NTYPE>* node = nodes + root;
+    int64_t loopcount = 0;
+    while (node->mode != static_cast<uint8_t>(NODE_MODE::LEAF)) {
+        NTYPE val = x_data[node->feature_id];
+        bool cond;
+        switch (static_cast<NODE_MODE>(node->mode)) {
+            case NODE_MODE::BRANCH_LEQ:
+                cond = val <= node->value;
+                break;
+            case NODE_MODE::BRANCH_LT:
+                cond = val < node->value;
+                break;
+            case NODE_MODE::BRANCH_GTE:
+                cond = val >= node->value;
+                break;
+            case NODE_MODE::BRANCH_GT:
+                cond = val > node->value;
+                break;
+            case NODE_MODE::BRANCH_EQ:
+                cond = val == node->value;
+                break;
+            case NODE_MODE::BRANCH_NEQ:
+                cond = val != node->value;
+                break;
+            default:
+                throw std::runtime_error("unknown node mode");
+        }
+        if (node->missing_tracks_true && std::isnan(val))
+            cond = true;
+        node = nodes + (cond ? node->truenode : node->falsenode);
+        if (++loopcount > max_tree_depth)
+            break;
+    }
+    return node;
+}
+
+
+// Bin given to a missing value by bin_tree_features.
+const uint16_t TREE_BIN_NAN = std::numeric_limits<uint16_t>::max();
+
+// Node of a tree ensemble comparing binned features (see bin_tree_nodes),
+// the nodes are stored at the same positions as the packed nodes,
+// the false child always follows the true child. For a leaf,
+// truenode and feature_id define the range of its weights.
+// A node takes 12 bytes.
+struct TreeBinnedNode {
+    int32_t feature_id;
+    int32_t truenode;
+    uint16_t threshold;
+    uint8_t mode;
+    uint8_t nan_goes_true;
+};
+
+
+// Replaces every threshold of the packed nodes by a small integer.
+// The thresholds of every feature are sorted, a value x becomes 2k
+// if it falls between thresholds k-1 and k, 2k+1 if it is equal to
+// threshold k. Comparing x to a threshold is then equivalent to comparing
+// their bins. features receives the features used by the trees,
+// the thresholds of features[j] are thresholds[offsets[j]:offsets[j+1]]
+// and the feature_id of a binned node is a position in features.
+// Returns false and leaves binned empty if a feature has too many
+// distinct thresholds to fit in 16 bits.
+template<typename NTYPE>
+bool bin_tree_nodes(const std::vector<TreeNodeElement<NTYPE>>& packed,
+                    std::vector<TreeBinnedNode>& binned,
+                    std::vector<int32_t>& features,
+                    std::vector<int64_t>& offsets,
+                    std::vector<NTYPE>& thresholds) {
+    binned.clear();
+    features.clear();
+    offsets.clear();
+    thresholds.clear();
+    std::map<int32_t, std::vector<NTYPE>> values;
+    for (auto& node : packed) {
+        if (node.mode == static_cast<uint8_t>(NODE_MODE::LEAF))
+            continue;
+        if (std::isnan(node.value) || node.falsenode != node.truenode + 1)
+            return false;
+        values[node.feature_id].push_back(node.value);
+    }
+    std::unordered_map<int32_t, int32_t> positions;
+    offsets.push_back(0);
+    for (auto& it : values) {
+        std::vector<NTYPE>& v = it.second;
+        std::sort(v.begin(), v.end());
+        v.erase(std::unique(v.begin(), v.end()), v.end());
+        if (v.size() * 2 >= (size_t)TREE_BIN_NAN) {
+            features.clear();
+            offsets.clear();
+            thresholds.clear();
+            return false;
+        }
+        positions[it.first] = static_cast<int32_t>(features.size());
+        features.push_back(it.first);
+        thresholds.insert(thresholds.end(), v.begin(), v.end());
+        offsets.push_back(static_cast<int64_t>(thresholds.size()));
+    }
+    binned.resize(packed.size());
+    for (size_t i = 0; i < packed.size(); ++i) {
+        const TreeNodeElement<NTYPE>& node = packed[i];
+        TreeBinnedNode& b = binned[i];
+        b.mode = node.mode;
+        b.truenode = node.truenode;
+        if (node.mode == static_cast<uint8_t>(NODE_MODE::LEAF)) {
+            b.feature_id = node.falsenode;
+            b.threshold = 0;
+            b.nan_goes_true = 0;
+            continue;
+        }
+        int32_t j = positions[node.feature_id];
+        const NTYPE* begin = thresholds.data() + offsets[j];
+        const NTYPE* end = thresholds.data() + offsets[j + 1];
+        const NTYPE* pos = std::lower_bound(begin, end, node.value);
+        b.feature_id = j;
+        b.threshold = static_cast<uint16_t>(2 * (pos - begin) + 1);
+        // comparisons with NaN are false except for BRANCH_NEQ
+        b.nan_goes_true = node.missing_tracks_true ||
+                          node.mode == static_cast<uint8_t>(NODE_MODE::BRANCH_NEQ) ? 1 : 0;
+    }
+    return true;
+}
+
+
+// Binning a row costs a binary search for every feature the trees use,
+// it makes every node visited by the row cheaper. The function compares
+// both costs for nodes built by bin_tree_nodes, n_trees is the number
+// of trees, a tree is expected to be walked down to a leaf of average depth.
+inline bool tree_binning_is_faster(const std::vector<TreeBinnedNode>& binned,
+                                   size_t n_trees,
+                                   const std::vector<int64_t>& offsets) {
+    if (binned.empty() || n_trees == 0)
+        return false;
+    // children are stored after their parent
+    std::vector<int32_t> depth(binned.size(), 0);
+    double leaf_depth = 0, n_leaves = 0;
+    for (size_t i = 0; i < binned.size(); ++i) {
+        if (binned[i].mode == static_cast<uint8_t>(NODE_MODE::LEAF)) {
+            leaf_depth += depth[i];
+            n_leaves += 1;
+        }
+        else {
+            depth[binned[i].truenode] = depth[i] + 1;
+            depth[binned[i].truenode + 1] = depth[i] + 1;
+        }
+    }
+    double walk_cost = leaf_depth / n_leaves * n_trees;
+    double bin_cost = 0;
+    for (size_t j = 0; j + 1 < offsets.size(); ++j)
+        bin_cost += std::log2((double)(offsets[j + 1] - offsets[j] + 1)) + 1;
+    return bin_cost * 2 < walk_cost;
+}
+
+
+// Bins the features of n_rows rows for nodes built by bin_tree_nodes,
+// bins receives n_rows * features.size() values, feature by feature
+// so that the thresholds of a feature remain in cache.
+template<typename NTYPE>
+void bin_tree_features(const NTYPE* x_data, int64_t stride, int64_t n_rows,
+                       const std::vector<int32_t>& features,
+                       const std::vector<int64_t>& offsets,
+                       const std::vector<NTYPE>& thresholds,
+                       uint16_t* bins) {
+    int64_t n_features = static_cast<int64_t>(features.size());
+    for (int64_t j = 0; j < n_features; ++j) {
+        const NTYPE* begin = thresholds.data() + offsets[j];
+        const NTYPE* end = thresholds.data() + offsets[j + 1];
+        const NTYPE* x = x_data + features[j];
+        uint16_t* b = bins + j;
+        for (int64_t i = 0; i < n_rows; ++i, x += stride, b += n_features) {
+            if (std::isnan(*x)) {
+                *b = TREE_BIN_NAN;
+                continue;
+            }
+            const NTYPE* pos = std::lower_bound(begin, end, *x);
+            *b = static_cast<uint16_t>(2 * (pos - begin) + (pos != end && *pos == *x ? 1 : 0));
+        }
+    }
+}
+
+
+// Walks down a tree stored by bin_tree_nodes and returns the leaf
+// (or the last node if max_depth is reached), bins is a row
+// binned by bin_tree_features.
+inline const TreeBinnedNode* process_binned_tree(
+        const TreeBinnedNode* nodes, int32_t root,
+        const uint16_t* bins, int64_t max_tree_depth) {
+    const TreeBinnedNode* node = nodes + root;
+    int64_t loopcount = 0;
+    while (node->mode != static_cast<uint8_t>(NODE_MODE::LEAF)) {
+        uint16_t val = bins[node->feature_id];
+        bool cond;
+        if (val == TREE_BIN_NAN)
+            cond = node->nan_goes_true != 0;
+        else {
+            switch (static_cast<NODE_MODE>(node->mode)) {
+                case NODE_MODE::BRANCH_LEQ:
+                    cond = val <= node->threshold;
+                    break;
+                case NODE_MODE::BRANCH_LT:
+                    cond = val < node->threshold;
+                    break;
+                case NODE_MODE::BRANCH_GTE:
+                    cond = val >= node->threshold;
+                    break;
+                case NODE_MODE::BRANCH_GT:
+                    cond = val > node->threshold;
+                    break;
+                case NODE_MODE::BRANCH_EQ:
+                    cond = val == node->threshold;
+                    break;
+                case NODE_MODE::BRANCH_NEQ:
+                    cond = val != node->threshold;
+                    break;
+                default:
+                    throw std::runtime_error("unknown node mode");
+            }
+        }
+        node = nodes + node->truenode + (cond ? 0 : 1);
+        if (++loopcount > max_tree_depth)
+            break;
+    }
+    return node;
+}
+
+
+// Transposes n_vectors vectors of n_features values,
+// the result is stored feature by feature as compute_kernel_block expects.
+template<typename NTYPE>
+void transpose_vectors(const std::vector<NTYPE>& vectors, int64_t n_vectors,
+                       int64_t n_features, std::vector<NTYPE>& vectors_t) {
+    vectors_t.resize(n_vectors * n_features);
+    for (int64_t j = 0; j < n_vectors; ++j)
+        for (int64_t k = 0; k < n_features; ++k)
+            vectors_t[k * n_vectors + j] = vectors[j * n_features + k];
+}
+
+
+// Computes the kernel between every row of a block and every vector,
+// kernels[i * n_vectors + j] = K(row i, vector j). vectors_t holds the vectors
+// feature by feature (see transpose_vectors), a row is multiplied with
+// a tile of consecutive vectors in a loop the compiler vectorizes,
+// the tile remains in cache for all the rows of the block.
+template<typename NTYPE>
+void compute_kernel_block(const NTYPE* x_data, int64_t n_rows, int64_t stride,
+                          const NTYPE* vectors_t, int64_t n_vectors, int64_t n_features,
+                          KERNEL kernel, NTYPE gamma, NTYPE coef0, NTYPE degree,
+                          NTYPE* kernels) {
+    const int64_t tile = 256;
+    // sums are accumulated in double as a scalar product would be
+    double acc[tile];
+    for (int64_t jt = 0; jt < n_vectors; jt += tile) {
+        int64_t nj = jt + tile < n_vectors ? tile : n_vectors - jt;
+        for (int64_t i = 0; i < n_rows; ++i) {
+            const NTYPE* x = x_data + i * stride;
+            std::fill(acc, acc + nj, 0.);
+            if (kernel == KERNEL::RBF) {
+                for (int64_t k = 0; k < n_features; ++k) {
+                    double xk = x[k];
+                    const NTYPE* v = vectors_t + k * n_vectors + jt;
+                    for (int64_t j = 0; j < nj; ++j) {
+                        double d = xk - v[j];
+                        acc[j] += d * d;
+                    }
+                }
+            }
+            else {
+                for (int64_t k = 0; k < n_features; ++k) {
+                    double xk = x[k];
+                    const NTYPE* v = vectors_t + k * n_vectors + jt;
+                    for (int64_t j = 0; j < nj; ++j)
+                        acc[j] += xk * v[j];
+                }
+            }
+            NTYPE* out = kernels + i * n_vectors + jt;
+            switch (kernel) {
+                case KERNEL::POLY:
+                    for (int64_t j = 0; j < nj; ++j)
+                        out[j] = (NTYPE)std::pow(gamma * acc[j] + coef0, degree);
+                    break;
+                case KERNEL::SIGMOID:
+                    for (int64_t j = 0; j < nj; ++j)
+                        out[j] = (NTYPE)std::tanh(gamma * acc[j] + coef0);
+                    break;
+                case KERNEL::RBF:
+                    for (int64_t j = 0; j < nj; ++j)
+                        out[j] = (NTYPE)std::exp(-gamma * acc[j]);
+                    break;
+                case KERNEL::LINEAR:
+                    for (int64_t j = 0; j < nj; ++j)
+                        out[j] = (NTYPE)acc[j];
+                    break;
+            }
+        }
+    }
+}
+
+
+// Number of rows a thread computes at once for a kernel method,
+// the kernels of a block take block * n_vectors values.
+inline int64_t choose_kernel_block_size(int64_t n_rows, int64_t n_threads,
+                                        int64_t n_vectors) {
+    const int64_t max_values = 1 << 16;
+    int64_t block = n_vectors > 0 ? max_values / n_vectors : 64;
+    if (block > 64)
+        block = 64;
+    if (n_threads < 1)
+        n_threads = 1;
+    int64_t per_thread = (n_rows + n_threads - 1) / n_threads;
+    if (per_thread < block)
+        block = per_thread;
+    return block < 1 ? 1 : block;
+}
+
+
+// Parallelization settings held by every instance of a runtime,
+// a null value keeps the default of the openmp library.
+struct ParallelSettings {
+    int64_t n_threads;
+    bool dynamic;
+    int64_t chunk_size;
+    // a batch with less rows is computed by the calling thread
+    int64_t threshold;
+
+    ParallelSettings() : n_threads(0), dynamic(false), chunk_size(0), threshold(0) {}
+
+    // Number of threads computing a batch of n_rows.
+    int64_t num_threads(int64_t n_rows) const {
+        if (n_rows < threshold)
+            return 1;
+#ifdef USE_OPENMP
+        return n_threads > 0 ? n_threads : ::omp_get_max_threads();
+#else
+        return 1;
+#endif
+    }
+
+    // Loops declared with schedule(runtime) follow this schedule
+    // in the next parallel regions opened by the calling thread.
+    void apply_schedule() const {
+#ifdef USE_OPENMP
+        ::omp_set_schedule(dynamic ? omp_sched_dynamic : omp_sched_static,
+                           static_cast<int>(chunk_size));
+#endif
+    }
+
+    void set_num_threads(int64_t n) {
+        if (n < 0)
+            throw std::runtime_error("The number of threads must be >= 0 (0 for the default).");
+        n_threads = n;
+    }
+
+    void set_schedule(const std::string& kind, int64_t chunk) {
+        if (kind == "static")
+            dynamic = false;
+        else if (kind == "dynamic")
+            dynamic = true;
+        else
+            throw std::runtime_error(std::string("Unexpected schedule '") + kind +
+                                     std::string("', it must be 'static' or 'dynamic'."));
+        if (chunk < 0)
+            throw std::runtime_error("chunk_size must be >= 0 (0 for the default).");
+        chunk_size = chunk;
+    }
+
+    void set_threshold(int64_t n_rows) {
+        threshold = n_rows < 0 ? 0 : n_rows;
+    }
+
+    // Describes the settings which differ from the default ones.
+    std::string to_string() const {
+        std::string res;
+        if (n_threads > 0)
+            res += " NUM_THREADS=" + std::to_string(n_threads);
+        if (dynamic || chunk_size > 0)
+            res += std::string(" SCHEDULE=") + (dynamic ? "dynamic" : "static") +
+                   "," + std::to_string(chunk_size);
+        if (threshold > 0)
+            res += " PARALLEL_THRESHOLD=" + std::to_string(threshold);
+        return res;
+    }
+};
+
+
 static inline float ErfInv(float x) {
   float sgn = x < 0 ? -1.0f : 1.0f;
   x = (1 - x) * (1 + x);
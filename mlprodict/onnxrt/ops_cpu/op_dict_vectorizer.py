@@ -4,12 +4,20 @@
 @file
 @brief Runtime operator.
 """
+from itertools import chain, repeat
 import numpy
-from scipy.sparse import coo_matrix
+from scipy.sparse import csr_matrix
 from ._op import OpRun, RuntimeTypeError
+from ._op_helper import _to_str_array
 
 
 class DictVectorizer(OpRun):
+    """
+    The input is a list of dictionaries or a list of
+    pairs *(keys, values)*, one pair of arrays per row,
+    the output is a :epkg:`scipy` *csr_matrix*.
+    Keys missing from the vocabulary are ignored.
+    """
 
     atts = {'int64_vocabulary': numpy.empty(0, dtype=numpy.int64),
             'string_vocabulary': numpy.empty(0, dtype=numpy.str)}
@@ -18,32 +26,64 @@ class DictVectorizer(OpRun):
         OpRun.__init__(self, onnx_node, desc=desc,
                        expected_attributes=DictVectorizer.atts,
                        **options)
-        self.dict_labels = {}
         if len(self.int64_vocabulary) > 0:
-            for i, v in enumerate(self.int64_vocabulary):
-                self.dict_labels[v] = i
+            vocabulary = numpy.array(self.int64_vocabulary, dtype=numpy.int64)
             self.is_int = True
         else:
-            for i, v in enumerate(self.string_vocabulary):
-                self.dict_labels[v.decode('utf-8')] = i
+            vocabulary = _to_str_array(self.string_vocabulary)
             self.is_int = False
-        if len(self.dict_labels) == 0:
+        if len(vocabulary) == 0:
             raise RuntimeError("int64_vocabulary and string_vocabulary "
                                "cannot be both empty.")
+        # keys given as dictionaries are mapped to columns with
+        # a hash table, keys given as arrays with numpy.searchsorted
+        self.dict_labels = {v: i for i, v in enumerate(vocabulary.tolist())}
+        self.order_ = numpy.argsort(vocabulary, kind='mergesort')
+        self.vocabulary_sorted_ = vocabulary[self.order_]
 
     def _run(self, x):  # pylint: disable=W0221
         if not isinstance(x, (numpy.ndarray, list)):
             raise RuntimeTypeError(
                 "x must be iterable not {}.".format(type(x)))
-        values = []
-        rows = []
-        cols = []
-        for i, row in enumerate(x):
-            for k, v in row.items():
-                values.append(v)
-                rows.append(i)
-                cols.append(self.dict_labels[k])
-        values = numpy.array(values)
-        rows = numpy.array(rows)
-        cols = numpy.array(cols)
-        return (coo_matrix((values, (rows, cols)), shape=(len(x), len(self.dict_labels))), )
+        n_rows = len(x)
+        n_cols = self.vocabulary_sorted_.shape[0]
+        if n_rows == 0:
+            return (csr_matrix((0, n_cols)), )
+
+        # first pass, counts the number of keys in every row,
+        # second pass, fills columns and values for all rows
+        if isinstance(x[0], tuple):
+            lengths = numpy.fromiter((len(row[0]) for row in x),
+                                     dtype=numpy.int64, count=n_rows)
+            keys = numpy.concatenate([row[0] for row in x])
+            values = numpy.concatenate([row[1] for row in x])
+            keys = (keys.astype(numpy.int64, copy=False) if self.is_int
+                    else _to_str_array(keys))
+            vocabulary = self.vocabulary_sorted_
+            index = numpy.searchsorted(vocabulary, keys)
+            index[index == n_cols] = 0
+            found = vocabulary[index] == keys
+            columns = self.order_[index]
+        else:
+            lengths = numpy.fromiter((len(row) for row in x),
+                                     dtype=numpy.int64, count=n_rows)
+            nnz = int(lengths.sum())
+            columns = numpy.fromiter(
+                map(self.dict_labels.get,
+                    chain.from_iterable(row.keys() for row in x), repeat(-1)),
+                dtype=numpy.int64, count=nnz)
+            values = numpy.array(
+                list(chain.from_iterable(row.values() for row in x)))
+            found = columns >= 0
+
+        indptr = numpy.zeros(n_rows + 1, dtype=numpy.int64)
+        if found.all():
+            numpy.cumsum(lengths, out=indptr[1:])
+        else:
+            rows = numpy.repeat(numpy.arange(n_rows), lengths)
+            numpy.cumsum(numpy.bincount(rows[found], minlength=n_rows),
+                         out=indptr[1:])
+            columns = columns[found]
+            values = values[found]
+        return (csr_matrix((values, columns, indptr),
+                           shape=(n_rows, n_cols)), )
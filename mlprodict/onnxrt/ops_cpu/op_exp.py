@@ -15,4 +15,4 @@ class Exp(OpRunUnaryNum):
                                **options)
 
     def _run(self, x):  # pylint: disable=W0221
-        return (numpy.exp(x), )
+        return (numpy.exp(x, out=self._get_buffer_like(x)), )
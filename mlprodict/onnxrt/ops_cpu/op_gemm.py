@@ -40,5 +40,22 @@ class Gemm(OpRun):
     def _gemm11(a, b, c, alpha, beta):
         return numpy.dot(a.T, b.T) * alpha + c * beta
 
+    def _gemm_out(self, a, b, c, out):
+        numpy.dot(a.T if self.transA else a,
+                  b.T if self.transB else b, out=out)
+        if self.alpha != 1:
+            out *= self.alpha
+        if self.beta == 1:
+            out += c
+        elif self.beta != 0:
+            out += c * self.beta
+        return out
+
     def _run(self, a, b, c):  # pylint: disable=W0221
+        if self.reuse_buffers_ and a.dtype == b.dtype:
+            shape = (a.shape[1] if self.transA else a.shape[0],
+                     b.shape[0] if self.transB else b.shape[1])
+            out = self._get_buffer(shape, a.dtype)
+            if out is not None:
+                return (self._gemm_out(a, b, c, out), )
         return (self._meth(a, b, c), )
@@ -15,6 +15,8 @@ class Imputer(OpRunUnaryNum):
             'replaced_value_float': 0.,
             'replaced_value_int64': 0}
 
+    inplace_capable = True
+
     def __init__(self, onnx_node, desc=None, **options):
         OpRunUnaryNum.__init__(self, onnx_node, desc=desc,
                                expected_attributes=Imputer.atts,
@@ -35,13 +37,13 @@ class Imputer(OpRunUnaryNum):
         if self.values.shape[0] != x.shape[1]:
             raise RuntimeTypeError(
                 "Dimension mismatch {} != {}".format(
-                    self.to_replace.shape[0], x.shape[1]))
-        x = x.copy()
+                    self.values.shape[0], x.shape[1]))
         if numpy.isnan(self.replace):
-            for i in range(0, x.shape[1]):
-                x[numpy.isnan(x[:, i]), i] = self.values[i]
+            mask = numpy.isnan(x)
         else:
-            for i in range(0, x.shape[1]):
-                x[x[:, i] == self.replace, i] = self.values[i]
-
-        return (x, )
+            mask = x == self.replace
+        values = self.values.astype(x.dtype, copy=False)
+        if self.inplace_ and x.flags.owndata and x.flags.writeable:
+            numpy.copyto(x, values, where=mask)
+            return (x, )
+        return (numpy.where(mask, values, x), )
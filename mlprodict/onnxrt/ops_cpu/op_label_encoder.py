@@ -6,6 +6,7 @@
 """
 import numpy
 from ._op import OpRun
+from ._op_helper import _to_str_array
 
 
 class LabelEncoder(OpRun):
@@ -25,28 +26,51 @@ class LabelEncoder(OpRun):
                        expected_attributes=LabelEncoder.atts,
                        **options)
         if len(self.keys_floats) > 0:
-            self.classes_ = {k: v for k, v in zip(
-                self.keys_floats, self.values_floats)}
-            self.default_ = self.default_float
-            self.dtype_ = numpy.float32
+            keys = numpy.array(self.keys_floats, dtype=numpy.float32)
         elif len(self.keys_int64s) > 0:
-            self.classes_ = {k: v for k, v in zip(
-                self.keys_int64s, self.values_int64s)}
-            self.default_ = self.default_int64
-            self.dtype_ = numpy.int64
+            keys = numpy.array(self.keys_int64s, dtype=numpy.int64)
         elif len(self.keys_strings) > 0:
-            self.classes_ = {k: v for k, v in zip(
-                self.keys_strings, self.values_strings)}
-            self.default_ = self.default_string
-            self.dtype_ = numpy.str
+            keys = _to_str_array(self.keys_strings)
         elif hasattr(self, 'classes_strings'):
             raise RuntimeError("This runtime does not implement version 1 of "
                                "operator LabelEncoder.")
         else:
             raise RuntimeError("No encoding was defined.")
 
+        if len(self.values_floats) > 0:
+            values = numpy.array(self.values_floats, dtype=numpy.float32)
+            default = self.default_float
+        elif len(self.values_int64s) > 0:
+            values = numpy.array(self.values_int64s, dtype=numpy.int64)
+            default = self.default_int64
+        elif len(self.values_strings) > 0:
+            values = _to_str_array(self.values_strings)
+            default = _to_str_array([self.default_string])[0]
+        else:
+            raise RuntimeError("No value was defined.")
+        if values.shape != keys.shape:
+            raise RuntimeError(
+                "Keys and values must have the same size {} != {}.".format(
+                    keys.shape, values.shape))
+
+        # keys are sorted once, every batch is then resolved with
+        # numpy.searchsorted, the default value is stored at the end
+        # of the value array, an unknown key points to it
+        order = numpy.argsort(keys, kind='mergesort')
+        self.keys_sorted_ = keys[order]
+        default = numpy.array([default])
+        if values.dtype.kind != 'U':
+            default = default.astype(values.dtype)
+        self.values_sorted_ = numpy.hstack([values[order], default])
+        self.dtype_ = self.values_sorted_.dtype
+
     def _run(self, x):  # pylint: disable=W0221
-        res = numpy.empty((x.shape[0], ), dtype=self.dtype_)
-        for i in range(0, res.shape[0]):
-            res[i] = self.classes_.get(x[i], self.default_)
-        return (res, )
+        keys = self.keys_sorted_
+        if keys.dtype.kind == 'U':
+            x = _to_str_array(x)
+        elif x.dtype != keys.dtype:
+            x = x.astype(keys.dtype)
+        index = numpy.searchsorted(keys, x)
+        index[index == keys.shape[0]] = 0
+        index[keys[index] != x] = keys.shape[0]
+        return (self.values_sorted_[index], )
@@ -5,6 +5,7 @@
 @brief Runtime operator.
 """
 import numpy
+from scipy.sparse import issparse
 from scipy.special import expit  # pylint: disable=E0611
 from ._op import OpRunClassifierProb
 
@@ -35,7 +36,15 @@ class LinearClassifier(OpRunClassifierProb):
         self.coefficients = self.coefficients.reshape(self.nb_class, n).T
 
     def _run(self, x):  # pylint: disable=W0221
-        score = numpy.dot(x, self.coefficients)
+        if issparse(x):
+            score = x @ self.coefficients
+        else:
+            if len(x.shape) == 2 and x.dtype == self.coefficients.dtype:
+                out = self._get_buffer((x.shape[0], self.coefficients.shape[1]),
+                                       x.dtype, index=1)
+            else:
+                out = None
+            score = numpy.dot(x, self.coefficients, out=out)
         if self.intercepts is not None:
             score += self.intercepts
 
@@ -5,6 +5,7 @@
 @brief Runtime operator.
 """
 import numpy
+from scipy.sparse import issparse
 from ._op import OpRunUnaryNum
 
 
@@ -24,7 +25,10 @@ class LinearRegressor(OpRunUnaryNum):
         self.coefficients = self.coefficients.reshape(self.targets, n).T
 
     def _run(self, x):  # pylint: disable=W0221
-        score = numpy.dot(x, self.coefficients)
+        if issparse(x):
+            score = x @ self.coefficients
+        else:
+            score = numpy.dot(x, self.coefficients)
         if self.intercepts is not None:
             score += self.intercepts
         if self.post_transform == b'NONE':
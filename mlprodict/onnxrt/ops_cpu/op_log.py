@@ -15,4 +15,4 @@ class Log(OpRunUnaryNum):
                                **options)
 
     def _run(self, x):  # pylint: disable=W0221
-        return (numpy.log(x), )
+        return (numpy.log(x, out=self._get_buffer_like(x)), )
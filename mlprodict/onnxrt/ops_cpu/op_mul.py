@@ -14,4 +14,4 @@ class Mul(OpRunBinaryNum):
         OpRunBinaryNum.__init__(self, onnx_node, desc=desc, **options)
 
     def _run(self, a, b):  # pylint: disable=W0221
-        return (numpy.multiply(a, b), )
+        return (numpy.multiply(a, b, out=self._get_buffer_like(a, b)), )
@@ -5,7 +5,9 @@
 @brief Runtime operator.
 """
 import numpy
+from scipy.sparse import csr_matrix
 from ._op import OpRun
+from ._op_helper import _to_str_array
 
 
 class OneHotEncoder(OpRun):
@@ -13,6 +15,9 @@ class OneHotEncoder(OpRun):
     :epkg:`ONNX` specifications does not mention
     the possibility to change the output type,
     sparse, dense, float, double.
+    The runtime produces a dense array unless
+    method @see me enable_sparse_output was called,
+    see parameter *sparse_one_hot* of @see cl OnnxInference.
     """
 
     atts = {'cats_int64s': numpy.empty(0, dtype=numpy.int64),
@@ -25,34 +30,57 @@ class OneHotEncoder(OpRun):
                        expected_attributes=OneHotEncoder.atts,
                        **options)
         if len(self.cats_int64s) > 0:
-            self.classes_ = {v: i for i, v in enumerate(self.cats_int64s)}
+            cats = numpy.array(self.cats_int64s, dtype=numpy.int64)
         elif len(self.cats_strings) > 0:
-            self.classes_ = {v: i for i, v in enumerate(self.cats_strings)}
+            cats = _to_str_array(self.cats_strings)
         else:
             raise RuntimeError("No encoding was defined.")
+        # categories are sorted once, a batch is then mapped to
+        # column indices with numpy.searchsorted
+        self.order_ = numpy.argsort(cats, kind='mergesort')
+        self.cats_sorted_ = cats[self.order_]
+        self.sparse_output_ = False
+
+    def enable_sparse_output(self, enable=True):
+        """
+        Returns a :epkg:`scipy` *csr_matrix* instead of a dense
+        array when the input has one column, the output of
+        a feature with thousands of categories then only stores
+        one value per row. Every consumer of the output must
+        accept sparse inputs, @see cl OnnxInference calls this
+        method only in that case (*sparse_one_hot=True*).
+
+        @param      enable      enable or disable
+        """
+        self.sparse_output_ = enable
 
     def _run(self, x):  # pylint: disable=W0221
         shape = x.shape[:-1] if x.shape[-1] == 1 else x.shape
-        x = x.reshape(shape)
-        new_shape = shape + (len(self.classes_), )
-        res = numpy.zeros(new_shape, dtype=numpy.float32)
-        if len(x.shape) == 1:
-            for i, v in enumerate(x):
-                j = self.classes_.get(v, -1)
-                if j >= 0:
-                    res[i, j] = 1.
-        elif len(x.shape) == 2:
-            for a, row in enumerate(x):
-                for i, v in enumerate(row):
-                    j = self.classes_.get(v, -1)
-                    if j >= 0:
-                        res[a, i, j] = 1.
-        else:
+        if len(shape) > 2:
             raise RuntimeError(
                 "This operator is not implemented for shape {}.".format(x.shape))
-        if self.zeros:
-            red = res.sum(axis=len(res.shape) - 1)
-            if numpy.min(red) == 0:
-                raise RuntimeError(
-                    "One observation did not have any category defined.")
-        return (res, )
+        x = x.reshape(shape).ravel()
+        cats = self.cats_sorted_
+        if cats.dtype.kind == 'U':
+            x = _to_str_array(x)
+
+        index = numpy.searchsorted(cats, x)
+        index[index == cats.shape[0]] = 0
+        found = cats[index] == x
+        if not self.zeros and not found.all():
+            raise RuntimeError(
+                "One observation did not have any category defined.")
+        columns = self.order_[index[found]]
+
+        n_cats = cats.shape[0]
+        if self.sparse_output_ and len(shape) == 1:
+            indptr = numpy.zeros(x.shape[0] + 1, dtype=numpy.int64)
+            numpy.cumsum(found, out=indptr[1:])
+            res = csr_matrix(
+                (numpy.ones(columns.shape[0], dtype=numpy.float32),
+                 columns, indptr), shape=(x.shape[0], n_cats))
+            return (res, )
+
+        res = numpy.zeros((x.shape[0], n_cats), dtype=numpy.float32)
+        res[numpy.arange(x.shape[0])[found], columns] = 1.
+        return (res.reshape(shape + (n_cats, )), )
@@ -15,4 +15,4 @@ class Relu(OpRunUnaryNum):
                                **options)
 
     def _run(self, x):  # pylint: disable=W0221
-        return (numpy.maximum(x, 0), )
+        return (numpy.maximum(x, 0, out=self._get_buffer_like(x)), )
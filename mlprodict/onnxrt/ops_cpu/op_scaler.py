@@ -4,6 +4,7 @@
 @file
 @brief Runtime operator.
 """
+import numpy
 from ._op import OpRunUnaryNum
 
 
@@ -17,4 +18,6 @@ class Scaler(OpRunUnaryNum):
                                **options)
 
     def _run(self, x):  # pylint: disable=W0221
-        return ((x - self.offset) * self.scale, )
+        res = numpy.subtract(
+            x, self.offset, out=self._get_buffer_like(x, self.offset))
+        return (numpy.multiply(res, self.scale, out=res), )
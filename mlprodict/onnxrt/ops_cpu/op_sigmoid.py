@@ -15,5 +15,5 @@ class Sigmoid(OpRunUnaryNum):
                                **options)
 
     def _run(self, x):  # pylint: disable=W0221
-        y = logistic_sigmoid(x)
+        y = logistic_sigmoid(x, out=self._get_buffer_like(x))
         return (y, )
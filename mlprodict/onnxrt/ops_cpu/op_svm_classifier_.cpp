@@ -26,26 +26,28 @@ namespace py = pybind11;
 #include "op_common_.hpp"
 
 
+template<typename NTYPE>
 class RuntimeSVMClassifier
 {
     public:
         
         KERNEL kernel_type_;
-        float gamma_;
-        float coef0_;
-        float degree_;
+        NTYPE gamma_;
+        NTYPE coef0_;
+        NTYPE degree_;
 
         // svm_classifier.h
         int64_t feature_count_;
         int64_t vector_count_;
-        std::vector<float> rho_;
-        std::vector<float> coefficients_;
-        std::vector<float> support_vectors_;
+        std::vector<NTYPE> rho_;
+        std::vector<NTYPE> coefficients_;
+        std::vector<NTYPE> support_vectors_;
+        std::vector<NTYPE> vectors_t_;  // support vectors or coefficients, feature by feature
         POST_EVAL_TRANSFORM post_transform_;
         SVM_TYPE mode_;  //how are we computing SVM? 0=LibSVC, 1=LibLinear
     
-        std::vector<float> proba_;
-        std::vector<float> probb_;
+        std::vector<NTYPE> proba_;
+        std::vector<NTYPE> probb_;
         bool weights_are_all_positive_;
         std::vector<int64_t> classlabels_ints_;
         // std::vector<std::string> classlabels_strings_;
@@ -53,7 +55,8 @@ class RuntimeSVMClassifier
         int64_t class_count_;
         std::vector<int64_t> vectors_per_class_;
         std::vector<int64_t> starting_vector_;
-        
+        ParallelSettings parallel_;
+    
     public:
         
         RuntimeSVMClassifier();
@@ -62,56 +65,62 @@ class RuntimeSVMClassifier
         void init(
             py::array_t<int64_t> classlabels_int64s,
             const std::vector<std::string>& classlabels_strings,
-            py::array_t<float> coefficients,
-            py::array_t<float> kernel_params,
+            py::array_t<NTYPE> coefficients,
+            py::array_t<NTYPE> kernel_params,
             const std::string& kernel_type,
             const std::string& post_transform,
-            py::array_t<float> prob_a,
-            py::array_t<float> prob_b,
-            py::array_t<float> rho,
-            py::array_t<float> support_vectors,
+            py::array_t<NTYPE> prob_a,
+            py::array_t<NTYPE> prob_b,
+            py::array_t<NTYPE> rho,
+            py::array_t<NTYPE> support_vectors,
             py::array_t<int64_t> vectors_per_class
         );
         
-        py::tuple compute(py::array_t<float> X) const;
+        py::tuple compute(py::array_t<NTYPE> X) const;
     
         std::string runtime_options();
 
         int omp_get_max_threads();
 
+        void set_num_threads(int64_t n_threads);
+
+        void set_schedule(const std::string& kind, int64_t chunk_size);
+
+        void set_parallel_threshold(int64_t n_rows);
+
 private:
 
         void Initialize();
 
-        template<typename T>
-        float kernel_dot_gil_free(
-                const T* A, int64_t a, const std::vector<float>& B,
-                int64_t b, int64_t len, KERNEL k) const;
-    
         void compute_gil_free(const std::vector<int64_t>& x_dims, int64_t N, int64_t stride,
-                              const py::array_t<float>& X, py::array_t<int64_t>& Y,
-                              py::array_t<float>& Z, int64_t nb_columns) const;
+                              const py::array_t<NTYPE>& X, py::array_t<int64_t>& Y,
+                              py::array_t<NTYPE>& Z, int64_t nb_columns) const;
 };
 
 
-RuntimeSVMClassifier::RuntimeSVMClassifier() {
+template<typename NTYPE>
+RuntimeSVMClassifier<NTYPE>::RuntimeSVMClassifier() {
 }
 
 
-RuntimeSVMClassifier::~RuntimeSVMClassifier() {
+template<typename NTYPE>
+RuntimeSVMClassifier<NTYPE>::~RuntimeSVMClassifier() {
 }
 
 
-std::string RuntimeSVMClassifier::runtime_options() {
+template<typename NTYPE>
+std::string RuntimeSVMClassifier<NTYPE>::runtime_options() {
     std::string res;
 #ifdef USE_OPENMP
     res += "OPENMP";
 #endif
+    res += parallel_.to_string();
     return res;
 }
 
 
-int RuntimeSVMClassifier::omp_get_max_threads() {
+template<typename NTYPE>
+int RuntimeSVMClassifier<NTYPE>::omp_get_max_threads() {
 #if USE_OPENMP
     return ::omp_get_max_threads();
 #else
@@ -120,27 +129,46 @@ int RuntimeSVMClassifier::omp_get_max_threads() {
 }
 
 
-void RuntimeSVMClassifier::init(
+template<typename NTYPE>
+void RuntimeSVMClassifier<NTYPE>::set_num_threads(int64_t n_threads) {
+    parallel_.set_num_threads(n_threads);
+}
+
+
+template<typename NTYPE>
+void RuntimeSVMClassifier<NTYPE>::set_schedule(const std::string& kind, int64_t chunk_size) {
+    parallel_.set_schedule(kind, chunk_size);
+}
+
+
+template<typename NTYPE>
+void RuntimeSVMClassifier<NTYPE>::set_parallel_threshold(int64_t n_rows) {
+    parallel_.set_threshold(n_rows);
+}
+
+
+template<typename NTYPE>
+void RuntimeSVMClassifier<NTYPE>::init(
             py::array_t<int64_t> classlabels_int64s,
             const std::vector<std::string>& classlabels_strings,
-            py::array_t<float> coefficients,
-            py::array_t<float> kernel_params,
+            py::array_t<NTYPE> coefficients,
+            py::array_t<NTYPE> kernel_params,
             const std::string& kernel_type,
             const std::string& post_transform,
-            py::array_t<float> prob_a,
-            py::array_t<float> prob_b,
-            py::array_t<float> rho,
-            py::array_t<float> support_vectors,
+            py::array_t<NTYPE> prob_a,
+            py::array_t<NTYPE> prob_b,
+            py::array_t<NTYPE> rho,
+            py::array_t<NTYPE> support_vectors,
             py::array_t<int64_t> vectors_per_class
     ) {
     kernel_type_ = to_KERNEL(kernel_type);
-    array2vector(support_vectors_, support_vectors, float);
+    array2vector(support_vectors_, support_vectors, NTYPE);
     post_transform_ = to_POST_EVAL_TRANSFORM(post_transform);
-    array2vector(rho_, rho, float);
-    array2vector(coefficients_, coefficients, float);
+    array2vector(rho_, rho, NTYPE);
+    array2vector(coefficients_, coefficients, NTYPE);
         
-    std::vector<float> kernel_params_local;
-    array2vector(kernel_params_local, kernel_params, float);
+    std::vector<NTYPE> kernel_params_local;
+    array2vector(kernel_params_local, kernel_params, NTYPE);
 
     if (!kernel_params_local.empty()) {
       gamma_ = kernel_params_local[0];
@@ -148,13 +176,13 @@ void RuntimeSVMClassifier::init(
       degree_ = kernel_params_local[2];
     }
     else {
-      gamma_ = 0.f;
-      coef0_ = 0.f;
-      degree_ = 0.f;
+      gamma_ = 0;
+      coef0_ = 0;
+      degree_ = 0;
     }
 
-    array2vector(proba_, prob_a, float);
-    array2vector(probb_, prob_b, float);
+    array2vector(proba_, prob_a, NTYPE);
+    array2vector(probb_, prob_b, NTYPE);
     array2vector(vectors_per_class_, vectors_per_class, int64_t);
     if (classlabels_strings.size() > 0)
         throw std::runtime_error("This runtime only handles integers.");
@@ -165,7 +193,8 @@ void RuntimeSVMClassifier::init(
 }
 
 
-void RuntimeSVMClassifier::Initialize() {
+template<typename NTYPE>
+void RuntimeSVMClassifier<NTYPE>::Initialize() {
   vector_count_ = 0;
   feature_count_ = 0;
   class_count_ = 0;
@@ -193,13 +222,19 @@ void RuntimeSVMClassifier::Initialize() {
       weights_are_all_positive_ = false;
       break;
     }
-  }  
+  }
+  // kernels are computed as a product between rows and vectors
+  if (mode_ == SVM_TYPE::SVM_SVC)
+    transpose_vectors(support_vectors_, vector_count_, feature_count_, vectors_t_);
+  else
+    transpose_vectors(coefficients_, class_count_, feature_count_, vectors_t_);
 }
 
 
-int _set_score_svm(int64_t* output_data, float max_weight, const int64_t maxclass,
+template<typename NTYPE>
+int _set_score_svm(int64_t* output_data, NTYPE max_weight, const int64_t maxclass,
                    const int64_t n, POST_EVAL_TRANSFORM post_transform_,
-                   const std::vector<float>& proba_, bool weights_are_all_positive_,
+                   const std::vector<NTYPE>& proba_, bool weights_are_all_positive_,
                    const std::vector<int64_t>& classlabels, int64_t posclass,
                    int64_t negclass) {
   int write_additional_scores = -1;
@@ -224,7 +259,8 @@ int _set_score_svm(int64_t* output_data, float max_weight, const int64_t maxclas
 }
 
 
-py::tuple RuntimeSVMClassifier::compute(py::array_t<float> X) const {
+template<typename NTYPE>
+py::tuple RuntimeSVMClassifier<NTYPE>::compute(py::array_t<NTYPE> X) const {
     // const Tensor& X = *context->Input<Tensor>(0);
     // const TensorShape& x_shape = X.Shape();    
     std::vector<int64_t> x_dims;
@@ -246,7 +282,7 @@ py::tuple RuntimeSVMClassifier::compute(py::array_t<float> X) const {
     std::vector<int64_t> dims{N, nb_columns};    
                         
     py::array_t<int64_t> Y(N); // one target only
-    py::array_t<float> Z(N * nb_columns); // one target only
+    py::array_t<NTYPE> Z(N * nb_columns); // one target only
     {
         py::gil_scoped_release release;
         compute_gil_free(x_dims, N, stride, X, Y, Z, nb_columns);
@@ -254,52 +290,21 @@ py::tuple RuntimeSVMClassifier::compute(py::array_t<float> X) const {
     return py::make_tuple(Y, Z);
 }
 
-template<typename T>
-float RuntimeSVMClassifier::kernel_dot_gil_free(
-        const T* A, int64_t a,
-        const std::vector<float>& B, int64_t b,
-        int64_t len, KERNEL k) const {
-    double sum = 0;
-    const T* pA = A + a;
-    const float* pB = B.data() + b;
-    if (k == KERNEL::POLY) {
-      for (int64_t i = len; i > 0; --i, ++pA, ++pB)
-        sum += *pA * *pB;
-      sum = gamma_ * sum + coef0_;
-      sum = std::pow(sum, degree_);
-    } else if (k == KERNEL::SIGMOID) {
-      for (int64_t i = len; i > 0; --i, ++pA, ++pB)
-        sum += *pA * *pB;
-      sum = gamma_ * sum + coef0_;
-      sum = std::tanh(sum);
-    } else if (k == KERNEL::RBF) {
-      for (int64_t i = len; i > 0; --i, ++pA, ++pB) {
-        double val = *pA - *pB;
-        sum += val * val;
-      }
-      sum = std::exp(-gamma_ * sum);
-    } else if (k == KERNEL::LINEAR) {
-      for (int64_t i = len; i > 0; --i, ++pA, ++pB)
-        sum += *pA * *pB;
-    }
-    return (float)sum;
-}
-
-
-void multiclass_probability(int64_t classcount, const std::vector<float>& r,
-                            std::vector<float>& p) {
+template<typename NTYPE>
+void multiclass_probability(int64_t classcount, const std::vector<NTYPE>& r,
+                            std::vector<NTYPE>& p) {
   int64_t sized2 = classcount * classcount;
-  std::vector<float> Q;
-  std::vector<float> Qp;
+  std::vector<NTYPE> Q;
+  std::vector<NTYPE> Qp;
   for (int64_t k = 0; k < sized2; k++) {
     Q.push_back(0);
   }
   for (int64_t k = 0; k < classcount; k++) {
     Qp.push_back(0);
   }
-  float eps = 0.005f / static_cast<float>(classcount);
+  NTYPE eps = (NTYPE)0.005 / static_cast<NTYPE>(classcount);
   for (int64_t i = 0; i < classcount; i++) {
-    p[i] = 1.0f / static_cast<float>(classcount);  // Valid if k = 1
+    p[i] = (NTYPE)1 / static_cast<NTYPE>(classcount);  // Valid if k = 1
     for (int64_t j = 0; j < i; j++) {
       Q[i * classcount + i] += r[j * classcount + i] * r[j * classcount + i];
       Q[i * classcount + j] = Q[j * classcount + i];
@@ -311,7 +316,7 @@ void multiclass_probability(int64_t classcount, const std::vector<float>& r,
   }
   for (int64_t loop = 0; loop < 100; loop++) {
     // stopping condition, recalculate QP,pQP for numerical accuracy
-    float pQp = 0;
+    NTYPE pQp = 0;
     for (int64_t i = 0; i < classcount; i++) {
       Qp[i] = 0;
       for (int64_t j = 0; j < classcount; j++) {
@@ -319,9 +324,9 @@ void multiclass_probability(int64_t classcount, const std::vector<float>& r,
       }
       pQp += p[i] * Qp[i];
     }
-    float max_error = 0;
+    NTYPE max_error = 0;
     for (int64_t i = 0; i < classcount; i++) {
-      float error = std::fabs(Qp[i] - pQp);
+      NTYPE error = std::fabs(Qp[i] - pQp);
       if (error > max_error) {
         max_error = error;
       }
@@ -330,7 +335,7 @@ void multiclass_probability(int64_t classcount, const std::vector<float>& r,
       break;
 
     for (int64_t i = 0; i < classcount; i++) {
-      float diff = (-Qp[i] + pQp) / Q[i * classcount + i];
+      NTYPE diff = (-Qp[i] + pQp) / Q[i * classcount + i];
       p[i] += diff;
       pQp = (pQp + diff * (diff * Q[i * classcount + i] + 2 * Qp[i])) / (1 + diff) / (1 + diff);
       for (int64_t j = 0; j < classcount; j++) {
@@ -342,129 +347,162 @@ void multiclass_probability(int64_t classcount, const std::vector<float>& r,
 }
 
 
-void RuntimeSVMClassifier::compute_gil_free(
+template<typename NTYPE>
+void RuntimeSVMClassifier<NTYPE>::compute_gil_free(
                 const std::vector<int64_t>& x_dims, int64_t N, int64_t stride,
-                const py::array_t<float>& X,
-                py::array_t<int64_t>& Y, py::array_t<float>& Z,
+                const py::array_t<NTYPE>& X,
+                py::array_t<int64_t>& Y, py::array_t<NTYPE>& Z,
                 int64_t nb_columns) const {
   auto Y_ = Y.mutable_unchecked<1>();          
-  auto Z_ = Z.mutable_unchecked<1>();          
-  const float* x_data = X.data(0);
+  auto Z_ = Z.template mutable_unchecked<1>();          
+  const NTYPE* x_data = X.data(0);
   int64_t* y_data = (int64_t*)Y_.data(0);
-  float* z_data = (float*)Z_.data(0);
+  NTYPE* z_data = (NTYPE*)Z_.data(0);
 
-  int64_t zindex = 0; 
-  for (int64_t n = 0; n < N; n++)  //for each example
+  if (mode_ == SVM_TYPE::SVM_SVC && vector_count_ == 0)
+    throw std::runtime_error("No support vectors.");
+  // linear mode: one vector of coefficients per class
+  int64_t n_vectors = mode_ == SVM_TYPE::SVM_SVC ? vector_count_ : class_count_;
+
+  int64_t n_threads = parallel_.num_threads(N);
+  parallel_.apply_schedule();
+  int64_t block = choose_kernel_block_size(N, n_threads, n_vectors);
+  int64_t n_blocks = (N + block - 1) / block;
+
+#ifdef USE_OPENMP
+#pragma omp parallel num_threads(n_threads) if(n_threads > 1)
+#endif
   {
-    int64_t current_weight_0 = n * stride;
-    int64_t maxclass = -1;
-    std::vector<float> decisions;
-    std::vector<float> scores;
-    std::vector<float> kernels;
+    // buffers allocated once per thread
+    std::vector<NTYPE> kernels(block * n_vectors);
+    std::vector<NTYPE> scores;
     std::vector<int64_t> votes;
+    std::vector<NTYPE> probsp2;
+    std::vector<NTYPE> estimates;
+    scores.reserve(nb_columns + 1);
 
-    if (vector_count_ == 0 && mode_ == SVM_TYPE::SVM_LINEAR) {
-      for (int64_t j = 0; j < class_count_; j++) {  //for each class
-        auto val = kernel_dot_gil_free(x_data, current_weight_0, coefficients_,
-                                       feature_count_ * j,
-                                       feature_count_, kernel_type_);
-        val += rho_[0];
-        scores.push_back(val);
-      }
-    } else {
-      if (vector_count_ == 0)
-        throw std::runtime_error("No support vectors.");
-      int evals = 0;
-
-      for (int64_t j = 0; j < vector_count_; j++) {
-        auto val = kernel_dot_gil_free(x_data, current_weight_0, support_vectors_,
-                                       feature_count_ * j,
-                                       feature_count_, kernel_type_);
-        kernels.push_back(val);
-      }
-      votes.resize(class_count_, 0);
-      for (int64_t i = 0; i < class_count_; i++) {        // for each class
-        for (int64_t j = i + 1; j < class_count_; j++) {  // for each class
-          double sum = 0;
-          int64_t start_index_i = starting_vector_[i];  // *feature_count_;
-          int64_t start_index_j = starting_vector_[j];  // *feature_count_;
-
-          int64_t class_i_support_count = vectors_per_class_[i];
-          int64_t class_j_support_count = vectors_per_class_[j];
-
-          int64_t pos1 = (vector_count_) * (j - 1);
-          int64_t pos2 = (vector_count_) * (i);
-          const float* val1 = &(coefficients_[pos1 + start_index_i]);
-          const float* val2 = &(kernels[start_index_i]);
-          for (int64_t m = 0; m < class_i_support_count; ++m, ++val1, ++val2)
-            sum += *val1 * *val2;
-
-          val1 = &(coefficients_[pos2 + start_index_j]);
-          val2 = &(kernels[start_index_j]);
-          for (int64_t m = 0; m < class_j_support_count; ++m, ++val1, ++val2)
-            sum += *val1 * *val2;
-
-          sum += rho_[evals];
-          scores.push_back((float)sum);
-          ++(votes[sum > 0 ? i : j]);
-          ++evals;  //index into rho
+#ifdef USE_OPENMP
+#pragma omp for schedule(runtime)
+#endif
+    for (int64_t b = 0; b < n_blocks; ++b) {
+      int64_t first = b * block;
+      int64_t last = first + block < N ? first + block : N;
+      // kernels between the block of rows and every vector
+      compute_kernel_block(x_data + first * stride, last - first, stride,
+                           vectors_t_.data(), n_vectors, feature_count_,
+                           kernel_type_, gamma_, coef0_, degree_, kernels.data());
+
+      for (int64_t n = first; n < last; n++)  //for each example
+      {
+        const NTYPE* row_kernels = kernels.data() + (n - first) * n_vectors;
+        int64_t maxclass = -1;
+        scores.clear();
+        votes.clear();
+
+        if (mode_ == SVM_TYPE::SVM_LINEAR) {
+          for (int64_t j = 0; j < class_count_; j++)  //for each class
+            scores.push_back(row_kernels[j] + rho_[0]);
+        } else {
+          int evals = 0;
+          votes.resize(class_count_, 0);
+          for (int64_t i = 0; i < class_count_; i++) {        // for each class
+            for (int64_t j = i + 1; j < class_count_; j++) {  // for each class
+              double sum = 0;
+              int64_t start_index_i = starting_vector_[i];  // *feature_count_;
+              int64_t start_index_j = starting_vector_[j];  // *feature_count_;
+
+              int64_t class_i_support_count = vectors_per_class_[i];
+              int64_t class_j_support_count = vectors_per_class_[j];
+
+              int64_t pos1 = (vector_count_) * (j - 1);
+              int64_t pos2 = (vector_count_) * (i);
+              const NTYPE* val1 = &(coefficients_[pos1 + start_index_i]);
+              const NTYPE* val2 = row_kernels + start_index_i;
+              for (int64_t m = 0; m < class_i_support_count; ++m, ++val1, ++val2)
+                sum += *val1 * *val2;
+
+              val1 = &(coefficients_[pos2 + start_index_j]);
+              val2 = row_kernels + start_index_j;
+              for (int64_t m = 0; m < class_j_support_count; ++m, ++val1, ++val2)
+                sum += *val1 * *val2;
+
+              sum += rho_[evals];
+              scores.push_back((NTYPE)sum);
+              ++(votes[sum > 0 ? i : j]);
+              ++evals;  //index into rho
+            }
+          }
         }
-      }
-    }
 
-    if (proba_.size() > 0 && mode_ == SVM_TYPE::SVM_SVC) {
-      //compute probabilities from the scores
-      int64_t num = class_count_ * class_count_;
-      std::vector<float> probsp2(num, 0.f);
-      std::vector<float> estimates(class_count_, 0.f);
-      int64_t index = 0;
-      for (int64_t i = 0; i < class_count_; ++i) {
-        int64_t p1 = i * class_count_ + i + 1;
-        int64_t p2 = (i + 1) * class_count_ + i;
-        for (int64_t j = i + 1; j < class_count_; ++j, ++index) {
-          float val1 = sigmoid_probability(scores[index], proba_[index], probb_[index]);
-          float val2 = std::max(val1, 1.0e-7f);
-          val2 = std::min(val2, 1 - 1.0e-7f);
-          probsp2[p1] = val2;
-          probsp2[p2] = 1 - val2;
-          ++p1;
-          p2 += class_count_;
+        if (proba_.size() > 0 && mode_ == SVM_TYPE::SVM_SVC) {
+          //compute probabilities from the scores
+          int64_t num = class_count_ * class_count_;
+          probsp2.assign(num, 0);
+          estimates.assign(class_count_, 0);
+          int64_t index = 0;
+          for (int64_t i = 0; i < class_count_; ++i) {
+            int64_t p1 = i * class_count_ + i + 1;
+            int64_t p2 = (i + 1) * class_count_ + i;
+            for (int64_t j = i + 1; j < class_count_; ++j, ++index) {
+              NTYPE val1 = sigmoid_probability(scores[index], proba_[index], probb_[index]);
+              NTYPE val2 = std::max(val1, (NTYPE)1.0e-7);
+              val2 = std::min(val2, 1 - (NTYPE)1.0e-7);
+              probsp2[p1] = val2;
+              probsp2[p2] = 1 - val2;
+              ++p1;
+              p2 += class_count_;
+            }
+          }
+          multiclass_probability(class_count_, probsp2, estimates);
+          // copy probabilities back into scores
+          scores.resize(estimates.size());
+          std::copy(estimates.begin(), estimates.end(), scores.begin());
         }
-      }
-      multiclass_probability(class_count_, probsp2, estimates);
-      // copy probabilities back into scores
-      scores.resize(estimates.size());
-      std::copy(estimates.begin(), estimates.end(), scores.begin());
-    }
 
-    float max_weight = 0;
-    if (votes.size() > 0) {
-      auto it_maxvotes = std::max_element(votes.begin(), votes.end());
-      maxclass = std::distance(votes.begin(), it_maxvotes);
-    } else {
-      auto it_max_weight = std::max_element(scores.begin(), scores.end());
-      maxclass = std::distance(scores.begin(), it_max_weight);
-      max_weight = *it_max_weight;
-    }
+        NTYPE max_weight = 0;
+        if (votes.size() > 0) {
+          auto it_maxvotes = std::max_element(votes.begin(), votes.end());
+          maxclass = std::distance(votes.begin(), it_maxvotes);
+        } else {
+          auto it_max_weight = std::max_element(scores.begin(), scores.end());
+          maxclass = std::distance(scores.begin(), it_max_weight);
+          max_weight = *it_max_weight;
+        }
 
-    // write top class
-    // onnx specs expects one column per class.
-    int write_additional_scores = -1;
-    if (rho_.size() == 1) {
-      write_additional_scores = _set_score_svm(
-          y_data, max_weight, maxclass, n, post_transform_, proba_,
-          weights_are_all_positive_, classlabels_ints_, 1, 0);
-    } else if (classlabels_ints_.size() > 0) {  //multiclass
-        y_data[n] = classlabels_ints_[maxclass];
-    } else {
-        y_data[n] = maxclass;
-    }
+        // write top class
+        // onnx specs expects one column per class.
+        int write_additional_scores = -1;
+        if (rho_.size() == 1) {
+          write_additional_scores = _set_score_svm(
+              y_data, max_weight, maxclass, n, post_transform_, proba_,
+              weights_are_all_positive_, classlabels_ints_, 1, 0);
+        } else if (classlabels_ints_.size() > 0) {  //multiclass
+            y_data[n] = classlabels_ints_[maxclass];
+        } else {
+            y_data[n] = maxclass;
+        }
 
-    write_scores(scores, post_transform_, z_data + zindex, write_additional_scores);
-    zindex += scores.size();
+        // every row writes nb_columns scores
+        write_scores(scores, post_transform_, z_data + n * nb_columns, write_additional_scores);
+      }
+    }
   }
 }
 
+class RuntimeSVMClassifierFloat : public RuntimeSVMClassifier<float>
+{
+    public:
+        RuntimeSVMClassifierFloat() : RuntimeSVMClassifier<float>() {}
+};
+
+
+class RuntimeSVMClassifierDouble : public RuntimeSVMClassifier<double>
+{
+    public:
+        RuntimeSVMClassifierDouble() : RuntimeSVMClassifier<double>() {}
+};
+
+
 #ifndef SKIP_PYTHON
 
 PYBIND11_MODULE(op_svm_classifier_, m) {
@@ -478,20 +516,55 @@ in :epkg:`onnxruntime`.)pbdoc"
     #endif
     ;
 
-    py::class_<RuntimeSVMClassifier> cl (m, "RuntimeSVMClassifier",
-        R"pbdoc(Implements runtime for operator SVMClassifier. The code is inspired from
+    py::class_<RuntimeSVMClassifierFloat> clf (m, "RuntimeSVMClassifierFloat",
+        R"pbdoc(Implements float runtime for operator SVMClassifier. The code is inspired from
+`svm_classifier.cc <https://github.com/microsoft/onnxruntime/blob/master/onnxruntime/core/providers/cpu/ml/svm_classifier.cc>`_
+in :epkg:`onnxruntime`.)pbdoc");
+
+    clf.def(py::init<>());
+    clf.def("init", &RuntimeSVMClassifierFloat::init,
+            "Initializes the runtime with the ONNX attributes in alphabetical order.");
+    clf.def("compute", &RuntimeSVMClassifierFloat::compute,
+            "Computes the predictions for the SVM classifier.");
+    clf.def("runtime_options", &RuntimeSVMClassifierFloat::runtime_options,
+            "Returns indications about how the runtime was compiled.");
+    clf.def("omp_get_max_threads", &RuntimeSVMClassifierFloat::omp_get_max_threads,
+            "Returns omp_get_max_threads from openmp library.");
+    clf.def("set_num_threads", &RuntimeSVMClassifierFloat::set_num_threads, py::arg("n_threads"),
+            "Sets the number of threads used by this instance, 0 for the default "
+            "number of threads of the openmp library.");
+    clf.def("set_schedule", &RuntimeSVMClassifierFloat::set_schedule, py::arg("kind"), py::arg("chunk_size") = 0,
+            "Sets how rows are distributed across threads, *kind* is ``'static'`` "
+            "or ``'dynamic'``, *chunk_size* is the number of blocks of rows a thread "
+            "takes at once, 0 for the default.");
+    clf.def("set_parallel_threshold", &RuntimeSVMClassifierFloat::set_parallel_threshold, py::arg("n_rows"),
+            "A batch with less than *n_rows* rows is computed by the calling thread "
+            "without opening a parallel region.");
+
+    py::class_<RuntimeSVMClassifierDouble> cld (m, "RuntimeSVMClassifierDouble",
+        R"pbdoc(Implements double runtime for operator SVMClassifier. The code is inspired from
 `svm_classifier.cc <https://github.com/microsoft/onnxruntime/blob/master/onnxruntime/core/providers/cpu/ml/svm_classifier.cc>`_
 in :epkg:`onnxruntime`.)pbdoc");
 
-    cl.def(py::init<>());
-    cl.def("init", &RuntimeSVMClassifier::init,
-           "Initializes the runtime with the ONNX attributes in alphabetical order.");
-    cl.def("compute", &RuntimeSVMClassifier::compute,
-           "Computes the predictions for the SVM classifier.");
-    cl.def("runtime_options", &RuntimeSVMClassifier::runtime_options,
-           "Returns indications about how the runtime was compiled.");
-    cl.def("omp_get_max_threads", &RuntimeSVMClassifier::omp_get_max_threads,
-           "Returns omp_get_max_threads from openmp library.");
+    cld.def(py::init<>());
+    cld.def("init", &RuntimeSVMClassifierDouble::init,
+            "Initializes the runtime with the ONNX attributes in alphabetical order.");
+    cld.def("compute", &RuntimeSVMClassifierDouble::compute,
+            "Computes the predictions for the SVM classifier.");
+    cld.def("runtime_options", &RuntimeSVMClassifierDouble::runtime_options,
+            "Returns indications about how the runtime was compiled.");
+    cld.def("omp_get_max_threads", &RuntimeSVMClassifierDouble::omp_get_max_threads,
+            "Returns omp_get_max_threads from openmp library.");
+    cld.def("set_num_threads", &RuntimeSVMClassifierDouble::set_num_threads, py::arg("n_threads"),
+            "Sets the number of threads used by this instance, 0 for the default "
+            "number of threads of the openmp library.");
+    cld.def("set_schedule", &RuntimeSVMClassifierDouble::set_schedule, py::arg("kind"), py::arg("chunk_size") = 0,
+            "Sets how rows are distributed across threads, *kind* is ``'static'`` "
+            "or ``'dynamic'``, *chunk_size* is the number of blocks of rows a thread "
+            "takes at once, 0 for the default.");
+    cld.def("set_parallel_threshold", &RuntimeSVMClassifierDouble::set_parallel_threshold, py::arg("n_rows"),
+            "A batch with less than *n_rows* rows is computed by the calling thread "
+            "without opening a parallel region.");
 }
 
 #endif
@@ -7,37 +7,66 @@
 from collections import OrderedDict
 import numpy
 from ._op_helper import _get_typed_class_attribute
-from ._op import OpRunUnaryNum
-from .op_svm_regressor_ import RuntimeSVMRegressor  # pylint: disable=E0611
+from ._op import OpRunUnaryNum, RuntimeTypeError
+from ._new_ops import OperatorSchema
+from .op_svm_regressor_ import (  # pylint: disable=E0611
+    RuntimeSVMRegressorFloat,
+    RuntimeSVMRegressorDouble,
+)
 
 
-class SVMRegressor(OpRunUnaryNum):
+class SVMRegressorCommon(OpRunUnaryNum):
 
-    atts = OrderedDict([
-        ('coefficients', numpy.empty(0, dtype=numpy.float32)),
-        ('kernel_params', numpy.empty(0, dtype=numpy.float32)),
-        ('kernel_type', b'NONE'),
-        ('n_supports', 0),
-        ('one_class', 0),
-        ('post_transform', b'NONE'),
-        ('rho', numpy.empty(0, dtype=numpy.float32)),
-        ('support_vectors', numpy.empty(0, dtype=numpy.float32)),
-    ])
-
-    def __init__(self, onnx_node, desc=None, **options):
+    def __init__(self, dtype, onnx_node, desc=None,
+                 expected_attributes=None, **options):
         OpRunUnaryNum.__init__(self, onnx_node, desc=desc,
-                               expected_attributes=SVMRegressor.atts,
+                               expected_attributes=expected_attributes,
                                **options)
-        self._init()
+        self._init(dtype=dtype)
 
-    def _get_typed_attributes(self, k):
-        return _get_typed_class_attribute(self, k, SVMRegressor.atts)
+    def _get_typed_attributes(self, k, atts):
+        return _get_typed_class_attribute(self, k, atts)
 
-    def _init(self):
-        self.rt_ = RuntimeSVMRegressor()
-        atts = [self._get_typed_attributes(k)
-                for k in SVMRegressor.atts]
-        self.rt_.init(*atts)
+    def _find_custom_operator_schema(self, op_name):
+        """
+        Finds a custom operator defined by this runtime.
+        """
+        if op_name == "SVMRegressorDouble":
+            return SVMRegressorDoubleSchema()
+        raise RuntimeError(
+            "Unable to find a schema for operator '{}'.".format(op_name))
+
+    def _init(self, dtype):
+        if dtype == numpy.float32:
+            self.rt_ = RuntimeSVMRegressorFloat()
+            atts = SVMRegressor.atts
+        elif dtype == numpy.float64:
+            self.rt_ = RuntimeSVMRegressorDouble()
+            atts = SVMRegressorDouble.atts
+        else:
+            raise RuntimeTypeError("Unsupported dtype={}.".format(dtype))
+        self._dtype = dtype
+        self.rt_.init(*[self._get_typed_attributes(k, atts) for k in atts])
+        if getattr(self, 'runtime_options_', None):
+            self.set_runtime_options(self.runtime_options_)
+
+    def switch_initializers_dtype(self, dtype_in=numpy.float32,
+                                  dtype_out=numpy.float64):
+        """
+        Switches all initializers to ``numpy.float64``
+        and replaces the runtime by the runtime
+        of @see cl SVMRegressorDouble.
+
+        @param      dtype_in    previous type
+        @param      dtype_out   next type
+        @return                 done operations
+        """
+        done = OpRunUnaryNum.switch_initializers_dtype(
+            self, dtype_in=dtype_in, dtype_out=dtype_out)
+        if self._dtype == dtype_in and dtype_out == numpy.float64:
+            self._init(dtype=dtype_out)
+            done.append(("+", "rt_", type(self.rt_).__name__))
+        return done
 
     def _run(self, x):  # pylint: disable=W0221
         """
@@ -45,10 +74,63 @@ class SVMRegressor(OpRunUnaryNum):
         :epkg:`onnxruntime`.
         `svm_regressor.cc
         <https://github.com/microsoft/onnxruntime/blob/master/onnxruntime/core/providers/cpu/ml/svm_regressor.cc>`_.
-        See class :class:`RuntimeSVMRegressor
-        <mlprodict.onnxrt.ops_cpu.op_svm_regressor_.RuntimeSVMRegressor>`.
+        See class :class:`RuntimeSVMRegressorFloat
+        <mlprodict.onnxrt.ops_cpu.op_svm_regressor_.RuntimeSVMRegressorFloat>` or
+        class :class:`RuntimeSVMRegressorDouble
+        <mlprodict.onnxrt.ops_cpu.op_svm_regressor_.RuntimeSVMRegressorDouble>`.
         """
         pred = self.rt_.compute(x)
         if pred.shape[0] != x.shape[0]:
             pred = pred.reshape(x.shape[0], pred.shape[0] // x.shape[0])
         return (pred, )
+
+
+class SVMRegressor(SVMRegressorCommon):
+
+    atts = OrderedDict([
+        ('coefficients', numpy.empty(0, dtype=numpy.float32)),
+        ('kernel_params', numpy.empty(0, dtype=numpy.float32)),
+        ('kernel_type', b'NONE'),
+        ('n_supports', 0),
+        ('one_class', 0),
+        ('post_transform', b'NONE'),
+        ('rho', numpy.empty(0, dtype=numpy.float32)),
+        ('support_vectors', numpy.empty(0, dtype=numpy.float32)),
+    ])
+
+    def __init__(self, onnx_node, desc=None, **options):
+        SVMRegressorCommon.__init__(
+            self, numpy.float32, onnx_node, desc=desc,
+            expected_attributes=SVMRegressor.atts,
+            **options)
+
+
+class SVMRegressorDouble(SVMRegressorCommon):
+
+    atts = OrderedDict([
+        ('coefficients', numpy.empty(0, dtype=numpy.float64)),
+        ('kernel_params', numpy.empty(0, dtype=numpy.float64)),
+        ('kernel_type', b'NONE'),
+        ('n_supports', 0),
+        ('one_class', 0),
+        ('post_transform', b'NONE'),
+        ('rho', numpy.empty(0, dtype=numpy.float64)),
+        ('support_vectors', numpy.empty(0, dtype=numpy.float64)),
+    ])
+
+    def __init__(self, onnx_node, desc=None, **options):
+        SVMRegressorCommon.__init__(
+            self, numpy.float64, onnx_node, desc=desc,
+            expected_attributes=SVMRegressorDouble.atts,
+            **options)
+
+
+class SVMRegressorDoubleSchema(OperatorSchema):
+    """
+    Defines a schema for operators added in this package
+    such as @see cl SVMRegressorDouble.
+    """
+
+    def __init__(self):
+        OperatorSchema.__init__(self, 'SVMRegressorDouble')
+        self.attributes = SVMRegressorDouble.atts
@@ -26,24 +26,27 @@ namespace py = pybind11;
 #include "op_common_.hpp"
 
 
+template<typename NTYPE>
 class RuntimeSVMRegressor
 {
     public:
         
         KERNEL kernel_type_;
-        float gamma_;
-        float coef0_;
-        float degree_;
+        NTYPE gamma_;
+        NTYPE coef0_;
+        NTYPE degree_;
 
         // svm_regressor.h
         bool one_class_;
         int64_t feature_count_;
         int64_t vector_count_;
-        std::vector<float> rho_;
-        std::vector<float> coefficients_;
-        std::vector<float> support_vectors_;
+        std::vector<NTYPE> rho_;
+        std::vector<NTYPE> coefficients_;
+        std::vector<NTYPE> support_vectors_;
+        std::vector<NTYPE> vectors_t_;  // support vectors or coefficients, feature by feature
         POST_EVAL_TRANSFORM post_transform_;
         SVM_TYPE mode_;  //how are we computing SVM? 0=LibSVC, 1=LibLinear
+        ParallelSettings parallel_;
     
     public:
         
@@ -51,54 +54,60 @@ class RuntimeSVMRegressor
         ~RuntimeSVMRegressor();
 
         void init(
-            py::array_t<float> coefficients,
-            py::array_t<float> kernel_params,
+            py::array_t<NTYPE> coefficients,
+            py::array_t<NTYPE> kernel_params,
             const std::string& kernel_type,
             int64_t n_supports,
             int64_t one_class,
             const std::string& post_transform,
-            py::array_t<float> rho,
-            py::array_t<float> support_vectors
+            py::array_t<NTYPE> rho,
+            py::array_t<NTYPE> support_vectors
         );
         
-        py::array_t<float> compute(py::array_t<float> X) const;
+        py::array_t<NTYPE> compute(py::array_t<NTYPE> X) const;
     
         std::string runtime_options();
 
         int omp_get_max_threads();
 
+        void set_num_threads(int64_t n_threads);
+
+        void set_schedule(const std::string& kind, int64_t chunk_size);
+
+        void set_parallel_threshold(int64_t n_rows);
+
 private:
 
         void Initialize();
 
-        template<typename T>
-        float kernel_dot_gil_free(
-                const T* A, int64_t a, const std::vector<float>& B,
-                int64_t b, int64_t len, KERNEL k) const;
-    
         void compute_gil_free(const std::vector<int64_t>& x_dims, int64_t N, int64_t stride,
-                              const py::array_t<float>& X, py::array_t<float>& Z) const;
+                              const py::array_t<NTYPE>& X, py::array_t<NTYPE>& Z) const;
 };
 
 
-RuntimeSVMRegressor::RuntimeSVMRegressor() {
+template<typename NTYPE>
+RuntimeSVMRegressor<NTYPE>::RuntimeSVMRegressor() {
 }
 
 
-RuntimeSVMRegressor::~RuntimeSVMRegressor() {
+template<typename NTYPE>
+RuntimeSVMRegressor<NTYPE>::~RuntimeSVMRegressor() {
 }
 
 
-std::string RuntimeSVMRegressor::runtime_options() {
+template<typename NTYPE>
+std::string RuntimeSVMRegressor<NTYPE>::runtime_options() {
     std::string res;
 #ifdef USE_OPENMP
     res += "OPENMP";
 #endif
+    res += parallel_.to_string();
     return res;
 }
 
 
-int RuntimeSVMRegressor::omp_get_max_threads() {
+template<typename NTYPE>
+int RuntimeSVMRegressor<NTYPE>::omp_get_max_threads() {
 #if USE_OPENMP
     return ::omp_get_max_threads();
 #else
@@ -107,26 +116,45 @@ int RuntimeSVMRegressor::omp_get_max_threads() {
 }
 
 
-void RuntimeSVMRegressor::init(
-            py::array_t<float> coefficients,
-            py::array_t<float> kernel_params,
+template<typename NTYPE>
+void RuntimeSVMRegressor<NTYPE>::set_num_threads(int64_t n_threads) {
+    parallel_.set_num_threads(n_threads);
+}
+
+
+template<typename NTYPE>
+void RuntimeSVMRegressor<NTYPE>::set_schedule(const std::string& kind, int64_t chunk_size) {
+    parallel_.set_schedule(kind, chunk_size);
+}
+
+
+template<typename NTYPE>
+void RuntimeSVMRegressor<NTYPE>::set_parallel_threshold(int64_t n_rows) {
+    parallel_.set_threshold(n_rows);
+}
+
+
+template<typename NTYPE>
+void RuntimeSVMRegressor<NTYPE>::init(
+            py::array_t<NTYPE> coefficients,
+            py::array_t<NTYPE> kernel_params,
             const std::string& kernel_type,
             int64_t n_supports,
             int64_t one_class,
             const std::string& post_transform,
-            py::array_t<float> rho,
-            py::array_t<float> support_vectors
+            py::array_t<NTYPE> rho,
+            py::array_t<NTYPE> support_vectors
     ) {
     kernel_type_ = to_KERNEL(kernel_type);
     vector_count_ = n_supports;
-    array2vector(support_vectors_, support_vectors, float);
+    array2vector(support_vectors_, support_vectors, NTYPE);
     post_transform_ = to_POST_EVAL_TRANSFORM(post_transform);
-    array2vector(rho_, rho, float);
-    array2vector(coefficients_, coefficients, float);
+    array2vector(rho_, rho, NTYPE);
+    array2vector(coefficients_, coefficients, NTYPE);
     one_class_ = one_class != 0;
         
-    std::vector<float> kernel_params_local;
-    array2vector(kernel_params_local, kernel_params, float);
+    std::vector<NTYPE> kernel_params_local;
+    array2vector(kernel_params_local, kernel_params, NTYPE);
 
     if (!kernel_params_local.empty()) {
       gamma_ = kernel_params_local[0];
@@ -134,16 +162,17 @@ void RuntimeSVMRegressor::init(
       degree_ = kernel_params_local[2];
     }
     else {
-      gamma_ = 0.f;
-      coef0_ = 0.f;
-      degree_ = 0.f;
+      gamma_ = 0;
+      coef0_ = 0;
+      degree_ = 0;
     }
     
     Initialize();
 }
 
 
-void RuntimeSVMRegressor::Initialize() {
+template<typename NTYPE>
+void RuntimeSVMRegressor<NTYPE>::Initialize() {
   if (vector_count_ > 0) {
     feature_count_ = support_vectors_.size() / vector_count_;  //length of each support vector
     mode_ = SVM_TYPE::SVM_SVC;
@@ -152,10 +181,16 @@ void RuntimeSVMRegressor::Initialize() {
     mode_ = SVM_TYPE::SVM_LINEAR;
     kernel_type_ = KERNEL::LINEAR;
   }
+  // kernels are computed as a product between rows and vectors
+  if (mode_ == SVM_TYPE::SVM_SVC)
+    transpose_vectors(support_vectors_, vector_count_, feature_count_, vectors_t_);
+  else
+    vectors_t_ = coefficients_;
 }
 
 
-py::array_t<float> RuntimeSVMRegressor::compute(py::array_t<float> X) const {
+template<typename NTYPE>
+py::array_t<NTYPE> RuntimeSVMRegressor<NTYPE>::compute(py::array_t<NTYPE> X) const {
     // const Tensor& X = *context->Input<Tensor>(0);
     // const TensorShape& x_shape = X.Shape();    
     std::vector<int64_t> x_dims;
@@ -166,7 +201,7 @@ py::array_t<float> RuntimeSVMRegressor::compute(py::array_t<float> X) const {
     int64_t stride = x_dims.size() == 1 ? x_dims[0] : x_dims[1];  
     int64_t N = x_dims.size() == 1 ? 1 : x_dims[0];
                         
-    py::array_t<float> Z(x_dims[0]); // one target only
+    py::array_t<NTYPE> Z(x_dims[0]); // one target only
     {
         py::gil_scoped_release release;
         compute_gil_free(x_dims, N, stride, X, Z);
@@ -174,71 +209,73 @@ py::array_t<float> RuntimeSVMRegressor::compute(py::array_t<float> X) const {
     return Z;
 }
 
-template<typename T>
-float RuntimeSVMRegressor::kernel_dot_gil_free(
-        const T* A, int64_t a,
-        const std::vector<float>& B, int64_t b,
-        int64_t len, KERNEL k) const {
-    double sum = 0;
-    const T* pA = A + a;
-    const float* pB = B.data() + b;
-    if (k == KERNEL::POLY) {
-      for (int64_t i = len; i > 0; --i, ++pA, ++pB)
-        sum += *pA * *pB;
-      sum = gamma_ * sum + coef0_;
-      sum = std::pow(sum, degree_);
-    } else if (k == KERNEL::SIGMOID) {
-      for (int64_t i = len; i > 0; --i, ++pA, ++pB)
-        sum += *pA * *pB;
-      sum = gamma_ * sum + coef0_;
-      sum = std::tanh(sum);
-    } else if (k == KERNEL::RBF) {
-      for (int64_t i = len; i > 0; --i, ++pA, ++pB) {
-        double val = *pA - *pB;
-        sum += val * val;
-      }
-      sum = std::exp(-gamma_ * sum);
-    } else if (k == KERNEL::LINEAR) {
-      for (int64_t i = len; i > 0; --i, ++pA, ++pB)
-        sum += *pA * *pB;
-    }
-    return (float)sum;
-}
-
-    
-void RuntimeSVMRegressor::compute_gil_free(
+template<typename NTYPE>
+void RuntimeSVMRegressor<NTYPE>::compute_gil_free(
                 const std::vector<int64_t>& x_dims, int64_t N, int64_t stride,
-                const py::array_t<float>& X, py::array_t<float>& Z) const {
+                const py::array_t<NTYPE>& X, py::array_t<NTYPE>& Z) const {
 
-  auto Z_ = Z.mutable_unchecked<1>();          
-  const float* x_data = X.data(0);
-  float* z_data = (float*)Z_.data(0);
+  auto Z_ = Z.template mutable_unchecked<1>();          
+  const NTYPE* x_data = X.data(0);
+  NTYPE* z_data = (NTYPE*)Z_.data(0);
+
+  // linear mode: one vector of coefficients
+  int64_t n_vectors = mode_ == SVM_TYPE::SVM_SVC ? vector_count_ : 1;
+
+  int64_t n_threads = parallel_.num_threads(N);
+  parallel_.apply_schedule();
+  int64_t block = choose_kernel_block_size(N, n_threads, n_vectors);
+  int64_t n_blocks = (N + block - 1) / block;
+
+#ifdef USE_OPENMP
+#pragma omp parallel num_threads(n_threads) if(n_threads > 1)
+#endif
+  {
+    // buffer allocated once per thread
+    std::vector<NTYPE> kernels(block * n_vectors);
 
 #ifdef USE_OPENMP
-#pragma omp parallel for
+#pragma omp for schedule(runtime)
 #endif
-  for (int64_t n = 0; n < N; ++n) {  //for each example
-    int64_t current_weight_0 = n * stride;
-
-    float sum = 0.f;
-    if (mode_ == SVM_TYPE::SVM_SVC) {
-      for (int64_t j = 0; j < vector_count_; ++j) {
-        float val1 = kernel_dot_gil_free(x_data, current_weight_0, support_vectors_,
-                                         feature_count_ * j, feature_count_, kernel_type_);
-        sum += val1 * coefficients_[j];
+    for (int64_t b = 0; b < n_blocks; ++b) {
+      int64_t first = b * block;
+      int64_t last = first + block < N ? first + block : N;
+      // kernels between the block of rows and every vector
+      compute_kernel_block(x_data + first * stride, last - first, stride,
+                           vectors_t_.data(), n_vectors, feature_count_,
+                           kernel_type_, gamma_, coef0_, degree_, kernels.data());
+
+      for (int64_t n = first; n < last; ++n) {  //for each example
+        const NTYPE* row_kernels = kernels.data() + (n - first) * n_vectors;
+        NTYPE sum = 0;
+        if (mode_ == SVM_TYPE::SVM_SVC) {
+          for (int64_t j = 0; j < vector_count_; ++j)
+            sum += row_kernels[j] * coefficients_[j];
+          sum += rho_[0];
+        } else if (mode_ == SVM_TYPE::SVM_LINEAR) {  //liblinear
+          sum = row_kernels[0] + rho_[0];
+        }
+        z_data[n] = (one_class_ && sum > 0) 
+                        ? (NTYPE)1
+                        : (one_class_ ? (NTYPE)-1 : sum);
       }
-      sum += rho_[0];
-    } else if (mode_ == SVM_TYPE::SVM_LINEAR) {  //liblinear
-      sum = kernel_dot_gil_free(x_data, current_weight_0, coefficients_, 0,
-                                feature_count_, kernel_type_);
-      sum += rho_[0];
     }
-    z_data[n] = (one_class_ && sum > 0) 
-                    ? 1.f
-                    : (one_class_ ? -1.f : sum);
   }
 }
 
+class RuntimeSVMRegressorFloat : public RuntimeSVMRegressor<float>
+{
+    public:
+        RuntimeSVMRegressorFloat() : RuntimeSVMRegressor<float>() {}
+};
+
+
+class RuntimeSVMRegressorDouble : public RuntimeSVMRegressor<double>
+{
+    public:
+        RuntimeSVMRegressorDouble() : RuntimeSVMRegressor<double>() {}
+};
+
+
 #ifndef SKIP_PYTHON
 
 PYBIND11_MODULE(op_svm_regressor_, m) {
@@ -252,20 +289,55 @@ in :epkg:`onnxruntime`.)pbdoc"
     #endif
     ;
 
-    py::class_<RuntimeSVMRegressor> cl (m, "RuntimeSVMRegressor",
-        R"pbdoc(Implements runtime for operator SVMRegressor. The code is inspired from
+    py::class_<RuntimeSVMRegressorFloat> clf (m, "RuntimeSVMRegressorFloat",
+        R"pbdoc(Implements float runtime for operator SVMRegressor. The code is inspired from
+`svm_regressor.cc <https://github.com/microsoft/onnxruntime/blob/master/onnxruntime/core/providers/cpu/ml/svm_regressor.cc>`_
+in :epkg:`onnxruntime`.)pbdoc");
+
+    clf.def(py::init<>());
+    clf.def("init", &RuntimeSVMRegressorFloat::init,
+            "Initializes the runtime with the ONNX attributes in alphabetical order.");
+    clf.def("compute", &RuntimeSVMRegressorFloat::compute,
+            "Computes the predictions for the SVM regressor.");
+    clf.def("runtime_options", &RuntimeSVMRegressorFloat::runtime_options,
+            "Returns indications about how the runtime was compiled.");
+    clf.def("omp_get_max_threads", &RuntimeSVMRegressorFloat::omp_get_max_threads,
+            "Returns omp_get_max_threads from openmp library.");
+    clf.def("set_num_threads", &RuntimeSVMRegressorFloat::set_num_threads, py::arg("n_threads"),
+            "Sets the number of threads used by this instance, 0 for the default "
+            "number of threads of the openmp library.");
+    clf.def("set_schedule", &RuntimeSVMRegressorFloat::set_schedule, py::arg("kind"), py::arg("chunk_size") = 0,
+            "Sets how rows are distributed across threads, *kind* is ``'static'`` "
+            "or ``'dynamic'``, *chunk_size* is the number of blocks of rows a thread "
+            "takes at once, 0 for the default.");
+    clf.def("set_parallel_threshold", &RuntimeSVMRegressorFloat::set_parallel_threshold, py::arg("n_rows"),
+            "A batch with less than *n_rows* rows is computed by the calling thread "
+            "without opening a parallel region.");
+
+    py::class_<RuntimeSVMRegressorDouble> cld (m, "RuntimeSVMRegressorDouble",
+        R"pbdoc(Implements double runtime for operator SVMRegressor. The code is inspired from
 `svm_regressor.cc <https://github.com/microsoft/onnxruntime/blob/master/onnxruntime/core/providers/cpu/ml/svm_regressor.cc>`_
 in :epkg:`onnxruntime`.)pbdoc");
 
-    cl.def(py::init<>());
-    cl.def("init", &RuntimeSVMRegressor::init,
-           "Initializes the runtime with the ONNX attributes in alphabetical order.");
-    cl.def("compute", &RuntimeSVMRegressor::compute,
-           "Computes the predictions for the SVM regressor.");
-    cl.def("runtime_options", &RuntimeSVMRegressor::runtime_options,
-           "Returns indications about how the runtime was compiled.");
-    cl.def("omp_get_max_threads", &RuntimeSVMRegressor::omp_get_max_threads,
-           "Returns omp_get_max_threads from openmp library.");
+    cld.def(py::init<>());
+    cld.def("init", &RuntimeSVMRegressorDouble::init,
+            "Initializes the runtime with the ONNX attributes in alphabetical order.");
+    cld.def("compute", &RuntimeSVMRegressorDouble::compute,
+            "Computes the predictions for the SVM regressor.");
+    cld.def("runtime_options", &RuntimeSVMRegressorDouble::runtime_options,
+            "Returns indications about how the runtime was compiled.");
+    cld.def("omp_get_max_threads", &RuntimeSVMRegressorDouble::omp_get_max_threads,
+            "Returns omp_get_max_threads from openmp library.");
+    cld.def("set_num_threads", &RuntimeSVMRegressorDouble::set_num_threads, py::arg("n_threads"),
+            "Sets the number of threads used by this instance, 0 for the default "
+            "number of threads of the openmp library.");
+    cld.def("set_schedule", &RuntimeSVMRegressorDouble::set_schedule, py::arg("kind"), py::arg("chunk_size") = 0,
+            "Sets how rows are distributed across threads, *kind* is ``'static'`` "
+            "or ``'dynamic'``, *chunk_size* is the number of blocks of rows a thread "
+            "takes at once, 0 for the default.");
+    cld.def("set_parallel_threshold", &RuntimeSVMRegressorDouble::set_parallel_threshold, py::arg("n_rows"),
+            "A batch with less than *n_rows* rows is computed by the calling thread "
+            "without opening a parallel region.");
 }
 
 #endif
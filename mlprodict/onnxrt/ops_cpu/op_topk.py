@@ -20,9 +20,9 @@ class TopK(OpRun):
     def _run(self, data, ink):  # pylint: disable=W0221
         """
         Runtime for operator *TopK*.
-        The implementation is not the most efficient
-        as it sorts everything then extracts the top *k*
-        values.
+        The top *k* elements are selected with ``numpy.argpartition``
+        and only these elements are sorted, the cost is
+        *O(n + k log k)* instead of *O(n log n)* along the axis.
 
         .. warning::
             ONNX specifications may be imprecise in case of negative value
@@ -32,12 +32,15 @@ class TopK(OpRun):
         """
         k = ink[0]
         axis = self.axis if self.axis >= 0 else (self.axis + len(data.shape))
-        sorti = numpy.argsort(data, axis=axis)
-        sort = numpy.sort(data, axis=axis)
-        if k > 0:
-            shapes = [0 for s in data.shape]
-            shapes[axis] = data.shape[axis] - k
-            indices = tuple(slice(b, e) for b, e in zip(shapes, data.shape))
-            return (sort[indices], sorti[indices])
-        else:
-            return (sort, sorti)
+        n = data.shape[axis]
+        if k <= 0 or k >= n:
+            sorti = numpy.argsort(data, axis=axis)
+            return (numpy.take_along_axis(data, sorti, axis=axis), sorti)
+
+        indices = [slice(None) for s in data.shape]
+        indices[axis] = slice(n - k, n)
+        topi = numpy.argpartition(data, n - k, axis=axis)[tuple(indices)]
+        top = numpy.take_along_axis(data, topi, axis=axis)
+        order = numpy.argsort(top, axis=axis)
+        return (numpy.take_along_axis(top, order, axis=axis),
+                numpy.take_along_axis(topi, order, axis=axis))
@@ -22,6 +22,7 @@ namespace py = pybind11;
 #include "op_common_.hpp"
 
 
+template<typename NTYPE>
 class RuntimeTreeEnsembleClassifier
 {
     public:
@@ -30,8 +31,8 @@ class RuntimeTreeEnsembleClassifier
         std::vector<int64_t> nodes_treeids_;
         std::vector<int64_t> nodes_nodeids_;
         std::vector<int64_t> nodes_featureids_;
-        std::vector<float> nodes_values_;
-        std::vector<float> nodes_hitrates_;
+        std::vector<NTYPE> nodes_values_;
+        std::vector<NTYPE> nodes_hitrates_;
         //std::vector<std::string> nodes_modes_names_;
         std::vector<NODE_MODE> nodes_modes_;
         std::vector<int64_t> nodes_truenodeids_;
@@ -41,86 +42,155 @@ class RuntimeTreeEnsembleClassifier
         std::vector<int64_t> class_nodeids_;
         std::vector<int64_t> class_treeids_;
         std::vector<int64_t> class_ids_;
-        std::vector<float> class_weights_;
+        std::vector<NTYPE> class_weights_;
         int64_t class_count_;
         std::set<int64_t> weights_classes_;
 
-        std::vector<float> base_values_;
+        std::vector<NTYPE> base_values_;
         //std::vector<std::string> classlabels_strings_;
         std::vector<int64_t> classlabels_int64s_;
 
-        std::vector<std::tuple<int64_t, int64_t, int64_t, float>> leafnodedata_;
-        std::unordered_map<int64_t, int64_t> leafdata_map_;
+        std::vector<std::tuple<int64_t, int64_t, int64_t, NTYPE>> leafnodedata_;
         std::vector<int64_t> roots_;
+        std::vector<TreeNodeElement<NTYPE>> packed_nodes_;
+        std::vector<TreeLeafWeight<NTYPE>> leaf_weights_;
+        int64_t n_slots_;
+        std::vector<int32_t> packed_roots_;
+        std::vector<TreeBinnedNode> binned_nodes_;
+        std::vector<int32_t> bin_features_;
+        std::vector<int64_t> bin_offsets_;
+        std::vector<NTYPE> bin_thresholds_;
         const int64_t kOffset_ = 4000000000L;
         const int64_t kMaxTreeDepth_ = 1000;
         POST_EVAL_TRANSFORM post_transform_;
         bool weights_are_all_positive_;
+        ParallelSettings parallel_;
     
     public:
+
+        int64_t block_size_;
+        int64_t tree_parallel_threshold_;
+        bool binning_;
         
         RuntimeTreeEnsembleClassifier();
         ~RuntimeTreeEnsembleClassifier();
 
         void init(
-            py::array_t<float> base_values, // 0
+            py::array_t<NTYPE> base_values, // 0
             py::array_t<int64_t> class_ids, // 1
             py::array_t<int64_t> class_nodeids, // 2
             py::array_t<int64_t> class_treeids, // 3
-            py::array_t<float> class_weights, // 4
+            py::array_t<NTYPE> class_weights, // 4
             py::array_t<int64_t> classlabels_int64s, // 5
             const std::vector<std::string>& classlabels_strings, // 6
             py::array_t<int64_t> nodes_falsenodeids, // 7
             py::array_t<int64_t> nodes_featureids, // 8
-            py::array_t<float> nodes_hitrates, // 9
+            py::array_t<NTYPE> nodes_hitrates, // 9
             py::array_t<int64_t> nodes_missing_value_tracks_true, // 10
             const std::vector<std::string>& nodes_modes, // 11
             py::array_t<int64_t> nodes_nodeids, // 12
             py::array_t<int64_t> nodes_treeids, // 13
             py::array_t<int64_t> nodes_truenodeids, // 14
-            py::array_t<float> nodes_values, // 15
+            py::array_t<NTYPE> nodes_values, // 15
             const std::string& post_transform // 16
         );
         
-        py::tuple compute(py::array_t<float> X) const;
+        py::tuple compute(py::array_t<NTYPE> X) const;
+
+        py::tuple finalize_scores(py::array_t<NTYPE> scores,
+                                  py::array_t<unsigned char> has_scores) const;
+
+        void ProcessTreeNode(NTYPE* class_scores,
+                             unsigned char* has_scores,
+                             int32_t treeindex,
+                             const NTYPE* x_data) const;
+
+        void ProcessBinnedTreeNode(NTYPE* class_scores,
+                                   unsigned char* has_scores,
+                                   int32_t treeindex,
+                                   const uint16_t* bins) const;
 
-        void ProcessTreeNode(std::map<int64_t, float>& classes,
-                             int64_t treeindex,
-                             const float* x_data,
-                             int64_t feature_base) const;
+        bool use_binning() const;
 
         std::string runtime_options();
 
+        std::string schedule(int64_t n_rows);
+
         int omp_get_max_threads();
 
+        void set_num_threads(int64_t n_threads);
+
+        void set_schedule(const std::string& kind, int64_t chunk_size);
+
+        void set_parallel_threshold(int64_t n_rows);
+
     private:
 
         void Initialize();
 
+        void compute_gil_free_trees(int64_t N, int64_t stride, int64_t n_threads,
+                                    const NTYPE* x_data, int64_t* y_data,
+                                    NTYPE* z_data) const;
+
+        int64_t FinalizeRow(NTYPE* class_scores, unsigned char* has_scores,
+                            std::vector<NTYPE>& scores, NTYPE* z_data) const;
+
+        void ProcessLeaf(NTYPE* class_scores, unsigned char* has_scores,
+                         int32_t first, int32_t last) const;
+
         void compute_gil_free(const std::vector<int64_t>& x_dims, int64_t N, int64_t stride,
-                              const py::array_t<float>& X, py::array_t<int64_t>& Y,
-                              py::array_t<float>& Z) const;
+                              const py::array_t<NTYPE>& X, py::array_t<int64_t>& Y,
+                              py::array_t<NTYPE>& Z) const;
 };
 
 
-RuntimeTreeEnsembleClassifier::RuntimeTreeEnsembleClassifier() {
+template<typename NTYPE>
+RuntimeTreeEnsembleClassifier<NTYPE>::RuntimeTreeEnsembleClassifier() {
+    block_size_ = 128;
+    tree_parallel_threshold_ = 8;
+    binning_ = false;
 }
 
 
-RuntimeTreeEnsembleClassifier::~RuntimeTreeEnsembleClassifier() {
+template<typename NTYPE>
+RuntimeTreeEnsembleClassifier<NTYPE>::~RuntimeTreeEnsembleClassifier() {
 }
 
 
-std::string RuntimeTreeEnsembleClassifier::runtime_options() {
+template<typename NTYPE>
+std::string RuntimeTreeEnsembleClassifier<NTYPE>::runtime_options() {
     std::string res;
 #ifdef USE_OPENMP
     res += "OPENMP";
 #endif
+    if (!res.empty())
+        res += " ";
+    res += "BLOCK_SIZE=" + std::to_string(block_size_);
+    res += " TREE_PARALLEL_THRESHOLD=" + std::to_string(tree_parallel_threshold_);
+    if (use_binning())
+        res += " BINNING";
+    res += parallel_.to_string();
     return res;
 }
 
 
-int RuntimeTreeEnsembleClassifier::omp_get_max_threads() {
+template<typename NTYPE>
+bool RuntimeTreeEnsembleClassifier<NTYPE>::use_binning() const {
+    return binning_ && !binned_nodes_.empty();
+}
+
+
+template<typename NTYPE>
+std::string RuntimeTreeEnsembleClassifier<NTYPE>::schedule(int64_t n_rows) {
+    if (use_tree_parallel(n_rows, packed_roots_.size(), tree_parallel_threshold_))
+        return "TREES";
+    int64_t block = choose_tree_block_size(n_rows, parallel_.num_threads(n_rows), block_size_);
+    return block == 1 ? std::string("ROWS") : "BLOCKS:" + std::to_string(block);
+}
+
+
+template<typename NTYPE>
+int RuntimeTreeEnsembleClassifier<NTYPE>::omp_get_max_threads() {
 #if USE_OPENMP
     return ::omp_get_max_threads();
 #else
@@ -129,30 +199,49 @@ int RuntimeTreeEnsembleClassifier::omp_get_max_threads() {
 }
 
 
-void RuntimeTreeEnsembleClassifier::init(
-            py::array_t<float> base_values,
+template<typename NTYPE>
+void RuntimeTreeEnsembleClassifier<NTYPE>::set_num_threads(int64_t n_threads) {
+    parallel_.set_num_threads(n_threads);
+}
+
+
+template<typename NTYPE>
+void RuntimeTreeEnsembleClassifier<NTYPE>::set_schedule(const std::string& kind, int64_t chunk_size) {
+    parallel_.set_schedule(kind, chunk_size);
+}
+
+
+template<typename NTYPE>
+void RuntimeTreeEnsembleClassifier<NTYPE>::set_parallel_threshold(int64_t n_rows) {
+    parallel_.set_threshold(n_rows);
+}
+
+
+template<typename NTYPE>
+void RuntimeTreeEnsembleClassifier<NTYPE>::init(
+            py::array_t<NTYPE> base_values,
             py::array_t<int64_t> class_ids,
             py::array_t<int64_t> class_nodeids,
             py::array_t<int64_t> class_treeids,
-            py::array_t<float> class_weights,
+            py::array_t<NTYPE> class_weights,
             py::array_t<int64_t> classlabels_int64s,
             const std::vector<std::string>& classlabels_strings,
             py::array_t<int64_t> nodes_falsenodeids,
             py::array_t<int64_t> nodes_featureids,
-            py::array_t<float> nodes_hitrates,
+            py::array_t<NTYPE> nodes_hitrates,
             py::array_t<int64_t> nodes_missing_value_tracks_true,
             const std::vector<std::string>& nodes_modes,
             py::array_t<int64_t> nodes_nodeids,
             py::array_t<int64_t> nodes_treeids,
             py::array_t<int64_t> nodes_truenodeids,
-            py::array_t<float> nodes_values,
+            py::array_t<NTYPE> nodes_values,
             const std::string& post_transform
     ) {
     array2vector(nodes_treeids_, nodes_treeids, int64_t);
     array2vector(nodes_nodeids_, nodes_nodeids, int64_t);
     array2vector(nodes_featureids_, nodes_featureids, int64_t);
-    array2vector(nodes_values_, nodes_values, float);
-    array2vector(nodes_hitrates_, nodes_hitrates, float);
+    array2vector(nodes_values_, nodes_values, NTYPE);
+    array2vector(nodes_hitrates_, nodes_hitrates, NTYPE);
     array2vector(nodes_truenodeids_, nodes_truenodeids, int64_t);
     array2vector(nodes_falsenodeids_, nodes_falsenodeids, int64_t);
     array2vector(missing_tracks_true_, nodes_missing_value_tracks_true, int64_t);
@@ -160,8 +249,8 @@ void RuntimeTreeEnsembleClassifier::init(
     array2vector(class_nodeids_, class_nodeids, int64_t);
     array2vector(class_treeids_, class_treeids, int64_t);
     array2vector(class_ids_, class_ids, int64_t);
-    array2vector(class_weights_, class_weights, float);
-    array2vector(base_values_, base_values, float);
+    array2vector(class_weights_, class_weights, NTYPE);
+    array2vector(base_values_, base_values, NTYPE);
     if (classlabels_strings.size() > 0)
         throw std::runtime_error("This runtime only handles integers.");
     // classlabels_strings_ = classlabels_strings;
@@ -176,7 +265,8 @@ void RuntimeTreeEnsembleClassifier::init(
     Initialize();
 }
 
-void RuntimeTreeEnsembleClassifier::Initialize() {
+template<typename NTYPE>
+void RuntimeTreeEnsembleClassifier<NTYPE>::Initialize() {
   int64_t current_tree_id = 1234567891L;
   std::vector<int64_t> tree_offsets;
   weights_are_all_positive_ = true;
@@ -214,30 +304,14 @@ void RuntimeTreeEnsembleClassifier::Initialize() {
   }
 
   std::sort(std::begin(leafnodedata_), std::end(leafnodedata_), 
-    [](const std::tuple<int64_t, int64_t, int64_t, float>& t1,
-       const std::tuple<int64_t, int64_t, int64_t, float>& t2) {
+    [](const std::tuple<int64_t, int64_t, int64_t, NTYPE>& t1,
+       const std::tuple<int64_t, int64_t, int64_t, NTYPE>& t2) {
         if (std::get<0>(t1) != std::get<0>(t2))
             return std::get<0>(t1) < std::get<0>(t2);
 
         return std::get<1>(t1) < std::get<1>(t2);
   });
 
-  // make an index so we can find the leafnode data quickly when evaluating
-  int64_t field0 = -1;
-  int64_t field1 = -1;
-  for (size_t i = 0, end = leafnodedata_.size(); i < end; ++i) {
-    int64_t id0 = std::get<0>(leafnodedata_[i]);
-    int64_t id1 = std::get<1>(leafnodedata_[i]);
-    if (id0 != field0 || id1 != field1) {
-      int64_t id = id0 * kOffset_ + id1;
-      auto position = static_cast<int64_t>(i);
-      auto p3 = std::make_pair(id, position);
-      leafdata_map_.insert(p3);
-      field0 = id;
-      field1 = position;
-    }
-  }
-
   // treenode ids, some are roots_, and roots_ have no parents
   std::unordered_map<int64_t, int64_t> parents;  // holds count of all who point to you
   std::unordered_map<int64_t, int64_t> indices;
@@ -281,39 +355,81 @@ void RuntimeTreeEnsembleClassifier::Initialize() {
       roots_.push_back(it->second);
     }
   }
+  // nodes are packed into a single array, every tree is stored breadth-first
+  pack_tree_nodes(packed_nodes_, packed_roots_, roots_, nodes_modes_,
+                  nodes_featureids_, nodes_values_, nodes_truenodeids_,
+                  nodes_falsenodeids_, missing_tracks_true_);
+  // every leaf points to a contiguous range of weights
+  link_tree_leaves(packed_nodes_, leaf_weights_, nodes_treeids_, nodes_nodeids_,
+                   leafnodedata_);
   class_count_ = classlabels_int64s_.size();
+
+  // scores are accumulated in an array indexed by class id
+  n_slots_ = std::max(std::max(class_count_, (int64_t)base_values_.size()), (int64_t)2);
+  for (auto& w : leaf_weights_) {
+    if (w.id < 0)
+      throw std::runtime_error("class_ids must be positive.");
+    if (w.id >= n_slots_)
+      n_slots_ = w.id + 1;
+  }
+  // thresholds replaced by bins, binned_nodes_ remains empty
+  // if a feature has too many distinct thresholds, binning is only
+  // enabled by default if it is expected to be faster
+  binning_ = bin_tree_nodes(packed_nodes_, binned_nodes_, bin_features_,
+                            bin_offsets_, bin_thresholds_) &&
+             tree_binning_is_faster(binned_nodes_, packed_roots_.size(), bin_offsets_);
 }
 
 
-void get_max_weight(const std::map<int64_t, float>& classes, int64_t& maxclass, float& maxweight) {
+// class_scores[k] is only relevant if has_scores[k] is true,
+// it follows the logic onnxruntime implements with a std::map.
+template<typename NTYPE>
+void get_max_weight(const NTYPE* class_scores,
+                    const unsigned char* has_scores, int64_t n_slots,
+                    int64_t& maxclass, NTYPE& maxweight) {
   maxclass = -1;
   maxweight = 0.f;
-  for (auto& classe : classes) {
-    if (maxclass == -1 || classe.second > maxweight) {
-      maxclass = classe.first;
-      maxweight = classe.second;
+  for (int64_t k = 0; k < n_slots; ++k) {
+    if (!has_scores[k])
+      continue;
+    if (maxclass == -1 || class_scores[k] > maxweight) {
+      maxclass = k;
+      maxweight = class_scores[k];
     }
   }
 }
 
 
-void get_weight_class_positive(std::map<int64_t, float>& classes, float& pos_weight) {
-  auto it_classes = classes.find(1);
-  pos_weight = it_classes == classes.end()
-                   ? (classes.size() > 0 ? classes[0] : 0.f)  // only 1 class
-                   : it_classes->second;
+template<typename NTYPE>
+void get_weight_class_positive(NTYPE* class_scores,
+                               unsigned char* has_scores, int64_t n_slots,
+                               NTYPE& pos_weight) {
+  if (has_scores[1]) {
+    pos_weight = class_scores[1];
+    return;
+  }
+  for (int64_t k = 0; k < n_slots; ++k) {
+    if (has_scores[k]) {
+      // only 1 class
+      has_scores[0] = 1;
+      pos_weight = class_scores[0];
+      return;
+    }
+  }
+  pos_weight = 0.f;
 }
 
 
-int64_t _set_score_binary(int64_t i,
-                          int& write_additional_scores,
+template<typename NTYPE>
+int64_t _set_score_binary(int& write_additional_scores,
                           bool weights_are_all_positive_,
-                          std::map<int64_t, float>& classes,
+                          NTYPE* class_scores,
+                          unsigned char* has_scores, int64_t n_slots,
                           const std::vector<int64_t>& classes_labels_,
                           const std::set<int64_t>& weights_classes_,
                           int64_t positive_label, int64_t negative_label) {
-  float pos_weight;
-  get_weight_class_positive(classes, pos_weight);
+  NTYPE pos_weight;
+  get_weight_class_positive(class_scores, has_scores, n_slots, pos_weight);
   if (classes_labels_.size() == 2 && weights_classes_.size() == 1) {
     if (weights_are_all_positive_) {
       if (pos_weight > 0.5) {
@@ -340,7 +456,8 @@ int64_t _set_score_binary(int64_t i,
 }
 
 
-py::tuple RuntimeTreeEnsembleClassifier::compute(py::array_t<float> X) const {
+template<typename NTYPE>
+py::tuple RuntimeTreeEnsembleClassifier<NTYPE>::compute(py::array_t<NTYPE> X) const {
     // const Tensor& X = *context->Input<Tensor>(0);
     // const TensorShape& x_shape = X.Shape();
     std::vector<int64_t> x_dims;
@@ -355,7 +472,7 @@ py::tuple RuntimeTreeEnsembleClassifier::compute(py::array_t<float> X) const {
     // Tensor* Y = context->Output(0, TensorShape({N}));
     // auto* Z = context->Output(1, TensorShape({N, class_count_}));
     py::array_t<int64_t> Y(x_dims[0]);
-    py::array_t<float> Z(x_dims[0] * class_count_);
+    py::array_t<NTYPE> Z(x_dims[0] * class_count_);
 
     {
         py::gil_scoped_release release;
@@ -364,177 +481,295 @@ py::tuple RuntimeTreeEnsembleClassifier::compute(py::array_t<float> X) const {
     return py::make_tuple(Y, Z);
 }
     
-void RuntimeTreeEnsembleClassifier::compute_gil_free(
+template<typename NTYPE>
+py::tuple RuntimeTreeEnsembleClassifier<NTYPE>::finalize_scores(
+        py::array_t<NTYPE> scores, py::array_t<unsigned char> has_scores) const {
+    // scores were summed by another implementation (see mlprodict.cc),
+    // only the base values, the labels and the post transform remain
+    if (scores.ndim() != 2 || scores.shape(1) != n_slots_ ||
+            has_scores.ndim() != 2 || has_scores.shape(0) != scores.shape(0) ||
+            has_scores.shape(1) != n_slots_)
+        throw std::runtime_error("scores and has_scores must have shape (N, n_slots).");
+    int64_t N = scores.shape(0);
+    py::array_t<int64_t> Y(N);
+    py::array_t<NTYPE> Z(N * class_count_);
+    // FinalizeRow modifies the scores, they are copied
+    std::vector<NTYPE> class_scores(scores.data(0, 0), scores.data(0, 0) + N * n_slots_);
+    std::vector<unsigned char> flags(has_scores.data(0, 0), has_scores.data(0, 0) + N * n_slots_);
+    int64_t* y = (int64_t*)Y.data(0);
+    NTYPE* z = (NTYPE*)Z.data(0);
+    {
+        py::gil_scoped_release release;
+        std::vector<NTYPE> buffer;
+        buffer.reserve(n_slots_ + 1);
+        for (int64_t i = 0; i < N; ++i)
+            y[i] = FinalizeRow(class_scores.data() + i * n_slots_,
+                               flags.data() + i * n_slots_,
+                               buffer, z + i * class_count_);
+    }
+    return py::make_tuple(Y, Z);
+}
+
+
+template<typename NTYPE>
+void RuntimeTreeEnsembleClassifier<NTYPE>::compute_gil_free(
                 const std::vector<int64_t>& x_dims, int64_t N, int64_t stride,
-                const py::array_t<float>& X, py::array_t<int64_t>& Y, py::array_t<float>& Z) const {
+                const py::array_t<NTYPE>& X, py::array_t<int64_t>& Y, py::array_t<NTYPE>& Z) const {
     auto Y_ = Y.mutable_unchecked<1>();
-    auto Z_ = Z.mutable_unchecked<1>();
-    const float* x_data = X.data(0);
+    auto Z_ = Z.template mutable_unchecked<1>();
+    const NTYPE* x_data = X.data(0);
+
+    int64_t n_threads = parallel_.num_threads(N);
+    parallel_.apply_schedule();
+    if (use_tree_parallel(N, packed_roots_.size(), tree_parallel_threshold_)) {
+        compute_gil_free_trees(N, stride, n_threads, x_data,
+                               (int64_t*)Y_.data(0), (NTYPE*)Z_.data(0));
+        return;
+    }
+
+    // a block of rows walks through a tree before the next tree
+    int64_t block = choose_tree_block_size(N, n_threads, block_size_);
+    int64_t n_blocks = (N + block - 1) / block;
+    bool binned = use_binning();
+    int64_t n_bins = static_cast<int64_t>(bin_features_.size());
 
-    // for each class
 #ifdef USE_OPENMP
-#pragma omp parallel for
+#pragma omp parallel num_threads(n_threads) if(n_threads > 1)
 #endif
-    for (int64_t i = 0; i < N; ++i) {
-        std::vector<float> scores;
-        int64_t current_weight_0 = i * stride;
-        std::map<int64_t, float> classes;
+    {
+    // buffers allocated once per thread
+    std::vector<NTYPE> class_scores(block * n_slots_);
+    std::vector<unsigned char> has_scores(block * n_slots_);
+    std::vector<NTYPE> scores;
+    scores.reserve(n_slots_ + 1);
+    std::vector<uint16_t> bins(binned ? block * n_bins : 0);
+
+    // for each block of rows
+#ifdef USE_OPENMP
+#pragma omp for schedule(runtime)
+#endif
+    for (int64_t b = 0; b < n_blocks; ++b) {
+        int64_t first = b * block;
+        int64_t last = first + block < N ? first + block : N;
+        std::fill(class_scores.begin(), class_scores.end(), 0.f);
+        std::fill(has_scores.begin(), has_scores.end(), 0);
+
+        if (binned) {
+            // features are binned once for all trees
+            bin_tree_features(x_data + first * stride, stride, last - first, bin_features_,
+                              bin_offsets_, bin_thresholds_, bins.data());
+            for (size_t j = 0, end = packed_roots_.size(); j < end; ++j) {
+                for (int64_t i = first; i < last; ++i) {
+                    ProcessBinnedTreeNode(class_scores.data() + (i - first) * n_slots_,
+                                          has_scores.data() + (i - first) * n_slots_,
+                                          packed_roots_[j], bins.data() + (i - first) * n_bins);
+                }
+            }
+        }
+        else {
+            // walk each tree from its root
+            for (size_t j = 0, end = packed_roots_.size(); j < end; ++j) {
+                for (int64_t i = first; i < last; ++i) {
+                    ProcessTreeNode(class_scores.data() + (i - first) * n_slots_,
+                                    has_scores.data() + (i - first) * n_slots_,
+                                    packed_roots_[j], x_data + i * stride);
+                }
+            }
+        }
 
-        // walk each tree from its root
-        for (size_t j = 0, end = roots_.size(); j < end; ++j) {
-            ProcessTreeNode(classes, roots_[j], x_data, current_weight_0);
+        for (int64_t i = first; i < last; ++i) {
+            Y_(i) = FinalizeRow(class_scores.data() + (i - first) * n_slots_,
+                                has_scores.data() + (i - first) * n_slots_,
+                                scores, (NTYPE*)Z_.data(i * class_count_));
         }
+    }
+    }
+}
 
-        float maxweight = 0.f;
-        int64_t maxclass = -1;
 
-        // write top class
-        int write_additional_scores = -1;
-        if (class_count_ > 2) {
-            // add base values
-            std::map<int64_t, float>::iterator it_classes;
-            for (int64_t k = 0, end = static_cast<int64_t>(base_values_.size()); k < end; ++k) {
-                it_classes = classes.find(k);
-                if (it_classes == classes.end()) {
-                    auto p1 = std::make_pair<int64_t&, const float&>(k, base_values_[k]);
-                    classes.insert(p1);
-                } 
-                else {
-                    it_classes->second += base_values_[k];
-                }
+template<typename NTYPE>
+void RuntimeTreeEnsembleClassifier<NTYPE>::compute_gil_free_trees(
+                int64_t N, int64_t stride, int64_t n_threads,
+                const NTYPE* x_data, int64_t* y_data, NTYPE* z_data) const {
+    // a small batch: trees are split across threads, every thread
+    // accumulates partial scores in its own buffer
+    int64_t size = N * n_slots_;
+    int64_t n_trees = static_cast<int64_t>(packed_roots_.size());
+    std::vector<NTYPE> class_scores(n_threads * size, 0.f);
+    std::vector<unsigned char> has_scores(n_threads * size, 0);
+    bool binned = use_binning();
+    int64_t n_bins = static_cast<int64_t>(bin_features_.size());
+    std::vector<uint16_t> bins(binned ? N * n_bins : 0);
+    if (binned)
+        bin_tree_features(x_data, stride, N, bin_features_, bin_offsets_,
+                          bin_thresholds_, bins.data());
+
+#ifdef USE_OPENMP
+#pragma omp parallel num_threads(n_threads) if(n_threads > 1)
+#endif
+    {
+#if USE_OPENMP
+    int64_t th = ::omp_get_thread_num() * size;
+#else
+    int64_t th = 0;
+#endif
+#ifdef USE_OPENMP
+#pragma omp for schedule(static)
+#endif
+    for (int64_t j = 0; j < n_trees; ++j) {
+        for (int64_t i = 0; i < N; ++i) {
+            int64_t k = th + i * n_slots_;
+            if (binned)
+                ProcessBinnedTreeNode(class_scores.data() + k, has_scores.data() + k,
+                                      packed_roots_[j], bins.data() + i * n_bins);
+            else
+                ProcessTreeNode(class_scores.data() + k, has_scores.data() + k,
+                                packed_roots_[j], x_data + i * stride);
+        }
+    }
+    }
+
+    // reduction in a fixed order, the result does not depend on
+    // the thread which processed a tree first
+    for (int64_t t = 1; t < n_threads; ++t) {
+        for (int64_t k = 0, kt = t * size; k < size; ++k, ++kt) {
+            if (has_scores[kt]) {
+                class_scores[k] += class_scores[kt];
+                has_scores[k] = 1;
             }
-            get_max_weight(classes, maxclass, maxweight);
-            Y_(i) = classlabels_int64s_[maxclass];
         }
-        else { // binary case
-            if (base_values_.size() == 2) {
-                // add base values
-                std::map<int64_t, float>::iterator it_classes;
-                it_classes = classes.find(1);
-                if (it_classes == classes.end()) {
-                    // base_value_[0] is not used. It assumes base_value[0] == base_value[1] in this case.
-                    // The specification does not forbid it but does not say what the output should be in that case.
-                    std::map<int64_t, float>::iterator it_classes0 = classes.find(0);
-                    classes[1] = base_values_[1] + it_classes0->second;
-                    it_classes0->second = -classes[1];
-                }
-                else {
-                    // binary as multiclass
-                    it_classes->second += base_values_[1];
-                    classes[0] += base_values_[0];
-                }
+    }
+
+    std::vector<NTYPE> scores;
+    scores.reserve(n_slots_ + 1);
+    for (int64_t i = 0; i < N; ++i) {
+        y_data[i] = FinalizeRow(class_scores.data() + i * n_slots_,
+                                has_scores.data() + i * n_slots_,
+                                scores, z_data + i * class_count_);
+    }
+}
+
+
+template<typename NTYPE>
+int64_t RuntimeTreeEnsembleClassifier<NTYPE>::FinalizeRow(NTYPE* class_scores,
+                                                   unsigned char* has_scores,
+                                                   std::vector<NTYPE>& scores,
+                                                   NTYPE* z_data) const {
+    int64_t label;
+    NTYPE maxweight = 0.f;
+    int64_t maxclass = -1;
+    scores.clear();
+
+    // write top class
+    int write_additional_scores = -1;
+    if (class_count_ > 2) {
+        // add base values
+        for (int64_t k = 0, end = static_cast<int64_t>(base_values_.size()); k < end; ++k) {
+            if (!has_scores[k]) {
+                has_scores[k] = 1;
+                class_scores[k] = base_values_[k];
+            }
+            else {
+                class_scores[k] += base_values_[k];
             }
-            Y_(i) = _set_score_binary(i, write_additional_scores,
-                              weights_are_all_positive_,
-                              classes, classlabels_int64s_,
-                              weights_classes_, (int64_t)1, (int64_t)0);            
         }
-        // write float values, might not have all the classes in the output yet
-        // for example a 10 class case where we only found 2 classes in the leaves
-        if (weights_classes_.size() == static_cast<size_t>(class_count_)) {
-            for (int64_t k = 0; k < class_count_; ++k) {
-                auto it_classes = classes.find(k);
-                scores.push_back(it_classes != classes.end() ? it_classes->second : 0.f);
+        get_max_weight(class_scores, has_scores, n_slots_, maxclass, maxweight);
+        label = classlabels_int64s_[maxclass];
+    }
+    else { // binary case
+        if (base_values_.size() == 2) {
+            // add base values
+            if (!has_scores[1]) {
+                // base_value_[0] is not used. It assumes base_value[0] == base_value[1] in this case.
+                // The specification does not forbid it but does not say what the output should be in that case.
+                class_scores[1] = base_values_[1] + class_scores[0];
+                class_scores[0] = -class_scores[1];
+                has_scores[0] = 1;
+                has_scores[1] = 1;
+            }
+            else {
+                // binary as multiclass
+                class_scores[1] += base_values_[1];
+                class_scores[0] += base_values_[0];
+                has_scores[0] = 1;
             }
-        } 
-        else {
-            for (auto& classe : classes)
-                scores.push_back(classe.second);
         }
-        
-        write_scores(scores, post_transform_, (float*)Z_.data(i * class_count_),
-                     write_additional_scores);
+        label = _set_score_binary(write_additional_scores,
+                                  weights_are_all_positive_,
+                                  class_scores, has_scores, n_slots_,
+                                  classlabels_int64s_,
+                                  weights_classes_, (int64_t)1, (int64_t)0);
     }
+    // write float values, might not have all the classes in the output yet
+    // for example a 10 class case where we only found 2 classes in the leaves
+    if (weights_classes_.size() == static_cast<size_t>(class_count_)) {
+        for (int64_t k = 0; k < class_count_; ++k)
+            scores.push_back(has_scores[k] ? class_scores[k] : 0.f);
+    }
+    else {
+        for (int64_t k = 0; k < n_slots_; ++k) {
+            if (has_scores[k])
+                scores.push_back(class_scores[k]);
+        }
+    }
+
+    write_scores(scores, post_transform_, z_data, write_additional_scores);
+    return label;
 }
 
-void RuntimeTreeEnsembleClassifier::ProcessTreeNode(std::map<int64_t, float>& classes,
-                                                    int64_t treeindex,
-                                                    const float* x_data,
-                                                    int64_t feature_base) const {
-  // walk down tree to the leaf
-  bool tracktrue;
-  auto mode = nodes_modes_[treeindex];
-  int64_t loopcount = 0;
-  int64_t root = treeindex;
-  while (mode != NODE_MODE::LEAF) {
-    float val = x_data[feature_base + nodes_featureids_[treeindex]];
-    tracktrue = missing_tracks_true_.size() != nodes_truenodeids_.size()
-                ? false
-                : missing_tracks_true_[treeindex] && std::isnan(static_cast<float>(val));
-    float threshold = nodes_values_[treeindex];
-    switch (mode) {
-      case NODE_MODE::BRANCH_LEQ:
-        treeindex = val <= threshold || tracktrue
-                    ? nodes_truenodeids_[treeindex]
-                    : nodes_falsenodeids_[treeindex];
-        break;
-      case NODE_MODE::BRANCH_LT:
-        treeindex = val < threshold || tracktrue
-                    ? nodes_truenodeids_[treeindex]
-                    : nodes_falsenodeids_[treeindex];
-        break;
-      case NODE_MODE::BRANCH_GTE:
-        treeindex = val >= threshold || tracktrue
-                    ? nodes_truenodeids_[treeindex]
-                    : nodes_falsenodeids_[treeindex];
-        break;
-      case NODE_MODE::BRANCH_GT:
-        treeindex = val > threshold || tracktrue
-                    ? nodes_truenodeids_[treeindex]
-                    : nodes_falsenodeids_[treeindex];
-        break;
-      case NODE_MODE::BRANCH_EQ:
-        treeindex = val == threshold || tracktrue
-                    ? nodes_truenodeids_[treeindex]
-                    : nodes_falsenodeids_[treeindex];
-        break;
-      case NODE_MODE::BRANCH_NEQ:
-        treeindex = val != threshold || tracktrue
-                    ? nodes_truenodeids_[treeindex]
-                    : nodes_falsenodeids_[treeindex];
-        break;
-      default: {
-        std::ostringstream err_msg;
-        err_msg << "Invalid mode of value: " << static_cast<std::underlying_type<NODE_MODE>::type>(mode);
-        throw std::runtime_error(err_msg.str());
-      }
-    }
-    treeindex = treeindex + root;
-    mode = nodes_modes_[treeindex];
-    loopcount++;
-    if (loopcount > kMaxTreeDepth_) 
-        break;
-  }
-  // should be at leaf
-  int64_t id = nodes_treeids_[treeindex] * kOffset_ + nodes_nodeids_[treeindex];
-  auto it_lp = leafdata_map_.find(id);
-  if (it_lp == leafdata_map_.end())  // if not found, simply return
+template<typename NTYPE>
+void RuntimeTreeEnsembleClassifier<NTYPE>::ProcessTreeNode(NTYPE* class_scores,
+                                                    unsigned char* has_scores,
+                                                    int32_t treeindex,
+                                                    const NTYPE* x_data) const {
+  // walk down tree to the leaf, treeindex is the position of the root
+  // in packed_nodes_
+  const TreeNodeElement<NTYPE>* leaf = process_packed_tree(
+      packed_nodes_.data(), treeindex, x_data, kMaxTreeDepth_);
+  if (leaf->mode != static_cast<uint8_t>(NODE_MODE::LEAF))
+    return;  // maximum depth reached, a branch has no weight
+  ProcessLeaf(class_scores, has_scores, leaf->truenode, leaf->falsenode);
+}
+
+template<typename NTYPE>
+void RuntimeTreeEnsembleClassifier<NTYPE>::ProcessBinnedTreeNode(NTYPE* class_scores,
+                                                          unsigned char* has_scores,
+                                                          int32_t treeindex,
+                                                          const uint16_t* bins) const {
+  // same as ProcessTreeNode with binned features
+  const TreeBinnedNode* leaf = process_binned_tree(
+      binned_nodes_.data(), treeindex, bins, kMaxTreeDepth_);
+  if (leaf->mode != static_cast<uint8_t>(NODE_MODE::LEAF))
     return;
+  ProcessLeaf(class_scores, has_scores, leaf->truenode, leaf->feature_id);
+}
 
-  int64_t index = it_lp->second;
-  int64_t treeid = std::get<0>(leafnodedata_[index]);
-  int64_t nodeid = std::get<1>(leafnodedata_[index]);
-  while (treeid == nodes_treeids_[treeindex] && nodeid == nodes_nodeids_[treeindex]) {
-    int64_t classid = std::get<2>(leafnodedata_[index]);
-    float weight = std::get<3>(leafnodedata_[index]);
-    std::map<int64_t, float>::iterator it_classes;
-    it_classes = classes.find(classid);
-    if (it_classes != classes.end()) {
-      it_classes->second += weight;
-    } else {
-      auto p1 = std::make_pair(classid, weight);
-      classes.insert(p1);
-    }
-    ++index;
-    // some tree node will be last
-    if (index >= static_cast<int64_t>(leafnodedata_.size())) {
-      break;
-    }
-    treeid = std::get<0>(leafnodedata_[index]);
-    nodeid = std::get<1>(leafnodedata_[index]);
+template<typename NTYPE>
+void RuntimeTreeEnsembleClassifier<NTYPE>::ProcessLeaf(NTYPE* class_scores,
+                                                unsigned char* has_scores,
+                                                int32_t first, int32_t last) const {
+  // the leaf points to its weights
+  for (int32_t k = first; k < last; ++k) {
+    const TreeLeafWeight<NTYPE>& w = leaf_weights_[k];
+    class_scores[w.id] += w.weight;
+    has_scores[w.id] = 1;
   }
 }
 
+class RuntimeTreeEnsembleClassifierFloat : public RuntimeTreeEnsembleClassifier<float>
+{
+    public:
+        RuntimeTreeEnsembleClassifierFloat() : RuntimeTreeEnsembleClassifier<float>() {}
+};
+
+
+class RuntimeTreeEnsembleClassifierDouble : public RuntimeTreeEnsembleClassifier<double>
+{
+    public:
+        RuntimeTreeEnsembleClassifierDouble() : RuntimeTreeEnsembleClassifier<double>() {}
+};
+
+
 #ifndef SKIP_PYTHON
 
 PYBIND11_MODULE(op_tree_ensemble_classifier_, m) {
@@ -548,22 +783,109 @@ in :epkg:`onnxruntime`.)pbdoc"
     #endif
     ;
 
-    py::class_<RuntimeTreeEnsembleClassifier> cl (m, "RuntimeTreeEnsembleClassifier",
-        R"pbdoc(Implements runtime for operator TreeEnsembleClassifier. The code is inspired from
+    py::class_<RuntimeTreeEnsembleClassifierFloat> clf (m, "RuntimeTreeEnsembleClassifierFloat",
+        R"pbdoc(Implements float runtime for operator TreeEnsembleClassifier. The code is inspired from
+`tree_ensemble_classifier.cc <https://github.com/microsoft/onnxruntime/blob/master/onnxruntime/core/providers/cpu/ml/tree_ensemble_classifier.cc>`_
+in :epkg:`onnxruntime`.)pbdoc");
+
+    clf.def(py::init<>());
+    clf.def_readonly("n_slots_", &RuntimeTreeEnsembleClassifierFloat::n_slots_,
+                     "Returns the number of scores computed for every row, "
+                     "at least the number of classes.");
+    clf.def_readonly("roots_", &RuntimeTreeEnsembleClassifierFloat::roots_,
+                     "Returns the roots indices.");
+    clf.def_readonly("packed_roots_", &RuntimeTreeEnsembleClassifierFloat::packed_roots_,
+                     "Returns the position of every root in the packed nodes.");
+    clf.def("init", &RuntimeTreeEnsembleClassifierFloat::init,
+            "Initializes the runtime with the ONNX attributes in alphabetical order.");
+    clf.def("compute", &RuntimeTreeEnsembleClassifierFloat::compute,
+            "Computes the predictions for the random forest.");
+    clf.def("finalize_scores", &RuntimeTreeEnsembleClassifierFloat::finalize_scores,
+            "Adds the base values, computes the labels and applies the post transform "
+            "to scores of shape (N, n_slots) already summed over all trees, "
+            "*has_scores* tells which class received a score.");
+    clf.def("runtime_options", &RuntimeTreeEnsembleClassifierFloat::runtime_options,
+            "Returns indications about how the runtime was compiled.");
+    clf.def("omp_get_max_threads", &RuntimeTreeEnsembleClassifierFloat::omp_get_max_threads,
+            "Returns omp_get_max_threads from openmp library.");
+    clf.def("set_num_threads", &RuntimeTreeEnsembleClassifierFloat::set_num_threads, py::arg("n_threads"),
+            "Sets the number of threads used by this instance, 0 for the default "
+            "number of threads of the openmp library.");
+    clf.def("set_schedule", &RuntimeTreeEnsembleClassifierFloat::set_schedule, py::arg("kind"), py::arg("chunk_size") = 0,
+            "Sets how rows are distributed across threads, *kind* is ``'static'`` "
+            "or ``'dynamic'``, *chunk_size* is the number of blocks of rows a thread "
+            "takes at once, 0 for the default.");
+    clf.def("set_parallel_threshold", &RuntimeTreeEnsembleClassifierFloat::set_parallel_threshold, py::arg("n_rows"),
+            "A batch with less than *n_rows* rows is computed by the calling thread "
+            "without opening a parallel region.");
+    clf.def("schedule", &RuntimeTreeEnsembleClassifierFloat::schedule,
+            "Returns how a batch of *n_rows* is processed, ``ROWS``: every row goes through all trees, "
+            "``BLOCKS:<n>``: blocks of n rows go through a tree before the next one, "
+            "``TREES``: trees are split across threads.");
+    clf.def_readwrite("block_size_", &RuntimeTreeEnsembleClassifierFloat::block_size_,
+                      "Maximum number of rows walked through a tree before going to the next tree, "
+                      "1 to process every row through all trees before the next row.");
+    clf.def_readwrite("tree_parallel_threshold_", &RuntimeTreeEnsembleClassifierFloat::tree_parallel_threshold_,
+                      "Batches with fewer rows are computed by splitting the trees across threads, "
+                      "0 to always parallelize over rows.");
+    clf.def_readwrite("binning_", &RuntimeTreeEnsembleClassifierFloat::binning_,
+                     "Bins the features before walking the trees, thresholds become "
+                     "small integers, it is ignored if a feature has too many distinct thresholds, "
+                     "*init* enables it if it is expected to be faster.");
+    clf.def_readonly("bin_features_", &RuntimeTreeEnsembleClassifierFloat::bin_features_,
+                     "Returns the features the trees use, empty if features cannot be binned.");
+
+    py::class_<RuntimeTreeEnsembleClassifierDouble> cld (m, "RuntimeTreeEnsembleClassifierDouble",
+        R"pbdoc(Implements double runtime for operator TreeEnsembleClassifier. The code is inspired from
 `tree_ensemble_classifier.cc <https://github.com/microsoft/onnxruntime/blob/master/onnxruntime/core/providers/cpu/ml/tree_ensemble_classifier.cc>`_
 in :epkg:`onnxruntime`.)pbdoc");
 
-    cl.def(py::init<>());
-    cl.def_readonly("roots_", &RuntimeTreeEnsembleClassifier::roots_,
-                    "Returns the roots indices.");
-    cl.def("init", &RuntimeTreeEnsembleClassifier::init,
-           "Initializes the runtime with the ONNX attributes in alphabetical order.");
-    cl.def("compute", &RuntimeTreeEnsembleClassifier::compute,
-           "Computes the predictions for the random forest.");
-    cl.def("runtime_options", &RuntimeTreeEnsembleClassifier::runtime_options,
-           "Returns indications about how the runtime was compiled.");
-    cl.def("omp_get_max_threads", &RuntimeTreeEnsembleClassifier::omp_get_max_threads,
-           "Returns omp_get_max_threads from openmp library.");
+    cld.def(py::init<>());
+    cld.def_readonly("n_slots_", &RuntimeTreeEnsembleClassifierDouble::n_slots_,
+                     "Returns the number of scores computed for every row, "
+                     "at least the number of classes.");
+    cld.def_readonly("roots_", &RuntimeTreeEnsembleClassifierDouble::roots_,
+                     "Returns the roots indices.");
+    cld.def_readonly("packed_roots_", &RuntimeTreeEnsembleClassifierDouble::packed_roots_,
+                     "Returns the position of every root in the packed nodes.");
+    cld.def("init", &RuntimeTreeEnsembleClassifierDouble::init,
+            "Initializes the runtime with the ONNX attributes in alphabetical order.");
+    cld.def("compute", &RuntimeTreeEnsembleClassifierDouble::compute,
+            "Computes the predictions for the random forest.");
+    cld.def("finalize_scores", &RuntimeTreeEnsembleClassifierDouble::finalize_scores,
+            "Adds the base values, computes the labels and applies the post transform "
+            "to scores of shape (N, n_slots) already summed over all trees, "
+            "*has_scores* tells which class received a score.");
+    cld.def("runtime_options", &RuntimeTreeEnsembleClassifierDouble::runtime_options,
+            "Returns indications about how the runtime was compiled.");
+    cld.def("omp_get_max_threads", &RuntimeTreeEnsembleClassifierDouble::omp_get_max_threads,
+            "Returns omp_get_max_threads from openmp library.");
+    cld.def("set_num_threads", &RuntimeTreeEnsembleClassifierDouble::set_num_threads, py::arg("n_threads"),
+            "Sets the number of threads used by this instance, 0 for the default "
+            "number of threads of the openmp library.");
+    cld.def("set_schedule", &RuntimeTreeEnsembleClassifierDouble::set_schedule, py::arg("kind"), py::arg("chunk_size") = 0,
+            "Sets how rows are distributed across threads, *kind* is ``'static'`` "
+            "or ``'dynamic'``, *chunk_size* is the number of blocks of rows a thread "
+            "takes at once, 0 for the default.");
+    cld.def("set_parallel_threshold", &RuntimeTreeEnsembleClassifierDouble::set_parallel_threshold, py::arg("n_rows"),
+            "A batch with less than *n_rows* rows is computed by the calling thread "
+            "without opening a parallel region.");
+    cld.def("schedule", &RuntimeTreeEnsembleClassifierDouble::schedule,
+            "Returns how a batch of *n_rows* is processed, ``ROWS``: every row goes through all trees, "
+            "``BLOCKS:<n>``: blocks of n rows go through a tree before the next one, "
+            "``TREES``: trees are split across threads.");
+    cld.def_readwrite("block_size_", &RuntimeTreeEnsembleClassifierDouble::block_size_,
+                      "Maximum number of rows walked through a tree before going to the next tree, "
+                      "1 to process every row through all trees before the next row.");
+    cld.def_readwrite("tree_parallel_threshold_", &RuntimeTreeEnsembleClassifierDouble::tree_parallel_threshold_,
+                      "Batches with fewer rows are computed by splitting the trees across threads, "
+                      "0 to always parallelize over rows.");
+    cld.def_readwrite("binning_", &RuntimeTreeEnsembleClassifierDouble::binning_,
+                     "Bins the features before walking the trees, thresholds become "
+                     "small integers, it is ignored if a feature has too many distinct thresholds, "
+                     "*init* enables it if it is expected to be faster.");
+    cld.def_readonly("bin_features_", &RuntimeTreeEnsembleClassifierDouble::bin_features_,
+                     "Returns the features the trees use, empty if features cannot be binned.");
 }
 
 #endif
@@ -51,11 +51,21 @@ class RuntimeTreeEnsembleRegressor
         POST_EVAL_TRANSFORM post_transform_;
         AGGREGATE_FUNCTION aggregate_function_;
         std::vector<std::tuple<int64_t, int64_t, int64_t, NTYPE>> leafnode_data_;
-        std::unordered_map<int64_t, size_t> leafdata_map_;
         std::vector<int64_t> roots_;
+        std::vector<TreeNodeElement<NTYPE>> packed_nodes_;
+        std::vector<TreeLeafWeight<NTYPE>> leaf_weights_;
+        std::vector<int32_t> packed_roots_;
+        std::vector<TreeBinnedNode> binned_nodes_;
+        std::vector<int32_t> bin_features_;
+        std::vector<int64_t> bin_offsets_;
+        std::vector<NTYPE> bin_thresholds_;
         int64_t offset_;
         int64_t max_tree_depth_;
+        int64_t block_size_;
+        int64_t tree_parallel_threshold_;
+        bool binning_;
         const int64_t four_billion_ = 4000000000L;
+        ParallelSettings parallel_;
     
     public:
         
@@ -84,26 +94,58 @@ class RuntimeTreeEnsembleRegressor
         
         py::array_t<NTYPE> compute(py::array_t<NTYPE> X) const;
 
-        void ProcessTreeNode(std::unordered_map <int64_t, std::tuple<NTYPE, NTYPE, NTYPE>>& classes,
-                             int64_t treeindex,
-                             const NTYPE* x_data,
-                             int64_t feature_base) const;
+        py::array_t<NTYPE> finalize_scores(py::array_t<NTYPE> scores,
+                                           py::array_t<unsigned char> has_scores) const;
+
+        void ProcessTreeNode(NTYPE* sums, NTYPE* mins, NTYPE* maxs,
+                             unsigned char* has_scores,
+                             int32_t treeindex,
+                             const NTYPE* x_data) const;
+
+        void ProcessBinnedTreeNode(NTYPE* sums, NTYPE* mins, NTYPE* maxs,
+                                   unsigned char* has_scores,
+                                   int32_t treeindex,
+                                   const uint16_t* bins) const;
+
+        bool use_binning() const;
     
         std::string runtime_options();
 
+        std::string schedule(int64_t n_rows);
+
         int omp_get_max_threads();
 
+        void set_num_threads(int64_t n_threads);
+
+        void set_schedule(const std::string& kind, int64_t chunk_size);
+
+        void set_parallel_threshold(int64_t n_rows);
+
 private:
 
         void Initialize();
     
         void compute_gil_free(const std::vector<int64_t>& x_dims, int64_t N, int64_t stride,
                               const py::array_t<NTYPE>& X, py::array_t<NTYPE>& Z) const;
+
+        void compute_gil_free_trees(int64_t N, int64_t stride, int64_t n_threads,
+                                    const NTYPE* x_data, NTYPE* z_data) const;
+
+        void FinalizeRow(const NTYPE* sums, const NTYPE* mins, const NTYPE* maxs,
+                         const unsigned char* has_scores, std::vector<NTYPE>& outputs,
+                         NTYPE* z_data) const;
+
+        void ProcessLeaf(NTYPE* sums, NTYPE* mins, NTYPE* maxs,
+                         unsigned char* has_scores,
+                         int32_t first, int32_t last) const;
 };
 
 
 template<typename NTYPE>
 RuntimeTreeEnsembleRegressor<NTYPE>::RuntimeTreeEnsembleRegressor() {
+    block_size_ = 128;
+    tree_parallel_threshold_ = 8;
+    binning_ = false;
 }
 
 
@@ -118,10 +160,32 @@ std::string RuntimeTreeEnsembleRegressor<NTYPE>::runtime_options() {
 #ifdef USE_OPENMP
     res += "OPENMP";
 #endif
+    if (!res.empty())
+        res += " ";
+    res += "BLOCK_SIZE=" + std::to_string(block_size_);
+    res += " TREE_PARALLEL_THRESHOLD=" + std::to_string(tree_parallel_threshold_);
+    if (use_binning())
+        res += " BINNING";
+    res += parallel_.to_string();
     return res;
 }
 
 
+template<typename NTYPE>
+bool RuntimeTreeEnsembleRegressor<NTYPE>::use_binning() const {
+    return binning_ && !binned_nodes_.empty();
+}
+
+
+template<typename NTYPE>
+std::string RuntimeTreeEnsembleRegressor<NTYPE>::schedule(int64_t n_rows) {
+    if (use_tree_parallel(n_rows, packed_roots_.size(), tree_parallel_threshold_))
+        return "TREES";
+    int64_t block = choose_tree_block_size(n_rows, parallel_.num_threads(n_rows), block_size_);
+    return block == 1 ? std::string("ROWS") : "BLOCKS:" + std::to_string(block);
+}
+
+
 template<typename NTYPE>
 int RuntimeTreeEnsembleRegressor<NTYPE>::omp_get_max_threads() {
 #if USE_OPENMP
@@ -132,6 +196,24 @@ int RuntimeTreeEnsembleRegressor<NTYPE>::omp_get_max_threads() {
 }
 
 
+template<typename NTYPE>
+void RuntimeTreeEnsembleRegressor<NTYPE>::set_num_threads(int64_t n_threads) {
+    parallel_.set_num_threads(n_threads);
+}
+
+
+template<typename NTYPE>
+void RuntimeTreeEnsembleRegressor<NTYPE>::set_schedule(const std::string& kind, int64_t chunk_size) {
+    parallel_.set_schedule(kind, chunk_size);
+}
+
+
+template<typename NTYPE>
+void RuntimeTreeEnsembleRegressor<NTYPE>::set_parallel_threshold(int64_t n_rows) {
+    parallel_.set_threshold(n_rows);
+}
+
+
 template<typename NTYPE>
 void RuntimeTreeEnsembleRegressor<NTYPE>::init(
             const std::string &aggregate_function,
@@ -221,20 +303,6 @@ void RuntimeTreeEnsembleRegressor<NTYPE>::Initialize() {
         return std::get<1>(t1) < std::get<1>(t2);
   });
   
-  //make an index so we can find the leafnode data quickly when evaluating
-  int64_t field0 = -1;
-  int64_t field1 = -1;
-  for (size_t i = 0; i < leafnode_data_.size(); i++) {
-    int64_t id0 = std::get<0>(leafnode_data_[i]);
-    int64_t id1 = std::get<1>(leafnode_data_[i]);
-    if (id0 != field0 || id1 != field1) {
-      int64_t id = id0 * four_billion_ + id1;
-      auto p3 = std::make_pair(id, i);  // position is i
-      leafdata_map_.insert(p3);
-      field0 = id;
-      field1 = static_cast<int64_t>(i);
-    }
-  }
   //treenode ids, some are roots, and roots have no parents
   std::unordered_map<int64_t, size_t> parents;  //holds count of all who point to you
   std::unordered_map<int64_t, size_t> indices;
@@ -279,6 +347,23 @@ void RuntimeTreeEnsembleRegressor<NTYPE>::Initialize() {
       roots_.push_back(it->second);
     }
   }
+  // nodes are packed into a single array, every tree is stored breadth-first
+  pack_tree_nodes(packed_nodes_, packed_roots_, roots_, nodes_modes_,
+                  nodes_featureids_, nodes_values_, nodes_truenodeids_,
+                  nodes_falsenodeids_, missing_tracks_true_);
+  // every leaf points to a contiguous range of weights
+  link_tree_leaves(packed_nodes_, leaf_weights_, nodes_treeids_, nodes_nodeids_,
+                   leafnode_data_);
+  for (auto& w : leaf_weights_) {
+    if (w.id < 0 || w.id >= n_targets_)
+      throw std::runtime_error("target_ids must be in [0, n_targets[.");
+  }
+  // thresholds replaced by bins, binned_nodes_ remains empty
+  // if a feature has too many distinct thresholds, binning is only
+  // enabled by default if it is expected to be faster
+  binning_ = bin_tree_nodes(packed_nodes_, binned_nodes_, bin_features_,
+                            bin_offsets_, bin_thresholds_) &&
+             tree_binning_is_faster(binned_nodes_, packed_roots_.size(), bin_offsets_);
 }
 
 
@@ -307,6 +392,33 @@ py::array_t<NTYPE> RuntimeTreeEnsembleRegressor<NTYPE>::compute(py::array_t<NTYP
 }
 
 
+template<typename NTYPE>
+py::array_t<NTYPE> RuntimeTreeEnsembleRegressor<NTYPE>::finalize_scores(
+        py::array_t<NTYPE> scores, py::array_t<unsigned char> has_scores) const {
+    // scores were aggregated by another implementation (see mlprodict.cc),
+    // only the base values and the post transform remain
+    if (scores.ndim() != 2 || scores.shape(1) != n_targets_ ||
+            has_scores.ndim() != 2 || has_scores.shape(0) != scores.shape(0) ||
+            has_scores.shape(1) != n_targets_)
+        throw std::runtime_error("scores and has_scores must have shape (N, n_targets).");
+    int64_t N = scores.shape(0);
+    py::array_t<NTYPE> Z(N * n_targets_);
+    const NTYPE* s = scores.data(0, 0);
+    const unsigned char* h = has_scores.data(0, 0);
+    NTYPE* z = (NTYPE*)Z.data(0);
+    {
+        py::gil_scoped_release release;
+        std::vector<NTYPE> outputs(n_targets_);
+        for (int64_t i = 0; i < N; ++i) {
+            int64_t k = i * n_targets_;
+            // only one of sums, mins, maxs is used depending on the aggregation
+            FinalizeRow(s + k, s + k, s + k, h + k, outputs, z + k);
+        }
+    }
+    return Z;
+}
+
+
 py::detail::unchecked_mutable_reference<float, 1> _mutable_unchecked1(py::array_t<float>& Z) {
     return Z.mutable_unchecked<1>();
 }
@@ -327,129 +439,213 @@ void RuntimeTreeEnsembleRegressor<NTYPE>::compute_gil_free(
                     
     const NTYPE* x_data = X.data(0);
                     
+  int64_t n_threads = parallel_.num_threads(N);
+  parallel_.apply_schedule();
+  if (use_tree_parallel(N, packed_roots_.size(), tree_parallel_threshold_)) {
+    compute_gil_free_trees(N, stride, n_threads, x_data, (NTYPE*)Z_.data(0));
+    return;
+  }
+
+  // a block of rows walks through a tree before the next tree
+  int64_t block = choose_tree_block_size(N, n_threads, block_size_);
+  int64_t n_blocks = (N + block - 1) / block;
+  bool binned = use_binning();
+  int64_t n_bins = static_cast<int64_t>(bin_features_.size());
+
 #ifdef USE_OPENMP
-#pragma omp parallel for
+#pragma omp parallel num_threads(n_threads) if(n_threads > 1)
 #endif
-  for (int64_t i = 0; i < N; i++)  //for each class
   {
-    int64_t current_weight_0 = i * stride;
-    std::unordered_map<int64_t, std::tuple<NTYPE, NTYPE, NTYPE>> scores; // sum, min, max
-    //for each tree
-    for (size_t j = 0; j < roots_.size(); j++) {
-      //walk each tree from its root
-      ProcessTreeNode(scores, roots_[j], x_data, current_weight_0);
-    }
-    //find aggregate, could use a heap here if there are many classes
-    std::vector<NTYPE> outputs;
-    for (int64_t j = 0; j < n_targets_; j++) {
-      //reweight scores based on number of voters
-      auto it_scores = scores.find(j);
-      NTYPE val = base_values_.size() == (size_t)n_targets_ ? base_values_[j] : 0.f;
-      if (it_scores != scores.end()) {
-        if (aggregate_function_ == AGGREGATE_FUNCTION::AVERAGE) {
-          val += std::get<0>(scores[j]) / roots_.size();   //first element of tuple is already a sum
-        } else if (aggregate_function_ == AGGREGATE_FUNCTION::SUM) {
-          val += std::get<0>(scores[j]);
-        } else if (aggregate_function_ == AGGREGATE_FUNCTION::MIN) {
-          val += std::get<1>(scores[j]);  // second element of tuple is min
-        } else if (aggregate_function_ == AGGREGATE_FUNCTION::MAX) {
-          val += std::get<2>(scores[j]);  // third element of tuple is max
+    // buffers allocated once per thread
+    std::vector<NTYPE> sums(block * n_targets_), mins(block * n_targets_), maxs(block * n_targets_);
+    std::vector<unsigned char> has_scores(block * n_targets_);
+    std::vector<NTYPE> outputs(n_targets_);
+    std::vector<uint16_t> bins(binned ? block * n_bins : 0);
+
+#ifdef USE_OPENMP
+#pragma omp for schedule(runtime)
+#endif
+    for (int64_t b = 0; b < n_blocks; b++)  //for each block of rows
+    {
+      int64_t first = b * block;
+      int64_t last = first + block < N ? first + block : N;
+      std::fill(sums.begin(), sums.end(), (NTYPE)0);
+      std::fill(has_scores.begin(), has_scores.end(), 0);
+      if (binned) {
+        //features are binned once for all trees
+        bin_tree_features(x_data + first * stride, stride, last - first, bin_features_,
+                          bin_offsets_, bin_thresholds_, bins.data());
+        for (size_t j = 0; j < packed_roots_.size(); j++) {
+          for (int64_t i = first; i < last; ++i) {
+            int64_t k = (i - first) * n_targets_;
+            ProcessBinnedTreeNode(sums.data() + k, mins.data() + k, maxs.data() + k,
+                                  has_scores.data() + k, packed_roots_[j],
+                                  bins.data() + (i - first) * n_bins);
+          }
         }
       }
-      outputs.push_back(val);
+      else {
+        //for each tree
+        for (size_t j = 0; j < packed_roots_.size(); j++) {
+          //walk each tree from its root
+          for (int64_t i = first; i < last; ++i) {
+            int64_t k = (i - first) * n_targets_;
+            ProcessTreeNode(sums.data() + k, mins.data() + k, maxs.data() + k,
+                            has_scores.data() + k, packed_roots_[j], x_data + i * stride);
+          }
+        }
+      }
+      for (int64_t i = first; i < last; ++i) {
+        int64_t k = (i - first) * n_targets_;
+        FinalizeRow(sums.data() + k, mins.data() + k, maxs.data() + k,
+                    has_scores.data() + k, outputs, (NTYPE*)Z_.data(i * n_targets_));
+      }
     }
-    write_scores(outputs, post_transform_, (NTYPE*)Z_.data(i * n_targets_), -1);
   }
 }
 
+
 template<typename NTYPE>
-void RuntimeTreeEnsembleRegressor<NTYPE>::ProcessTreeNode(
-        std::unordered_map < int64_t, std::tuple<NTYPE, NTYPE, NTYPE>>& classes,
-        int64_t treeindex,
-        const NTYPE* x_data,
-        int64_t feature_base) const {
-  //walk down tree to the leaf
-  auto mode = nodes_modes_[treeindex];
-  int64_t loopcount = 0;
-  int64_t root = treeindex;
-  while (mode != NODE_MODE::LEAF) {
-    NTYPE val = x_data[feature_base + nodes_featureids_[treeindex]];
-    bool tracktrue = missing_tracks_true_.size() != nodes_truenodeids_.size()
-                     ? false
-                     : (missing_tracks_true_[treeindex] != 0) && std::isnan(val);
-    NTYPE threshold = nodes_values_[treeindex];
-    switch(mode) {
-        case NODE_MODE::BRANCH_LEQ:
-            treeindex = val <= threshold || tracktrue 
-                        ? nodes_truenodeids_[treeindex]
-                        : nodes_falsenodeids_[treeindex];
-            break;
-        case NODE_MODE::BRANCH_LT:
-            treeindex = val < threshold || tracktrue
-                        ? nodes_truenodeids_[treeindex]
-                        : nodes_falsenodeids_[treeindex];
-            break;
-        case NODE_MODE::BRANCH_GTE:
-            treeindex = val >= threshold || tracktrue
-                        ? nodes_truenodeids_[treeindex]
-                        : nodes_falsenodeids_[treeindex];
-            break;
-        case NODE_MODE::BRANCH_GT:
-            treeindex = val > threshold || tracktrue
-                        ? nodes_truenodeids_[treeindex]
-                        : nodes_falsenodeids_[treeindex];
-            break;
-        case NODE_MODE::BRANCH_EQ:
-            treeindex = val == threshold || tracktrue
-                        ? nodes_truenodeids_[treeindex]
-                        : nodes_falsenodeids_[treeindex];
-            break;
-        case NODE_MODE::BRANCH_NEQ:
-            treeindex = val != threshold || tracktrue
-                        ? nodes_truenodeids_[treeindex]
-                        : nodes_falsenodeids_[treeindex];
-            break;
-        default:
-            throw std::runtime_error("unknown node mode");
-    }
+void RuntimeTreeEnsembleRegressor<NTYPE>::compute_gil_free_trees(
+                int64_t N, int64_t stride, int64_t n_threads,
+                const NTYPE* x_data, NTYPE* z_data) const {
+  // a small batch: trees are split across threads, every thread
+  // accumulates partial scores in its own buffer
+  int64_t size = N * n_targets_;
+  int64_t n_trees = static_cast<int64_t>(packed_roots_.size());
+  std::vector<NTYPE> sums(n_threads * size), mins(n_threads * size), maxs(n_threads * size);
+  std::vector<unsigned char> has_scores(n_threads * size, 0);
+  bool binned = use_binning();
+  int64_t n_bins = static_cast<int64_t>(bin_features_.size());
+  std::vector<uint16_t> bins(binned ? N * n_bins : 0);
+  if (binned)
+    bin_tree_features(x_data, stride, N, bin_features_, bin_offsets_,
+                      bin_thresholds_, bins.data());
 
-    if (treeindex < 0) {
-      throw std::runtime_error("treeindex evaluated to a negative value, which should not happen.");
+#ifdef USE_OPENMP
+#pragma omp parallel num_threads(n_threads) if(n_threads > 1)
+#endif
+  {
+#if USE_OPENMP
+    int64_t th = ::omp_get_thread_num() * size;
+#else
+    int64_t th = 0;
+#endif
+#ifdef USE_OPENMP
+#pragma omp for schedule(static)
+#endif
+    for (int64_t j = 0; j < n_trees; ++j) {
+      for (int64_t i = 0; i < N; ++i) {
+        int64_t k = th + i * n_targets_;
+        if (binned)
+          ProcessBinnedTreeNode(sums.data() + k, mins.data() + k, maxs.data() + k,
+                                has_scores.data() + k, packed_roots_[j],
+                                bins.data() + i * n_bins);
+        else
+          ProcessTreeNode(sums.data() + k, mins.data() + k, maxs.data() + k,
+                          has_scores.data() + k, packed_roots_[j], x_data + i * stride);
+      }
     }
-    treeindex = treeindex + root;
-    mode = nodes_modes_[treeindex];
-    loopcount++;
-    if (loopcount > max_tree_depth_) 
-      break;
   }
-  //should be at leaf
-  int64_t id = nodes_treeids_[treeindex] * four_billion_ + nodes_nodeids_[treeindex];
-  //auto it_lp = leafdata_map.find(id);
-  auto it_lp = leafdata_map_.find(id);
-  if (it_lp != leafdata_map_.end()) {
-    size_t index = it_lp->second;
-    int64_t treeid = std::get<0>(leafnode_data_[index]);
-    int64_t nodeid = std::get<1>(leafnode_data_[index]);
-    while (treeid == nodes_treeids_[treeindex] && nodeid == nodes_nodeids_[treeindex]) {
-      int64_t classid = std::get<2>(leafnode_data_[index]);
-      NTYPE weight = std::get<3>(leafnode_data_[index]);
-      auto it_classes = classes.find(classid);
-      if (it_classes != classes.end()) {
-        auto& tuple = it_classes->second;
-        std::get<0>(tuple) += weight;
-        if (weight < std::get<1>(tuple)) std::get<1>(tuple) = weight;
-        if (weight > std::get<2>(tuple)) std::get<2>(tuple) = weight;
+
+  // reduction in a fixed order, the result does not depend on
+  // the thread which processed a tree first
+  for (int64_t t = 1; t < n_threads; ++t) {
+    for (int64_t k = 0, kt = t * size; k < size; ++k, ++kt) {
+      if (!has_scores[kt])
+        continue;
+      if (has_scores[k]) {
+        sums[k] += sums[kt];
+        if (mins[kt] < mins[k]) mins[k] = mins[kt];
+        if (maxs[kt] > maxs[k]) maxs[k] = maxs[kt];
       } else {
-        std::tuple<NTYPE, NTYPE, NTYPE> tuple = std::make_tuple(weight, weight, weight);
-        auto p1 = std::make_pair(classid, tuple);
-        classes.insert(p1);
+        has_scores[k] = 1;
+        sums[k] = sums[kt];
+        mins[k] = mins[kt];
+        maxs[k] = maxs[kt];
       }
-      index++;
-      if (index >= leafnode_data_.size()) {
-        break;
+    }
+  }
+
+  std::vector<NTYPE> outputs(n_targets_);
+  for (int64_t i = 0; i < N; ++i) {
+    int64_t k = i * n_targets_;
+    FinalizeRow(sums.data() + k, mins.data() + k, maxs.data() + k,
+                has_scores.data() + k, outputs, z_data + k);
+  }
+}
+
+
+template<typename NTYPE>
+void RuntimeTreeEnsembleRegressor<NTYPE>::FinalizeRow(
+        const NTYPE* sums, const NTYPE* mins, const NTYPE* maxs,
+        const unsigned char* has_scores, std::vector<NTYPE>& outputs,
+        NTYPE* z_data) const {
+  for (int64_t j = 0; j < n_targets_; j++) {
+    //reweight scores based on number of voters
+    NTYPE val = base_values_.size() == (size_t)n_targets_ ? base_values_[j] : 0.f;
+    if (has_scores[j]) {
+      if (aggregate_function_ == AGGREGATE_FUNCTION::AVERAGE) {
+        val += sums[j] / roots_.size();
+      } else if (aggregate_function_ == AGGREGATE_FUNCTION::SUM) {
+        val += sums[j];
+      } else if (aggregate_function_ == AGGREGATE_FUNCTION::MIN) {
+        val += mins[j];
+      } else if (aggregate_function_ == AGGREGATE_FUNCTION::MAX) {
+        val += maxs[j];
       }
-      treeid = std::get<0>(leafnode_data_[index]);
-      nodeid = std::get<1>(leafnode_data_[index]);
+    }
+    outputs[j] = val;
+  }
+  write_scores(outputs, post_transform_, z_data, -1);
+}
+
+template<typename NTYPE>
+void RuntimeTreeEnsembleRegressor<NTYPE>::ProcessTreeNode(
+        NTYPE* sums, NTYPE* mins, NTYPE* maxs,
+        unsigned char* has_scores,
+        int32_t treeindex,
+        const NTYPE* x_data) const {
+  //walk down tree to the leaf, treeindex is the position of the root
+  //in packed_nodes_
+  const TreeNodeElement<NTYPE>* leaf = process_packed_tree(
+      packed_nodes_.data(), treeindex, x_data, max_tree_depth_);
+  if (leaf->mode != static_cast<uint8_t>(NODE_MODE::LEAF))
+    return;  // maximum depth reached, a branch has no weight
+  ProcessLeaf(sums, mins, maxs, has_scores, leaf->truenode, leaf->falsenode);
+}
+
+
+template<typename NTYPE>
+void RuntimeTreeEnsembleRegressor<NTYPE>::ProcessBinnedTreeNode(
+        NTYPE* sums, NTYPE* mins, NTYPE* maxs,
+        unsigned char* has_scores,
+        int32_t treeindex,
+        const uint16_t* bins) const {
+  //same as ProcessTreeNode with binned features
+  const TreeBinnedNode* leaf = process_binned_tree(
+      binned_nodes_.data(), treeindex, bins, max_tree_depth_);
+  if (leaf->mode != static_cast<uint8_t>(NODE_MODE::LEAF))
+    return;
+  ProcessLeaf(sums, mins, maxs, has_scores, leaf->truenode, leaf->feature_id);
+}
+
+
+template<typename NTYPE>
+void RuntimeTreeEnsembleRegressor<NTYPE>::ProcessLeaf(
+        NTYPE* sums, NTYPE* mins, NTYPE* maxs,
+        unsigned char* has_scores,
+        int32_t first, int32_t last) const {
+  //the leaf points to its weights
+  for (int32_t k = first; k < last; ++k) {
+    const TreeLeafWeight<NTYPE>& w = leaf_weights_[k];
+    if (has_scores[w.id]) {
+      sums[w.id] += w.weight;
+      if (w.weight < mins[w.id]) mins[w.id] = w.weight;
+      if (w.weight > maxs[w.id]) maxs[w.id] = w.weight;
+    } else {
+      has_scores[w.id] = 1;
+      sums[w.id] = mins[w.id] = maxs[w.id] = w.weight;
     }
   }
 }
@@ -488,16 +684,51 @@ in :epkg:`onnxruntime`.)pbdoc"
 in :epkg:`onnxruntime`.)pbdoc");
 
     clf.def(py::init<>());
+    clf.def_readonly("n_targets_", &RuntimeTreeEnsembleRegressorFloat::n_targets_,
+                     "Returns the number of targets.");
     clf.def_readonly("roots_", &RuntimeTreeEnsembleRegressorFloat::roots_,
                      "Returns the roots indices.");
+    clf.def_readonly("packed_roots_", &RuntimeTreeEnsembleRegressorFloat::packed_roots_,
+                     "Returns the position of every root in the packed nodes.");
     clf.def("init", &RuntimeTreeEnsembleRegressorFloat::init,
             "Initializes the runtime with the ONNX attributes in alphabetical order.");
     clf.def("compute", &RuntimeTreeEnsembleRegressorFloat::compute,
             "Computes the predictions for the random forest.");
+    clf.def("finalize_scores", &RuntimeTreeEnsembleRegressorFloat::finalize_scores,
+            "Adds the base values and applies the post transform to scores "
+            "of shape (N, n_targets) already aggregated over all trees "
+            "(sum, minimum or maximum depending on the aggregation function), "
+            "*has_scores* tells which target received a score.");
     clf.def("runtime_options", &RuntimeTreeEnsembleRegressorFloat::runtime_options,
             "Returns indications about how the runtime was compiled.");
     clf.def("omp_get_max_threads", &RuntimeTreeEnsembleRegressorFloat::omp_get_max_threads,
             "Returns omp_get_max_threads from openmp library.");
+    clf.def("set_num_threads", &RuntimeTreeEnsembleRegressorFloat::set_num_threads, py::arg("n_threads"),
+            "Sets the number of threads used by this instance, 0 for the default "
+            "number of threads of the openmp library.");
+    clf.def("set_schedule", &RuntimeTreeEnsembleRegressorFloat::set_schedule, py::arg("kind"), py::arg("chunk_size") = 0,
+            "Sets how rows are distributed across threads, *kind* is ``'static'`` "
+            "or ``'dynamic'``, *chunk_size* is the number of blocks of rows a thread "
+            "takes at once, 0 for the default.");
+    clf.def("set_parallel_threshold", &RuntimeTreeEnsembleRegressorFloat::set_parallel_threshold, py::arg("n_rows"),
+            "A batch with less than *n_rows* rows is computed by the calling thread "
+            "without opening a parallel region.");
+    clf.def("schedule", &RuntimeTreeEnsembleRegressorFloat::schedule,
+            "Returns how a batch of *n_rows* is processed, ``ROWS``: every row goes through all trees, "
+            "``BLOCKS:<n>``: blocks of n rows go through a tree before the next one, "
+            "``TREES``: trees are split across threads.");
+    clf.def_readwrite("block_size_", &RuntimeTreeEnsembleRegressorFloat::block_size_,
+                     "Maximum number of rows walked through a tree before going to the next tree, "
+                     "1 to process every row through all trees before the next row.");
+    clf.def_readwrite("tree_parallel_threshold_", &RuntimeTreeEnsembleRegressorFloat::tree_parallel_threshold_,
+                     "Batches with fewer rows are computed by splitting the trees across threads, "
+                     "0 to always parallelize over rows.");
+    clf.def_readwrite("binning_", &RuntimeTreeEnsembleRegressorFloat::binning_,
+                     "Bins the features before walking the trees, thresholds become "
+                     "small integers, it is ignored if a feature has too many distinct thresholds, "
+                     "*init* enables it if it is expected to be faster.");
+    clf.def_readonly("bin_features_", &RuntimeTreeEnsembleRegressorFloat::bin_features_,
+                     "Returns the features the trees use, empty if features cannot be binned.");
 
     clf.def_readonly("nodes_treeids_", &RuntimeTreeEnsembleRegressorFloat::nodes_treeids_, "See :ref:`lpyort-TreeEnsembleRegressor`.");
     clf.def_readonly("nodes_nodeids_", &RuntimeTreeEnsembleRegressorFloat::nodes_nodeids_, "See :ref:`lpyort-TreeEnsembleRegressor`.");
@@ -524,16 +755,51 @@ in :epkg:`onnxruntime`.)pbdoc");
 in :epkg:`onnxruntime`.)pbdoc");
 
     cld.def(py::init<>());
+    cld.def_readonly("n_targets_", &RuntimeTreeEnsembleRegressorDouble::n_targets_,
+                     "Returns the number of targets.");
     cld.def_readonly("roots_", &RuntimeTreeEnsembleRegressorDouble::roots_,
                      "Returns the roots indices.");
+    cld.def_readonly("packed_roots_", &RuntimeTreeEnsembleRegressorDouble::packed_roots_,
+                     "Returns the position of every root in the packed nodes.");
     cld.def("init", &RuntimeTreeEnsembleRegressorDouble::init,
             "Initializes the runtime with the ONNX attributes in alphabetical order.");
     cld.def("compute", &RuntimeTreeEnsembleRegressorDouble::compute,
             "Computes the predictions for the random forest.");
+    cld.def("finalize_scores", &RuntimeTreeEnsembleRegressorDouble::finalize_scores,
+            "Adds the base values and applies the post transform to scores "
+            "of shape (N, n_targets) already aggregated over all trees "
+            "(sum, minimum or maximum depending on the aggregation function), "
+            "*has_scores* tells which target received a score.");
     cld.def("runtime_options", &RuntimeTreeEnsembleRegressorDouble::runtime_options,
             "Returns indications about how the runtime was compiled.");
     cld.def("omp_get_max_threads", &RuntimeTreeEnsembleRegressorDouble::omp_get_max_threads,
             "Returns omp_get_max_threads from openmp library.");
+    cld.def("set_num_threads", &RuntimeTreeEnsembleRegressorDouble::set_num_threads, py::arg("n_threads"),
+            "Sets the number of threads used by this instance, 0 for the default "
+            "number of threads of the openmp library.");
+    cld.def("set_schedule", &RuntimeTreeEnsembleRegressorDouble::set_schedule, py::arg("kind"), py::arg("chunk_size") = 0,
+            "Sets how rows are distributed across threads, *kind* is ``'static'`` "
+            "or ``'dynamic'``, *chunk_size* is the number of blocks of rows a thread "
+            "takes at once, 0 for the default.");
+    cld.def("set_parallel_threshold", &RuntimeTreeEnsembleRegressorDouble::set_parallel_threshold, py::arg("n_rows"),
+            "A batch with less than *n_rows* rows is computed by the calling thread "
+            "without opening a parallel region.");
+    cld.def("schedule", &RuntimeTreeEnsembleRegressorDouble::schedule,
+            "Returns how a batch of *n_rows* is processed, ``ROWS``: every row goes through all trees, "
+            "``BLOCKS:<n>``: blocks of n rows go through a tree before the next one, "
+            "``TREES``: trees are split across threads.");
+    cld.def_readwrite("block_size_", &RuntimeTreeEnsembleRegressorDouble::block_size_,
+                     "Maximum number of rows walked through a tree before going to the next tree, "
+                     "1 to process every row through all trees before the next row.");
+    cld.def_readwrite("tree_parallel_threshold_", &RuntimeTreeEnsembleRegressorDouble::tree_parallel_threshold_,
+                     "Batches with fewer rows are computed by splitting the trees across threads, "
+                     "0 to always parallelize over rows.");
+    cld.def_readwrite("binning_", &RuntimeTreeEnsembleRegressorDouble::binning_,
+                     "Bins the features before walking the trees, thresholds become "
+                     "small integers, it is ignored if a feature has too many distinct thresholds, "
+                     "*init* enables it if it is expected to be faster.");
+    cld.def_readonly("bin_features_", &RuntimeTreeEnsembleRegressorDouble::bin_features_,
+                     "Returns the features the trees use, empty if features cannot be binned.");
 
     cld.def_readonly("nodes_treeids_", &RuntimeTreeEnsembleRegressorDouble::nodes_treeids_, "See :ref:`lpyort-TreeEnsembleRegressorDouble`.");
     cld.def_readonly("nodes_nodeids_", &RuntimeTreeEnsembleRegressorDouble::nodes_nodeids_, "See :ref:`lpyort-TreeEnsembleRegressorDouble`.");
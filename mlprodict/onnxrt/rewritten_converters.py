@@ -6,16 +6,23 @@
 from skl2onnx.common._registration import _converter_pool
 from .converters64.ada_boost import convert_sklearn_ada_boost_regressor
 from .converters64.tree_converters import (
+    convert_sklearn_decision_tree_classifier,
     convert_sklearn_decision_tree_regressor,
+    convert_sklearn_gradient_boosting_classifier,
     convert_sklearn_gradient_boosting_regressor,
+    convert_sklearn_random_forest_classifier,
     convert_sklearn_random_forest_regressor_converter,
 )
 
 
 _overwritten_operators = {
     'SklearnAdaBoostRegressor': convert_sklearn_ada_boost_regressor,
+    'SklearnDecisionTreeClassifier': convert_sklearn_decision_tree_classifier,
     'SklearnDecisionTreeRegressor': convert_sklearn_decision_tree_regressor,
+    'SklearnExtraTreesClassifier': convert_sklearn_random_forest_classifier,
+    'SklearnGradientBoostingClassifier': convert_sklearn_gradient_boosting_classifier,
     'SklearnGradientBoostingRegressor': convert_sklearn_gradient_boosting_regressor,
+    'SklearnRandomForestClassifier': convert_sklearn_random_forest_classifier,
     'SklearnRandomForestRegressor': convert_sklearn_random_forest_regressor_converter,
     'SklearnExtraTreesRegressor': convert_sklearn_random_forest_regressor_converter,
 }
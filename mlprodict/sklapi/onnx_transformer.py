@@ -113,6 +113,39 @@ class OnnxTransformer(BaseEstimator, TransformerMixin, OnnxOperatorMixin):
         if not hasattr(self, "onnxrt_"):
             raise AttributeError(
                 "Transform OnnxTransformer must be fit first.")
+        doutputs = self.onnxrt_.run(self._build_inputs(X, inputs))
+        return self._build_outputs(doutputs)
+
+    def transform_iter(self, iterable, prefetch=0, **inputs):
+        """
+        Runs the predictions on every chunk produced by an iterator
+        and yields the results one by one, see @see me transform.
+        The runtime is reused for every chunk.
+
+        Parameters
+        ----------
+        iterable : iterator on data to process, every element is
+            processed the same way as *X* in method *transform*
+        prefetch : number of chunks read in advance by a separate thread
+            while the current one is computed, 0 to disable
+        inputs: additional inputs, the same for every chunk
+
+        Returns
+        -------
+        iterator on results
+        """
+        if not hasattr(self, "onnxrt_"):
+            raise AttributeError(
+                "Transform OnnxTransformer must be fit first.")
+        rt_inputs = (self._build_inputs(X, inputs) for X in iterable)
+        for doutputs in self.onnxrt_.run_iter(rt_inputs, prefetch=prefetch):
+            yield self._build_outputs(doutputs)
+
+    def _build_inputs(self, X, inputs):
+        """
+        Converts the inputs of method *transform* into a dictionary
+        of inputs for the runtime.
+        """
         rt_inputs = {}
         if isinstance(X, pandas.DataFrame):
             for c in X.columns:
@@ -132,9 +165,15 @@ class OnnxTransformer(BaseEstimator, TransformerMixin, OnnxOperatorMixin):
         for k, v in inputs.items():
             rt_inputs[k] = v
 
-        names = [self.output_name] if self.output_name else self.onnxrt_.output_names
         self._check_arrays(rt_inputs)
-        doutputs = self.onnxrt_.run(rt_inputs)
+        return rt_inputs
+
+    def _build_outputs(self, doutputs):
+        """
+        Converts the outputs of the runtime into the results
+        returned by method *transform*.
+        """
+        names = [self.output_name] if self.output_name else self.onnxrt_.output_names
         outputs = [doutputs[n] for n in names]
 
         if self.output_name or len(outputs) == 1: